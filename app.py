@@ -1,169 +1,270 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import (
+    Flask,
+    Response,
+    g,
+    render_template,
+    request,
+    jsonify,
+    session,
+    redirect,
+    stream_with_context,
+    url_for,
+)
 import pymongo
 from pymongo.database import Database
-import pickle
 from source.dialog_management import *
 from source.config import (
-    FilePathsConfig,
     load_configuration,
     load_file_paths_configuration,
+    load_serving_configuration,
+    serving_configuration_path,
 )
 from source.datacreator import Datacreator
 from source.ml_model import DecisionTreeModel
 from source.model import Model
+from source.model_registry import ModelRegistry
+from source.resources import DialogResources, load_resources
+from source.session_store import create_session_store
+from source.clock import REAL_CLOCK
+from source.participant_store import ParticipantStore
+from source.conversation_logger import ConversationLogger
+from source.inference_scheduler import MicroBatchScheduler
+from source.metrics import METRICS
+from source.nlu_cache import CachedClassifier
+from source.warmup import print_warmup_report, warm_up
+import atexit
 import json
+import time
+import uuid
 
 app = Flask(__name__)
 app.secret_key = "topsecret"
 
 
-client: pymongo.MongoClient = pymongo.MongoClient("127.0.0.1", 27017)
+# connect=False: the client connects (and starts its monitoring threads) on the first operation, so a
+# server which imports the app before it forks does not pass open connections to its workers
+client: pymongo.MongoClient = pymongo.MongoClient(
+    "127.0.0.1", 27017, serverSelectionTimeoutMS=2000, connect=False
+)
 db: Database = client.flask_db
 
 
 model_path = "output/data/decision_tree.rf"
 
-
-def load_ml_model(path):
-    loaded_model = pickle.load(open(path, "rb"))
-
-    return loaded_model
+# the model is loaded once per worker and shared by all requests
+model_registry = ModelRegistry(model_path)
 
 
-def setup():
+def setup() -> DialogResources:
     filenames_config = load_file_paths_configuration(
         "output/data/file_paths_config.json"
     )
     configuration = load_configuration(filenames_config.dialog_config_path)
 
-    return configuration, filenames_config
-
-
-class DialogManagementWrapper(DialogManagement):
-    def __init__(
-        self,
-        classifier: Model,
-        configuration,
-        file_paths_config: FilePathsConfig,
-        current_state: str,
-        extracted_preference: dict,
-        extracted_preferences_old: dict,
-        suggestions,
-        previous_suggestion_index,
-        request_utterance,
-        debug=False,
-    ) -> None:
-        super().__init__(classifier, configuration, file_paths_config, debug)
-
-        info = Info(
-            self.keyword_dict,
-            extracted_preference,
-            extracted_preferences_old,
-            configuration,
-            file_paths_config,
-        )
+    return load_resources(configuration, filenames_config)
 
-        # initialize the welcome state with no known preferences
-        state_class = globals()[current_state]
-
-        if current_state == "Contradiction":
-            instance = state_class(info, "explanation string")
-        elif current_state == "GiveDetails":
-            instance = state_class(
-                info,
-                suggestions,
-                previous_suggestion_index,
-                request_utterance,
-            )
-        elif current_state == "Suggestion":
-            instance = state_class(info, previous_suggestion_index=previous_suggestion_index)
 
-        else:
-            instance = state_class(info)
+# keywords, restaurant data, rules and configurations are loaded once at startup
+resources = setup()
+
+# the path can be overridden with the environment variable SERVING_CONFIG_PATH
+serving_config = load_serving_configuration(
+    serving_configuration_path(resources.file_paths_config)
+)
 
-        self.current_state = instance
+# the latency of the stages (loading the model and the data, classification, extraction, lookup, ...)
+# is collected before anything is loaded
+METRICS.enabled = serving_config.metrics
+
+
+# same cadence as the typewriter effect of chatbot.html
+WEB_TYPING_DELAYS = {" ": 0.05, ".": 0.4, "!": 0.4, "?": 0.4, ",": 0.2}
+WEB_DEFAULT_TYPING_DELAY = 0.025
+
+
+def word_chunks(schedule: list[tuple[str, float]]) -> list[tuple[str, list[float]]]:
+    """Groups a typing schedule into words. The characters are still shown one by one: like the
+    typewriter of chatbot.html each character appears after its delay.
+
+    Args:
+        schedule (list[tuple[str, float]]): characters and their delays
+
+    Returns:
+        list[tuple[str, list[float]]]: words (including the following space) and the time each of
+            their characters is shown at
+    """
+    chunks = []
+    text = ""
+    show_at = []
+    elapsed = 0.0
+    for char, delay in schedule:
+        elapsed += delay
+        text += char
+        show_at.append(elapsed)
+        if char == " ":
+            chunks.append((text, show_at))
+            text = ""
+            show_at = []
+
+    if text:
+        chunks.append((text, show_at))
+
+    return chunks
+
+
+# the turns are written to the database in the background, if it is down they are buffered in the spill file.
+# the writer thread is started by the first turn of each worker and flushed when the worker exits
+conversation_logger = ConversationLogger(
+    db[serving_config.conversation_log_collection],
+    serving_config.conversation_log_spill_path,
+    max_queue_size=serving_config.conversation_log_queue_size,
+    batch_size=serving_config.conversation_log_batch_size,
+    rejected_path=serving_config.conversation_log_rejected_path,
+)
+atexit.register(conversation_logger.close)
+
+# concurrent turns are classified together in micro batches. the batches run in a thread that is started
+# by the first request of each worker
+inference_scheduler = None
+if serving_config.inference_batching:
+    inference_scheduler = MicroBatchScheduler(
+        model_registry.get,
+        max_wait=serving_config.inference_max_wait_ms / 1000,
+        max_batch_size=serving_config.inference_max_batch_size,
+    )
 
-    def generate_feedback_string(self):
-        if self.current_state.info.allow_feedback:
-            self.current_state.give_preferences_feedback()
-        else:
-            self.current_state.feedback_string = ""
 
-    def transition(self, user_utterance):
-        # self.dialog() executes system response
-        # optionally do delay
-        if self.current_state.info.delay:
-            time.sleep(random.uniform(0.5, 2))
-        # self.dialog()
-        classified_response = self.classifier.predict_single_sentence(user_utterance)
-        print(f"{classified_response}\t{user_utterance}")
-        self.current_state.user_utterance = user_utterance
+def get_model_classifier():
+    """Returns the classifier of the utterances that are not cached."""
+    if inference_scheduler is not None:
+        return inference_scheduler
 
-        if type(self.current_state).__name__ == "Suggestion":
-            self.current_state.restaurant_lookup.lookup(self.current_state.info.extracted_preferences)
+    return model_registry.get()
 
-        new_state = self.current_state.transition(classified_response)
-        return new_state
 
+# the dialog acts and preferences of repeated utterances ("yes", "thank you goodbye") are memoized
+classifier_cache = None
+if serving_config.nlu_cache_size > 0:
+    classifier_cache = CachedClassifier(
+        get_model_classifier, model_registry.get, max_size=serving_config.nlu_cache_size
+    )
+set_nlu_cache_size(serving_config.nlu_cache_size)
+
+
+def get_classifier():
+    """Returns the classifier used for the chat turns."""
+    if classifier_cache is not None:
+        return classifier_cache
+
+    return get_model_classifier()
+
+
+# the dialog state is kept on the server, the cookie only contains the session id. the memory backend
+# keeps the conversations in the engine, the other backends share them between worker processes.
+# the session expiration (of the engine and of the store) and the timestamps and latencies of the log
+# come from this clock, it can be replaced by a VirtualClock. the delay before a reply is only drawn
+# here, the client waits for it
+clock = REAL_CLOCK
+session_store = create_session_store(serving_config, clock)
+dialog_engine = DialogEngine(
+    get_classifier,
+    resources,
+    max_sessions=serving_config.session_max_size,
+    ttl=serving_config.session_ttl,
+    store=session_store,
+    clock=clock,
+)
 
+
+# numbers and counters of the old file based allocation are taken over when the database is created
 parcipant_info_file = "completed_forms_data.json"
+participant_store = ParticipantStore(
+    serving_config.participant_db_path,
+    legacy_file=parcipant_info_file,
+    lease_time=serving_config.participant_lease_time,
+    clock=clock,
+)
 
 
 
+# load all read-only assets before the first request. with a pre-forking server (gunicorn --preload)
+# this happens once in the parent process and the workers share the assets. importing the app starts no
+# threads and leaves no connection open: the background threads, the database connections of the stores
+# and the connection to MongoDB are created in each worker on first use
+warmup_report = None
+if serving_config.warmup:
+    warmup_report = warm_up(model_registry, resources)
+    print_warmup_report(warmup_report)
+
+
+@app.before_request
+def start_request_timer():
+    if METRICS.enabled:
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    # for streamed responses this is the time until the first chunk is sent
+    if METRICS.enabled and "request_start" in g:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        METRICS.observe(
+            "http_request_seconds",
+            {"endpoint": endpoint, "method": request.method, "status": str(response.status_code)},
+            time.perf_counter() - g.request_start,
+        )
+
+    return response
+
+
 @app.route("/")
 def chatbot():
-    decision_tree = load_ml_model("output/data/decision_tree.rf")
-    configuration, filenames_config = setup()
-    dialog = DialogManagementWrapper(
-        decision_tree,
-        configuration,
-        filenames_config,
-        "Welcome",
-        {},
-        {},
-        None,
-        None,
-        None,
-        debug=False,
-    )
+    session["sid"] = uuid.uuid4().hex
+    return_message = dialog_engine.start(session["sid"]).text
+
+    participant_number, word_delay = participant_store.allocate()
 
-    session["current_state"] = type(dialog.current_state).__name__
-    session["extracted_preferences"] = dialog.current_state.info.extracted_preferences
-    session[
-        "extracted_preferences_old"
-    ] = dialog.current_state.info.extracted_preferences_old
-    session["suggestions"] = None
-    session["request_utterance"] = None
-    session["previous_suggestion_index"] = None
+    return render_template("chatbot.html", first_message=return_message, word_delay=word_delay, participant_number=participant_number)
 
-    dialog.generate_feedback_string()
-    return_message = dialog.current_state.dialog(return_message=True)
 
-    return_message = return_message.replace("System: ", "")
+@app.route("/ready", methods=["GET"])
+def ready():
+    # ready as soon as the model is loaded, without warm-up it is loaded by the first request
+    is_ready = model_registry.version is not None
+    return_data = {
+        "ready": is_ready,
+        "model_version": model_registry.version,
+        "warmup": warmup_report,
+    }
 
+    return jsonify(return_data), (200 if is_ready else 503)
 
-    with open(parcipant_info_file) as f:
-        data = json.load(f)
 
-    participant_number = random.randint(0, 999)
-    while participant_number in (data["assigned_numbers"] + data["completed_numbers"]):
-        participant_number = random.randint(0, 999)
+@app.route("/api/model_info", methods=["GET"])
+def model_info():
+    return jsonify(model_registry.info())
 
-    if data["started_with_word_delay"] > data["started_without_word_delay"]:
-        word_delay = False
-    
-    else:
-        word_delay = True
-    
-    with open(parcipant_info_file, "w") as f:
-        data["assigned_numbers"].append(participant_number)
 
-        if len(data["assigned_numbers"]) > 20:
-            data["assigned_numbers"].pop()
+@app.route("/api/inference_stats", methods=["GET"])
+def inference_stats():
+    nlu_cache_stats = {
+        "dialog_acts": classifier_cache.stats() if classifier_cache is not None else None,
+        "preferences": preference_cache.stats(),
+        "additional_preferences": additional_preference_cache.stats(),
+    }
 
-        json.dump(data, f)
+    if inference_scheduler is None:
+        return jsonify({"batching": False, "nlu_cache": nlu_cache_stats})
 
-    return render_template("chatbot.html", first_message=return_message, word_delay=word_delay, participant_number=participant_number)
+    return jsonify({"batching": True, **inference_scheduler.stats(), "nlu_cache": nlu_cache_stats})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not METRICS.enabled:
+        return "Metrics are disabled in the serving configuration", 404
+
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/thanks", methods=["GET"])
@@ -173,177 +274,157 @@ def thanks():
 
 @app.route("/api/restart_dialog", methods=["GET"])
 def restart_dialog():
-    decision_tree = load_ml_model("output/data/decision_tree.rf")
-    configuration, filenames_config = setup()
-    dialog = DialogManagementWrapper(
-        decision_tree,
-        configuration,
-        filenames_config,
-        "Welcome",
-        {},
-        {},
-        None,
-        None,
-        None,
-        debug=False,
-    )
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    reply = dialog_engine.start(session["sid"])
 
-    session["current_state"] = type(dialog.current_state).__name__
-    session["extracted_preferences"] = dialog.current_state.info.extracted_preferences
-    session[
-        "extracted_preferences_old"
-    ] = dialog.current_state.info.extracted_preferences_old
-    session["suggestions"] = None
-    session["request_utterance"] = None
-    session["previous_suggestion_index"] = None
+    return jsonify({"response": reply.text, "state": reply.state})
 
-    dialog.generate_feedback_string()
-    return_message = dialog.current_state.dialog(return_message=True)
 
-    return_message = return_message.replace("System: ", "")
+def process_turn(data: dict) -> dict:
+    """Runs a turn of the dialog of the current session.
 
-    return jsonify({"response": return_message})
+    Args:
+        data (dict): request data containing the utterance of the user
 
+    Returns:
+        dict: response of the system and information about the dialog
+    """
+    start_time = clock.now()
 
-@app.route("/api/user_input", methods=["POST"])
-def api_return_response():
-    data = request.get_json()
-    decision_tree = load_ml_model("output/data/decision_tree.rf")
-    configuration, filenames_config = setup()
-
-    current_state = session["current_state"]
-    extracted_preferences = session["extracted_preferences"]
-    extracted_preferences_old = session["extracted_preferences_old"]
-
-    # reconstruct dialog state
-    dialog = DialogManagementWrapper(
-        decision_tree,
-        configuration,
-        filenames_config,
-        current_state,
-        extracted_preferences,
-        extracted_preferences_old,
-        session["suggestions"],
-        session["previous_suggestion_index"],
-        session["request_utterance"],
-        debug=False,
-    )
+    # a new dialog is started if the session does not exist (anymore)
+    if "sid" not in session:
+        session["sid"] = uuid.uuid4().hex
+    reply = dialog_engine.step(session["sid"], data["utterance"])
+
+    # the optional delay is not slept on the server, that would block the worker.
+    # instead the client is told to wait before showing the response
+    reply_delay = random_turn_delay() if dialog_engine.policy.delay else 0.0
 
-    if current_state != "GiveDetails":
-        session["request_utterance"] = data["utterance"]
+    return_data = {}
+    return_data["dialog_finished"] = reply.finished
+    return_data["response"] = reply.text
+    return_data["state"] = reply.state
+    return_data["reply_after_ms"] = round(reply_delay * 1000)
+
+    conversation_logger.log(
+        {
+            "session_id": session["sid"],
+            "timestamp": clock.timestamp(),
+            "state": reply.previous_state,
+            "new_state": reply.state,
+            "utterance": data["utterance"],
+            "dialog_act": reply.dialog_act,
+            "extracted_preferences": reply.preferences,
+            "response": reply.text,
+            "latency": clock.now() - start_time,
+        }
+    )
 
+    return return_data
 
-    if type(current_state).__name__ == "Suggestion":
-        # to execute lookup function
-        print("Fuck")
-        dialog.current_state.restaurant_lookup.lookup(dialog.current_state.info.extracted_preferences)
 
-    new_state: State = dialog.transition(data["utterance"])
-    
+@app.route("/api/user_input", methods=["POST"])
+def api_return_response():
+    data = request.get_json()
+    return_data = process_turn(data)
 
-    try:
-        session["suggestions"] = new_state.suggestions
-        session["previous_suggestion_index"] = new_state.previous_suggestion_index
-    except:
-        pass
+    return jsonify(return_data), 200
 
 
-    dialog = DialogManagementWrapper(
-        decision_tree,
-        configuration,
-        filenames_config,
-        type(new_state).__name__,
-        new_state.info.extracted_preferences,
-        new_state.info.extracted_preferences_old,
-        session["suggestions"],
-        session["previous_suggestion_index"],
-        session["request_utterance"],
-        debug=False,
-    )
-    print(f"State Name: {type(new_state).__name__}")
-    try:
-        dialog.generate_feedback_string()
-        return_message = dialog.current_state.dialog(return_message=True)
-    except:
-        new_state: State = dialog.transition("")
-
-        try:
-            session["suggestions"] = new_state.suggestions
-            session["previous_suggestion_index"] = new_state.previous_suggestion_index
-        except:
-            pass
-
-        print(new_state)
-        dialog = DialogManagementWrapper(
-            decision_tree,
-            configuration,
-            filenames_config,
-            type(new_state).__name__,
-            new_state.info.extracted_preferences,
-            new_state.info.extracted_preferences_old,
-            session["suggestions"],
-            session["previous_suggestion_index"],
-            session["request_utterance"],
-            debug=False,
+@app.route("/api/user_input_stream", methods=["POST"])
+def api_stream_response():
+    """Runs a turn and sends the response as server-sent events, word by word. Each word carries the
+    times (relative to the start of the response) at which the client shows its characters, so the
+    typing simulation happens character by character in the browser and the server does not sleep."""
+    data = request.get_json()
+    return_data = process_turn(data)
+
+    def server_sent_event(event: str, event_data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(event_data)}\n\n"
+
+    def generate_events():
+        yield server_sent_event(
+            "turn",
+            {
+                "state": return_data["state"],
+                "dialog_finished": return_data["dialog_finished"],
+                "reply_after_ms": return_data["reply_after_ms"],
+            },
         )
 
-        dialog.generate_feedback_string()
-        return_message = dialog.current_state.dialog(return_message=True)
+        if data.get("typing", False):
+            chunks = word_chunks(
+                typing_schedule(
+                    return_data["response"], WEB_TYPING_DELAYS, WEB_DEFAULT_TYPING_DELAY
+                )
+            )
+        else:
+            chunks = [(return_data["response"], [0.0] * len(return_data["response"]))]
 
-    print(new_state)
-    print(return_message)
-    if new_state is None:
-        pass
-    else:
-        session["current_state"] = type(dialog.current_state).__name__
-        session[
-            "extracted_preferences"
-        ] = dialog.current_state.info.extracted_preferences
-        session[
-            "extracted_preferences_old"
-        ] = dialog.current_state.info.extracted_preferences_old
+        for text, show_at in chunks:
+            yield server_sent_event(
+                "chunk", {"text": text, "at_ms": [round(seconds * 1000) for seconds in show_at]}
+            )
 
-    return_message = return_message.replace("System: ", "")
+        yield server_sent_event("done", {})
 
-    return_data = {}
-    if session["current_state"] == "Goodbye":
-        return_data["dialog_finished"] = True
-    else:
-        return_data["dialog_finished"] = False
+    return Response(generate_events(), mimetype="text/event-stream")
 
-    return_data["response"] = return_message
-    print(return_data)
 
-    return jsonify(return_data), 200
+@app.route("/api/classify_batch", methods=["POST"])
+def classify_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "The request body must be a json object"}), 400
 
+    utterances = data.get("utterances")
+    if not isinstance(utterances, list):
+        return jsonify({"error": "'utterances' must be a list of strings"}), 400
+    for i, utterance in enumerate(utterances):
+        if not isinstance(utterance, str):
+            return jsonify({"error": f"utterance {i} is not a string"}), 400
 
-@app.route("/api/forms_completed", methods=["POST"])
-def forms_completed():
-    participant_data = request.get_json()
+    return_probabilities = data.get("probabilities", False)
+    decision_tree = model_registry.get()
 
-    with open(parcipant_info_file) as f:
-        data = json.load(f)
+    chunk_size = serving_config.classify_batch_chunk_size
+    if len(utterances) <= chunk_size:
+        labels, probabilities = decision_tree.predict_batch(
+            utterances, return_probabilities
+        )
+        return_data = {"labels": labels}
+        if return_probabilities:
+            return_data["probabilities"] = probabilities
+
+        return jsonify(return_data), 200
+
+    # large inputs are classified chunk by chunk and streamed as one json object per line
+    def generate_results():
+        for i in range(0, len(utterances), chunk_size):
+            chunk = utterances[i : i + chunk_size]
+            labels, probabilities = decision_tree.predict_batch(
+                chunk, return_probabilities
+            )
 
-    with open(parcipant_info_file, "w") as f:
-        if participant_data["word_delay"]:
-            data["started_with_word_delay"] += 1
-        else:
-            data["started_without_word_delay"] += 1
+            for j, utterance in enumerate(chunk):
+                result = {"utterance": utterance, "label": labels[j]}
+                if return_probabilities:
+                    result["probabilities"] = probabilities[j]
 
-        try:
-            data["completed_numbers"].append(participant_data["participant_number"])
-        except:
-            pass
-        
-        try:
-            data["assigned_numbers"].remove(participant_data["participant_number"])
-        except:
-            pass
+                yield json.dumps(result) + "\n"
 
-        json.dump(data, f)
+    return Response(
+        stream_with_context(generate_results()), mimetype="application/x-ndjson"
+    )
 
-        
-    
 
+@app.route("/api/forms_completed", methods=["POST"])
+def forms_completed():
+    participant_data = request.get_json()
+
+    participant_store.complete(
+        participant_data["participant_number"], participant_data["word_delay"]
+    )
 
-    return "dwadw"
\ No newline at end of file
+    return "dwadw"
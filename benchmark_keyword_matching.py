@@ -0,0 +1,148 @@
+import random
+import re
+import string
+import time
+
+from Levenshtein import distance as levdistance
+
+from source.config import load_file_paths_configuration
+from source.dialog_management import pattern_match_keyword_extraction
+from source.fuzzy_index import FuzzyIndex
+from source.keyword_matcher import KeywordMatcher
+from source.resources import fetch_keywords
+
+# Compares the compiled keyword matcher with the previous keyword search, which built and matched
+# one regular expression per keyword value, on all utterances of the dialog acts dataset.
+# Then compares the fuzzy index for misspelled keywords with a loop over all keywords on random
+# vocabularies of growing size.
+
+
+def legacy_keyword_search(data: str, keyword_dict) -> tuple[dict, dict]:
+    """The previous keyword search of pattern_match_keyword_extraction.
+
+    Returns:
+        tuple[dict, dict]: the extracted preferences and all values found per category
+    """
+    result = {}
+    found = {}
+    for key, values in keyword_dict.items():
+        for value in values:
+            if re.findall(r"\b" + value + r"\b", data):
+                result[key] = value
+                found.setdefault(key, []).append(value)
+
+    return result, found
+
+
+def legacy_closest_keyword(word: str, keywords: list[str], max_distance: int = 2):
+    """The previous misspelling fallback, computes the edit distance to every keyword.
+
+    Returns:
+        str | None: the closest keyword (the first one on ties) or None
+    """
+    best = None
+    for i, keyword in enumerate(keywords):
+        distance = levdistance(word, keyword)
+        if distance <= max_distance and (best is None or (distance, i) < best[:2]):
+            best = (distance, i, keyword)
+
+    return best[2] if best else None
+
+
+def random_vocabulary(size: int) -> list[str]:
+    """Returns a sorted vocabulary of random words with 4 to 12 letters."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(random.choices(string.ascii_lowercase, k=random.randint(4, 12))))
+
+    return sorted(words)
+
+
+def time_function(function, utterances: list[str], repeats: int = 3) -> float:
+    """Returns the best time of repeated runs over all utterances in seconds."""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for utterance in utterances:
+            function(utterance)
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+if __name__ == "__main__":
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    keyword_dict = fetch_keywords(filenames_config.extended_restaurant_info_path)
+
+    with open(filenames_config.dialog_acts_path) as f:
+        utterances = [line.split(" ", maxsplit=1)[1].strip().lower() for line in f]
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keyword_dict)
+    compile_time = time.perf_counter() - start
+
+    # compare the results
+    n_equal = 0
+    n_ambiguous = 0
+    differences = []
+    for utterance in utterances:
+        legacy_result, found = legacy_keyword_search(utterance, keyword_dict)
+        result = matcher.find(utterance)
+
+        if result == legacy_result:
+            n_equal += 1
+        elif any(len(values) > 1 for values in found.values()):
+            # several values of one category were found, the previous search returned the one
+            # that came last in the (random) iteration order of the set
+            n_ambiguous += 1
+        else:
+            differences.append((utterance, legacy_result, result))
+
+    legacy_time = time_function(
+        lambda utterance: legacy_keyword_search(utterance, keyword_dict), utterances
+    )
+    matcher_time = time_function(matcher.find, utterances)
+    extraction_time = time_function(
+        lambda utterance: pattern_match_keyword_extraction(utterance, keyword_dict, None),
+        utterances,
+    )
+
+    n = len(utterances)
+    print(f"{n} utterances, {sum(len(values) for values in keyword_dict.values())} keywords")
+    print(f"compiling the matcher:        {compile_time * 1000:.2f}ms")
+    print(f"previous keyword search:      {legacy_time / n * 1e6:.1f}us per utterance")
+    print(f"compiled keyword matcher:     {matcher_time / n * 1e6:.1f}us per utterance")
+    print(f"speedup:                      {legacy_time / matcher_time:.1f}x")
+    print(f"full keyword extraction:      {extraction_time / n * 1e6:.1f}us per utterance")
+    print(f"equal results:                {n_equal}")
+    print(f"several values of a category: {n_ambiguous} (the longest value is used now)")
+    print(f"other differences:            {len(differences)}")
+    for utterance, legacy_result, result in differences[:10]:
+        print(f"  {utterance!r}: {legacy_result} -> {result}")
+
+    # the fuzzy fallback for vocabularies of growing size
+    random.seed(0)
+    print("\nmisspelled keyword lookup (edit distance <= 2):")
+    for size in (50, 500, 5000):
+        vocabulary = random_vocabulary(size)
+        # half of the queries are misspelled keywords, the others are random words
+        queries = [word[:-1] + "x" for word in random.sample(vocabulary, 50)]
+        queries += random_vocabulary(50)
+
+        start = time.perf_counter()
+        index = FuzzyIndex(vocabulary)
+        build_time = time.perf_counter() - start
+
+        n_equal = sum(
+            index.closest(query) == legacy_closest_keyword(query, vocabulary) for query in queries
+        )
+        legacy_time = time_function(
+            lambda query: legacy_closest_keyword(query, vocabulary), queries, repeats=1
+        )
+        index_time = time_function(index.closest, queries, repeats=1)
+
+        print(
+            f"  {size:>5} keywords: loop {legacy_time / len(queries) * 1e6:8.1f}us, "
+            f"index {index_time / len(queries) * 1e6:6.1f}us per lookup "
+            f"(built in {build_time * 1000:.0f}ms, {n_equal}/{len(queries)} equal results)"
+        )
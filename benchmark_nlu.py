@@ -0,0 +1,160 @@
+import argparse
+import re
+
+from benchmark_keyword_matching import time_function
+from recommender import load_model
+from source.config import load_file_paths_configuration
+from source.dialog_management import (
+    additional_requirement_index,
+    parse_utterance,
+    set_nlu_cache_size,
+)
+from source.fuzzy_index import get_fuzzy_index
+from source.keyword_matcher import get_keyword_matcher
+from source.resources import fetch_keywords
+
+# Compares the cost of understanding one user turn before and after the utterance is tokenized once:
+# before, the classifier, the preference extraction, the additional preference extraction and the
+# request detection each lowercased, split or scanned the raw utterance again.
+# The preferences are memoized by default, so the comparison runs with the caches disabled and the
+# time with warm caches is reported separately.
+
+
+def legacy_pattern_match_keyword_extraction(data, keyword_dict, context):
+    """The previous regular expression based pattern_match_keyword_extraction."""
+    from Levenshtein import distance as levdistance
+
+    data = data.lower()
+    result = {}
+    result.update(get_keyword_matcher(keyword_dict).find(data))
+    fuzzy_index = get_fuzzy_index(keyword_dict)
+
+    if (temp := re.findall(r"(\w+) food", data)) and ("food" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "food"):
+            result["food"] = keyword
+    if (temp := re.findall(r"in the (\w+)", data)) and ("area" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "area"):
+            result["area"] = keyword
+    if (temp := re.findall(r"(\w+) priced", data)) and ("pricerange" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "pricerange"):
+            result["pricerange"] = keyword
+    if temp := re.findall(r"(\w+) restaurant", data):
+        for key in keyword_dict.keys():
+            if value := fuzzy_index.closest(temp[0], 2, key):
+                result[key] = value
+    if re.search(r"\bany\b", data) and (len(result) != 3):
+        if temp := re.findall(r"any (\w+)", data):
+            for word in temp:
+                for key in keyword_dict.keys():
+                    if levdistance(word, key) <= (5 if key == "pricerange" else 2):
+                        result[key] = "Any"
+        elif context in keyword_dict.keys():
+            result[context] = "Any"
+
+    return result
+
+
+def legacy_additional_keyword_extraction(data):
+    """The previous whitespace split based additional_keyword_extraction."""
+    result = {}
+    for word in data.split():
+        if keyword := additional_requirement_index.closest(word, 2):
+            result["additional_requirement"] = keyword
+    return result
+
+
+def legacy_pattern_match_request(data):
+    """The previous regular expression based pattern_match_request."""
+    data = data.lower()
+    for request_type in ("phone", "address", "postcode"):
+        if re.findall(request_type, data) != []:
+            return request_type
+    return None
+
+
+def legacy_turn(utterance: str, classifier, keyword_dict) -> tuple:
+    """Understands a turn the previous way, every step starts from the raw utterance."""
+    return (
+        classifier.predict_single_sentence(utterance),
+        legacy_pattern_match_keyword_extraction(utterance, keyword_dict, None),
+        legacy_additional_keyword_extraction(utterance),
+        legacy_pattern_match_request(utterance),
+    )
+
+
+def turn(utterance: str, classifier, keyword_dict) -> tuple:
+    """Understands a turn with the shared tokenized utterance."""
+    parse = parse_utterance(utterance, classifier, keyword_dict)
+    return (
+        parse.dialog_act,
+        parse.preferences(None),
+        parse.additional_preferences(),
+        parse.request_type(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per turn NLU benchmark")
+    parser.add_argument("--model-path", default="output/data/decision_tree.rf")
+    parser.add_argument(
+        "--n-utterances", type=int, default=5000, help="number of utterances of the dataset to use"
+    )
+    parser.add_argument(
+        "--nlu-cache-size",
+        type=int,
+        default=10000,
+        help="size of the preference caches for the cached run, 0 skips it",
+    )
+    args = parser.parse_args()
+
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    keyword_dict = fetch_keywords(filenames_config.extended_restaurant_info_path)
+    classifier = load_model(args.model_path)
+
+    with open(filenames_config.dialog_acts_path) as f:
+        utterances = [line.split(" ", maxsplit=1)[1].strip() for line in f]
+    utterances = utterances[: args.n_utterances]
+
+    # without the caches every turn runs the extraction, like the legacy functions
+    set_nlu_cache_size(0)
+
+    # compare the results, all steps are run for every utterance
+    differences = []
+    for utterance in utterances:
+        legacy_result = legacy_turn(utterance, classifier, keyword_dict)
+        result = turn(utterance, classifier, keyword_dict)
+        if result != legacy_result:
+            differences.append((utterance, legacy_result, result))
+
+    legacy_time = time_function(
+        lambda utterance: legacy_turn(utterance, classifier, keyword_dict), utterances
+    )
+    parse_time = time_function(
+        lambda utterance: turn(utterance, classifier, keyword_dict), utterances
+    )
+
+    # the repeated runs of time_function only hit the warm caches
+    cached_parse_time = None
+    if args.nlu_cache_size > 0:
+        set_nlu_cache_size(args.nlu_cache_size)
+        cached_parse_time = time_function(
+            lambda utterance: turn(utterance, classifier, keyword_dict), utterances
+        )
+
+    n = len(utterances)
+    print(f"{n} utterances")
+    print("without the preference caches:")
+    print(f"before (each step reads the raw utterance): {legacy_time / n * 1e6:.1f}us per turn")
+    print(f"after (tokenized once):                     {parse_time / n * 1e6:.1f}us per turn")
+    print(f"speedup:                                    {legacy_time / parse_time:.2f}x")
+    if cached_parse_time is not None:
+        print(
+            f"after with warm preference caches:          {cached_parse_time / n * 1e6:.1f}us per turn"
+        )
+    print(f"different results:                          {len(differences)}")
+    for utterance, legacy_result, result in differences[:10]:
+        print(f"  {utterance!r}: {legacy_result} -> {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import random
+import re
+import string
+import time
+
+import pandas as pd
+
+from source.config import load_file_paths_configuration
+from source.dialog_management import (
+    ADDITIONAL_REQUIREMENTS,
+    additional_keyword_extraction,
+    pattern_match_keyword_extraction,
+)
+from source.resources import fetch_keywords
+
+# Measures precision, recall and throughput of the rule based preference extraction on the inform
+# utterances of the dialog acts dataset. The gold preferences are the keywords of the restaurant
+# catalog that occur as words in an utterance. Every utterance is also tested with its keywords
+# misspelled. The dataset contains no additional requirements, so for additional_keyword_extraction
+# a requirement is appended to every utterance.
+
+REPEATS = 3
+
+
+def gold_preferences(utterance: str, keyword_dict) -> dict:
+    """Finds the keywords of the catalog that occur as words in an utterance.
+
+    Args:
+        utterance (str): the lowercase utterance
+        keyword_dict (dict): keyword category -> possible values
+
+    Returns:
+        dict: keyword category -> value, the longest value if several values of a category occur
+    """
+    gold = {}
+    for key, values in keyword_dict.items():
+        found = [value for value in values if re.search(rf"\b{re.escape(value)}\b", utterance)]
+        if found:
+            gold[key] = max(found, key=lambda value: (len(value), value))
+
+    return gold
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """Misspells a word with one random edit: a deletion, substitution, insertion or swap of letters.
+
+    Args:
+        word (str): the word
+        rng (random.Random): the random generator
+
+    Returns:
+        str: the misspelled word
+    """
+    i = rng.randrange(len(word))
+    edit = rng.choice(["delete", "substitute", "insert", "swap"])
+
+    if edit == "delete":
+        return word[:i] + word[i + 1 :]
+    elif edit == "substitute":
+        letter = rng.choice([c for c in string.ascii_lowercase if c != word[i]])
+        return word[:i] + letter + word[i + 1 :]
+    elif edit == "insert":
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    else:
+        i = min(i, len(word) - 2)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def misspell_values(utterance: str, values, rng: random.Random) -> str:
+    """Misspells every word of at least 4 letters of the given keyword values within an utterance."""
+    for value in values:
+        misspelled = " ".join(
+            misspell(word, rng) if len(word) >= 4 else word for word in value.split()
+        )
+        utterance = re.sub(rf"\b{re.escape(value)}\b", misspelled, utterance)
+
+    return utterance
+
+
+def score(predictions: list[dict], golds: list[dict]) -> tuple[float, float]:
+    """Calculates the micro averaged precision and recall of (category, value) pairs.
+
+    "Any" is not a value of the catalog, so these predictions are not scored.
+
+    Returns:
+        tuple[float, float]: precision and recall
+    """
+    true_positives = 0
+    n_predicted = 0
+    n_gold = 0
+    for prediction, gold in zip(predictions, golds):
+        predicted_pairs = {(key, value) for key, value in prediction.items() if value != "Any"}
+        gold_pairs = set(gold.items())
+
+        true_positives += len(predicted_pairs & gold_pairs)
+        n_predicted += len(predicted_pairs)
+        n_gold += len(gold_pairs)
+
+    precision = true_positives / n_predicted if n_predicted else 0.0
+    recall = true_positives / n_gold if n_gold else 0.0
+    return precision, recall
+
+
+def evaluate(function, utterances: list[str], golds: list[dict]) -> tuple[float, float, float]:
+    """Runs an extractor on all utterances.
+
+    Returns:
+        tuple[float, float, float]: precision, recall and utterances per second (best of REPEATS runs)
+    """
+    durations = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        predictions = [function(utterance) for utterance in utterances]
+        durations.append(time.perf_counter() - start)
+
+    precision, recall = score(predictions, golds)
+    return precision, recall, len(utterances) / min(durations)
+
+
+if __name__ == "__main__":
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    keyword_dict = fetch_keywords(filenames_config.extended_restaurant_info_path)
+    rng = random.Random(0)
+
+    with open(filenames_config.dialog_acts_path) as f:
+        lines = [line.split(" ", maxsplit=1) for line in f]
+    utterances = [utterance.strip().lower() for dialog_act, utterance in lines if dialog_act == "inform"]
+
+    golds = [gold_preferences(utterance, keyword_dict) for utterance in utterances]
+    misspelled_utterances = [
+        misspell_values(utterance, gold.values(), rng) for utterance, gold in zip(utterances, golds)
+    ]
+
+    requirements = [rng.choice(ADDITIONAL_REQUIREMENTS) for _ in utterances]
+    additional_golds = [{"additional_requirement": requirement} for requirement in requirements]
+    with_requirements = [
+        f"{utterance} and it should be {requirement}"
+        for utterance, requirement in zip(utterances, requirements)
+    ]
+    with_misspelled_requirements = [
+        misspell_values(utterance, [requirement], rng)
+        for utterance, requirement in zip(with_requirements, requirements)
+    ]
+
+    def extract_preferences(utterance):
+        return pattern_match_keyword_extraction(utterance, keyword_dict, None)
+
+    benchmarks = [
+        ("pattern_match_keyword_extraction", "correct", extract_preferences, utterances, golds),
+        (
+            "pattern_match_keyword_extraction",
+            "misspelled",
+            extract_preferences,
+            misspelled_utterances,
+            golds,
+        ),
+        (
+            "additional_keyword_extraction",
+            "correct",
+            additional_keyword_extraction,
+            with_requirements,
+            additional_golds,
+        ),
+        (
+            "additional_keyword_extraction",
+            "misspelled",
+            additional_keyword_extraction,
+            with_misspelled_requirements,
+            additional_golds,
+        ),
+    ]
+
+    results = pd.DataFrame(
+        columns=["extractor", "spelling", "utterances", "precision", "recall", "utterances_per_sec"]
+    )
+    for extractor, spelling, function, test_utterances, test_golds in benchmarks:
+        precision, recall, throughput = evaluate(function, test_utterances, test_golds)
+        results.loc[len(results)] = [
+            extractor,
+            spelling,
+            len(test_utterances),
+            precision,
+            recall,
+            throughput,
+        ]
+
+    print(results.to_string(index=False))
+    results.to_csv(filenames_config.slot_extraction_results_path)
+    print(f"Save slot extraction results to {filenames_config.slot_extraction_results_path}")
@@ -0,0 +1,100 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long it takes to import the dialog manager and to show the first prompt of the
+# recommender with a saved model. Exits with status 1 if one of them is slower than its budget.
+
+IMPORT_CODE = """
+import sys
+import source.dialog_management
+heavy_modules = [name for name in ("sklearn", "pandas", "pyttsx3") if name in sys.modules]
+if heavy_modules:
+    print("imported at startup:", ", ".join(heavy_modules))
+"""
+
+FIRST_PROMPT_CODE = """
+from source.dialog_management import DialogManagement
+from source.config import load_configuration, load_file_paths_configuration
+from source.resources import load_resources
+from recommender import load_model
+
+filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+decision_tree = load_model({model_path!r})
+configuration = load_configuration(filenames_config.dialog_config_path)
+resources = load_resources(configuration, filenames_config)
+
+dialog_system = DialogManagement(decision_tree, resources)
+print("\\n".join(dialog_system.engine.start(dialog_system.session_id).messages))
+"""
+
+
+def time_command(code: str, repeats: int) -> tuple[float, str]:
+    """Runs python code in a new interpreter.
+
+    Args:
+        code (str): the code to run
+        repeats (int): number of runs
+
+    Returns:
+        tuple[float, str]: median wall time in seconds and the output of the last run
+    """
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations), result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--model-path", default="output/data/decision_tree.rf")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=0.5,
+        help="maximum seconds to start python and import source.dialog_management",
+    )
+    parser.add_argument(
+        "--first-prompt-budget",
+        type=float,
+        default=5.0,
+        help="maximum seconds until the first prompt is ready (without the configured delays)",
+    )
+    args = parser.parse_args()
+
+    baseline, _ = time_command("pass", args.repeats)
+    import_time, import_output = time_command(IMPORT_CODE, args.repeats)
+    first_prompt_time, first_prompt_output = time_command(
+        FIRST_PROMPT_CODE.format(model_path=args.model_path), args.repeats
+    )
+
+    print(f"python startup:          {baseline:.3f}s")
+    print(f"import dialog manager:   {import_time:.3f}s (budget {args.import_budget:.3f}s)")
+    if import_output:
+        print(f"  {import_output.strip()}")
+    print(
+        f"time to first prompt:    {first_prompt_time:.3f}s (budget {args.first_prompt_budget:.3f}s)"
+    )
+    print(f"  {first_prompt_output.strip()}")
+
+    failed = False
+    if import_time > args.import_budget:
+        print("FAILED: importing the dialog manager is slower than the budget")
+        failed = True
+    if first_prompt_time > args.first_prompt_budget:
+        print("FAILED: the first prompt is slower than the budget")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
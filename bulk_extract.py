@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+
+from source.bulk_extraction import INPUT_FORMATS, extract_lines, report_malformed_line
+from source.config import load_file_paths_configuration
+
+# Extracts the preferences of every line of a corpus (e.g. data/dialog_acts.dat or exported
+# conversation turns) with a pool of processes and writes one json record per line, in input order.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk preference extraction")
+    parser.add_argument("input", help="input file, - reads from stdin")
+    parser.add_argument("--output", default="-", help="output jsonl file, - writes to stdout")
+    parser.add_argument("--format", choices=INPUT_FORMATS, default="text")
+    parser.add_argument(
+        "--context",
+        choices=["area", "pricerange", "food"],
+        help="the question the utterances answer, used for 'any'",
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    malformed_lines = []
+
+    def on_malformed_line(line_number: int, error: str):
+        malformed_lines.append(line_number)
+        report_malformed_line(line_number, error)
+
+    start = time.perf_counter()
+    n_lines = 0
+    try:
+        for record in extract_lines(
+            input_file,
+            filenames_config.extended_restaurant_info_path,
+            input_format=args.format,
+            context=args.context,
+            processes=args.processes,
+            chunk_size=args.chunk_size,
+            on_malformed_line=on_malformed_line,
+        ):
+            output_file.write(record + "\n")
+            n_lines += 1
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    duration = time.perf_counter() - start
+    # the statistics go to stderr so they do not mix with the records on stdout
+    print(
+        f"{n_lines} lines in {duration:.2f}s: {n_lines / duration:.0f} lines/sec "
+        f"with {args.processes} processes",
+        file=sys.stderr,
+    )
+    if malformed_lines:
+        print(f"{len(malformed_lines)} malformed lines were skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
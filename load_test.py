@@ -0,0 +1,309 @@
+import argparse
+import dataclasses
+import http.cookiejar
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from source.config import (
+    SERVING_CONFIG_ENV,
+    load_file_paths_configuration,
+    load_serving_configuration,
+    save_serving_configuration,
+)
+
+# Load generator that drives simulated users through the web app and reports the latency of each
+# endpoint and dialog state.
+
+
+class TestClientTransport:
+    """Sends the requests to the app in the same process using the Flask test client."""
+
+    def __init__(self, flask_app) -> None:
+        # every simulated user has its own client and therefore its own session cookie
+        self.client = flask_app.test_client()
+
+    def get(self, path: str):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def post(self, path: str, data: dict):
+        response = self.client.post(path, json=data)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPTransport:
+    """Sends the requests to a running server."""
+
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def _open(self, request: urllib.request.Request):
+        try:
+            with self.opener.open(request) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+    def get(self, path: str):
+        return self._open(urllib.request.Request(self.base_url + path))
+
+    def post(self, path: str, data: dict):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(data).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        return self._open(request)
+
+
+def write_load_test_serving_config(serving_config_path: str, directory: str, run_id: str) -> str:
+    """Copies the serving configuration with databases, spill file and log collection of its own, so
+    a load test in process does not allocate participant numbers or log turns of the user study.
+
+    Args:
+        serving_config_path (str): path of the serving configuration of the app
+        directory (str): directory of the databases and the spill file
+        run_id (str): id of the run, used for the name of the log collection
+
+    Returns:
+        str: path of the written configuration
+    """
+    serving_config = dataclasses.replace(
+        load_serving_configuration(serving_config_path),
+        session_db_path=os.path.join(directory, "sessions.sqlite3"),
+        participant_db_path=os.path.join(directory, "participants.sqlite3"),
+        conversation_log_collection=f"load_test_{run_id}",
+        conversation_log_spill_path=os.path.join(directory, "conversation_log_spill.jsonl"),
+        conversation_log_rejected_path=os.path.join(directory, "conversation_log_rejected.jsonl"),
+    )
+
+    path = os.path.join(directory, "serving_config.json")
+    save_serving_configuration(serving_config, path)
+    return path
+
+
+def load_utterances(dialog_acts_path: str) -> list[str]:
+    """Reads the utterances of the dialog acts dataset (without the labels)."""
+    with open(dialog_acts_path) as f:
+        return [line.split(" ", maxsplit=1)[1].strip() for line in f if " " in line]
+
+
+def load_trace(trace_path: str) -> list[list[str]]:
+    """Reads a recorded trace. Each line is a json list with the utterances of one session."""
+    with open(trace_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def random_sessions(
+    utterances: list[str], n_sessions: int, turns_per_session: int, seed: int
+) -> list[list[str]]:
+    """Draws random sessions of utterances from the dataset."""
+    rng = random.Random(seed)
+    return [
+        [rng.choice(utterances) for _ in range(turns_per_session)]
+        for _ in range(n_sessions)
+    ]
+
+
+def run_user(transport, sessions: list[list[str]], results: list, lock: threading.Lock):
+    """Plays the given sessions one after the other as a single user.
+
+    Args:
+        transport: TestClientTransport or HTTPTransport of this user
+        sessions (list[list[str]]): utterances of the sessions
+        results (list): measurements are appended as (endpoint, state, latency, status)
+        lock (threading.Lock): lock for the results list
+    """
+    measurements = []
+
+    def timed(endpoint, state, request_function, *args):
+        start = time.perf_counter()
+        status, data = request_function(*args)
+        measurements.append((endpoint, state, time.perf_counter() - start, status))
+        return status, data
+
+    timed("/", "Welcome", transport.get, "/")
+    for i, session in enumerate(sessions):
+        state = "Welcome"
+        if i > 0:
+            timed("/api/restart_dialog", "Welcome", transport.get, "/api/restart_dialog")
+
+        for utterance in session:
+            status, data = timed(
+                "/api/user_input",
+                state,
+                transport.post,
+                "/api/user_input",
+                {"utterance": utterance},
+            )
+            if status != 200 or data is None:
+                break
+
+            state = data.get("state", "unknown")
+            if data["dialog_finished"]:
+                break
+
+    with lock:
+        results.extend(measurements)
+
+
+def summarize(results: list, duration: float) -> pd.DataFrame:
+    """Computes the throughput and latency percentiles per endpoint and per dialog state.
+
+    Args:
+        results (list): measurements as (endpoint, state, latency, status)
+        duration (float): wall time of the run in seconds
+
+    Returns:
+        pd.DataFrame: one row per group
+    """
+    measurements = pd.DataFrame(results, columns=["endpoint", "state", "latency", "status"])
+
+    groups = [("all", "all", measurements)]
+    for endpoint, group in measurements.groupby("endpoint"):
+        groups.append((endpoint, "all", group))
+    user_input = measurements[measurements["endpoint"] == "/api/user_input"]
+    for state, group in user_input.groupby("state"):
+        groups.append(("/api/user_input", state, group))
+
+    rows = []
+    for endpoint, state, group in groups:
+        latencies = group["latency"].to_numpy() * 1000
+        rows.append(
+            {
+                "endpoint": endpoint,
+                "state": state,
+                "requests": len(group),
+                "errors": int((group["status"] != 200).sum()),
+                "throughput": len(group) / duration,
+                "p50_ms": np.percentile(latencies, 50),
+                "p95_ms": np.percentile(latencies, 95),
+                "p99_ms": np.percentile(latencies, 99),
+            }
+        )
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replays chat sessions against the web app and reports throughput and latency."
+    )
+    parser.add_argument("--users", type=int, default=20, help="number of concurrent users")
+    parser.add_argument(
+        "--sessions", type=int, default=5, help="sessions per user (random utterances only)"
+    )
+    parser.add_argument(
+        "--turns", type=int, default=6, help="turns per session (random utterances only)"
+    )
+    parser.add_argument(
+        "--trace", help="json lines file with the utterances of one session per line"
+    )
+    parser.add_argument(
+        "--url", help="base url of a running server, the app is run in process if not set"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output",
+        default="output/data/load_test_results.csv",
+        help="csv file the results are appended to",
+    )
+    args = parser.parse_args()
+
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    run_id = uuid.uuid4().hex[:8]
+
+    if args.trace:
+        all_sessions = load_trace(args.trace)
+    else:
+        all_sessions = random_sessions(
+            load_utterances(filenames_config.dialog_acts_path),
+            args.users * args.sessions,
+            args.turns,
+            args.seed,
+        )
+
+    web_app = None
+    if args.url:
+        mode = args.url
+        create_transport = lambda: HTTPTransport(args.url)
+    else:
+        # the app in this process gets its own databases, spill file and log collection
+        temporary_directory = tempfile.TemporaryDirectory(prefix="load_test_")
+        os.environ[SERVING_CONFIG_ENV] = write_load_test_serving_config(
+            filenames_config.serving_config_path, temporary_directory.name, run_id
+        )
+
+        # importing the app loads the model and data, this is not part of the measurement
+        import app as web_app
+
+        mode = "test_client"
+        create_transport = lambda: TestClientTransport(web_app.app)
+
+    # distribute the sessions over the users
+    results = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(create_transport(), all_sessions[i :: args.users], results, lock),
+        )
+        for i in range(args.users)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    if web_app is not None:
+        # write the logged turns, then remove them with the rest of the temporary data
+        web_app.conversation_logger.close()
+        try:
+            web_app.db.drop_collection(web_app.serving_config.conversation_log_collection)
+        except Exception as e:
+            print(f"Could not drop the load test log collection: {e}")
+        temporary_directory.cleanup()
+
+    summary = summarize(results, duration)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    # append the results so that runs can be compared
+    summary.insert(0, "run_id", run_id)
+    summary.insert(1, "timestamp", pd.Timestamp.now().isoformat(timespec="seconds"))
+    summary.insert(2, "mode", mode)
+    summary.insert(3, "users", args.users)
+    summary.insert(4, "duration", duration)
+
+    try:
+        previous_results = pd.read_csv(args.output)
+        summary = pd.concat([previous_results, summary], ignore_index=True)
+    except FileNotFoundError:
+        pass
+    summary.to_csv(args.output, index=False)
+    print(f"Save load test results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,55 @@
+import argparse
+
 from source.dialog_management import DialogManagement
 from source.config import load_configuration, load_file_paths_configuration
-from source.datacreator import Datacreator
-from source.ml_model import DecisionTreeModel
+from source.resources import load_resources
+
+
+def train_model(filenames_config):
+    from source.datacreator import Datacreator
+    from source.ml_model import DecisionTreeModel
+
+    datacreator_with_duplicates = Datacreator(False)
+
+    # load input data for both datacreator instances
+    # and process the data to create the final dataset
+    datacreator_with_duplicates.openfile(filenames_config.dialog_acts_path)
+    datacreator_with_duplicates.assign_class()
+    datacreator_with_duplicates.create_dataset()
 
+    # fit ML Model
+    decision_tree = DecisionTreeModel(datacreator_with_duplicates)
+    decision_tree.develop()
+    decision_tree.show_results()
 
-filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    return decision_tree
 
-datacreator_with_duplicates = Datacreator(False)
 
+def load_model(model_path):
+    from source.model_registry import ModelRegistry
 
-# load input data for both datacreator instances
-# and process the data to create the final dataset
-datacreator_with_duplicates.openfile(filenames_config.dialog_acts_path)
-datacreator_with_duplicates.assign_class()
-datacreator_with_duplicates.create_dataset()
+    # the artifact is created by source/fit_and_save_model.py
+    return ModelRegistry(model_path).get()
 
 
-# fit ML Model
-decision_tree = DecisionTreeModel(datacreator_with_duplicates)
-decision_tree.develop()
-decision_tree.show_results()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Restaurant recommender dialog")
+    parser.add_argument(
+        "--model-path",
+        help="load a saved model (e.g. output/data/decision_tree.rf) instead of fitting a new one",
+    )
+    args = parser.parse_args()
 
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
 
-configuration = load_configuration(filenames_config.dialog_config_path)
+    if args.model_path:
+        decision_tree = load_model(args.model_path)
+    else:
+        decision_tree = train_model(filenames_config)
 
+    configuration = load_configuration(filenames_config.dialog_config_path)
+    resources = load_resources(configuration, filenames_config)
 
-# create the dialog
-dialog_system = DialogManagement(
-    decision_tree, configuration, filenames_config, debug=False
-)
-dialog_system.run_dialog()
+    # create the dialog
+    dialog_system = DialogManagement(decision_tree, resources, debug=False)
+    dialog_system.run_dialog()
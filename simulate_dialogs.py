@@ -0,0 +1,102 @@
+import argparse
+import statistics
+
+from recommender import load_model
+from source.config import load_configuration, load_file_paths_configuration
+from source.dialog_management import set_nlu_cache_size
+from source.resources import load_resources
+from source.simulator import simulate
+
+# Runs complete conversations between the dialog manager and a simulated user without any output or
+# waiting, to measure the throughput of the whole turn pipeline (classify, extract, transition,
+# lookup, render).
+
+# "turn" and "start" are the time of a turn outside of the other stages, "simulator" is the time of
+# the simulated user
+STAGES = [
+    "classify",
+    "extract",
+    "transition",
+    "lookup",
+    "render",
+    "session_load",
+    "session_save",
+    "turn",
+    "start",
+    "simulator",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless dialog simulation")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--model-path", default="output/data/decision_tree.rf")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=20)
+    parser.add_argument(
+        "--noise", type=float, default=0.0, help="probability of an unrelated user utterance"
+    )
+    parser.add_argument(
+        "--nlu-cache-size",
+        type=int,
+        default=10000,
+        help="number of memoized preferences, 0 disables the caches",
+    )
+    args = parser.parse_args()
+
+    set_nlu_cache_size(args.nlu_cache_size)
+
+    filenames_config = load_file_paths_configuration("output/data/file_paths_config.json")
+    configuration = load_configuration(filenames_config.dialog_config_path)
+    resources = load_resources(configuration, filenames_config)
+    classifier = load_model(args.model_path)
+
+    report = simulate(
+        classifier,
+        resources,
+        args.conversations,
+        seed=args.seed,
+        max_turns=args.max_turns,
+        noise=args.noise,
+    )
+
+    n_turns = report["turns"]
+    duration = report["duration"]
+    turns_to_success = report["turns_to_success"]
+    print(
+        f"{report['conversations']} conversations, {n_turns} turns in {duration:.2f}s: "
+        f"{report['conversations'] / duration:.0f} conversations/sec, {n_turns / duration:.0f} turns/sec"
+    )
+    print(
+        f"success: {len(turns_to_success) / report['conversations']:.1%}, turns to success: "
+        + (
+            f"mean {statistics.mean(turns_to_success):.2f}, median {statistics.median(turns_to_success)}"
+            if turns_to_success
+            else "-"
+        )
+    )
+
+    # a stage includes the stages nested in it (e.g. render includes lookup), like the latency
+    # metrics of the web app. the exclusive times add up to the duration, so they give the shares
+    print(f"{'stage':<12}{'us/turn':>10}{'excl us/turn':>14}{'excl share':>12}")
+    stages = report["stages"]
+    exclusive_stages = report["exclusive_stages"]
+    # the time which is not measured in a stage is spent in the dialog loop and the session handling
+    stages["other"] = exclusive_stages["other"] = duration - sum(exclusive_stages.values())
+    for stage in STAGES + ["other"]:
+        seconds = stages.get(stage, 0.0)
+        exclusive_seconds = exclusive_stages.get(stage, 0.0)
+        print(
+            f"{stage:<12}{seconds / n_turns * 1e6:>10.1f}{exclusive_seconds / n_turns * 1e6:>14.1f}"
+            f"{exclusive_seconds / duration:>12.1%}"
+        )
+
+    # the delays and the typing run on a virtual clock, this is the time a real user would have waited
+    print(
+        f"virtual time: {report['delay']:.0f}s of delays, {report['typing']:.0f}s of typing "
+        f"({(report['delay'] + report['typing']) / report['conversations']:.1f}s per conversation)"
+    )
+
+
+if __name__ == "__main__":
+    main()
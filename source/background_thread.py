@@ -0,0 +1,69 @@
+import os
+import threading
+from typing import Callable
+
+# serializes the starts of the background threads. a forked child gets a new lock, the copy of the
+# parent could be held by a thread that does not exist in the child
+_start_lock = threading.Lock()
+
+
+def _reset_start_lock():
+    global _start_lock
+    _start_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_start_lock)
+
+
+class BackgroundThread:
+    """A daemon thread which is started on first use in each process.
+
+    Threads do not survive a fork: the workers of a pre-forking server (gunicorn --preload) get copies
+    of the objects created when the app was imported, but not their threads. ensure_started() is
+    therefore called before the thread is needed. It starts the thread if it was not started in the
+    current process yet, after calling on_start to replace the state copied from the parent (its
+    locks may be held and its queued items belong to the parent).
+    """
+
+    def __init__(
+        self, target: Callable[[], None], name: str, on_start: Callable[[], None] = None
+    ) -> None:
+        """
+        Args:
+            target (Callable[[], None]): the function run by the thread
+            name (str): name of the thread
+            on_start (Callable[[], None], optional): called before the thread is started in a process.
+                Defaults to None.
+        """
+        self.target = target
+        self.name = name
+        self.on_start = on_start
+
+        self.pid = None
+        self.thread = None
+
+    def ensure_started(self) -> bool:
+        """Starts the thread if it was not started in the current process yet.
+
+        Returns:
+            bool: True if the thread was started by this call
+        """
+        if self.pid == os.getpid():
+            return False
+
+        with _start_lock:
+            pid = os.getpid()
+            if self.pid == pid:
+                return False
+
+            if self.on_start is not None:
+                self.on_start()
+            self.thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self.thread.start()
+            self.pid = pid
+
+        return True
+
+    def is_running(self) -> bool:
+        """Returns True if the thread was started in the current process and has not finished."""
+        return self.pid == os.getpid() and self.thread.is_alive()
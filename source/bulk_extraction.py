@@ -0,0 +1,195 @@
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+from typing import Callable, Iterable, Iterator
+
+from source.dialog_management import (
+    additional_keyword_extraction,
+    pattern_match_keyword_extraction,
+)
+from source.nlu import tokenize
+from source.resources import fetch_keywords
+
+# formats of the input lines:
+#   "text":        one utterance per line
+#   "dialog_acts": the dialog act followed by the utterance, like data/dialog_acts.dat
+#   "jsonl":       one json object per line with the utterance in the field "utterance", like the
+#                  exported conversation turns
+# empty lines are skipped in all formats
+INPUT_FORMATS = ("text", "dialog_acts", "jsonl")
+
+# the keyword dictionary of a worker process, it is loaded once by the initializer
+_keyword_dict = None
+
+
+def parse_line(line: str, input_format: str) -> dict:
+    """Creates the output record of an input line with the fields of the input.
+
+    Args:
+        line (str): the input line
+        input_format (str): one of INPUT_FORMATS
+
+    Raises:
+        Exception: Raises exception if the line is not valid in the input format.
+
+    Returns:
+        dict: the record, at least with the utterance
+    """
+    line = line.rstrip("\n")
+
+    if input_format == "text":
+        return {"utterance": line}
+    elif input_format == "dialog_acts":
+        dialog_act, _, utterance = line.partition(" ")
+        return {"dialog_act": dialog_act, "utterance": utterance.strip()}
+    elif input_format == "jsonl":
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid json: {e}")
+        if not isinstance(data, dict) or not isinstance(data.get("utterance"), str):
+            raise Exception("The line has no 'utterance' field with a string")
+        return {"utterance": data["utterance"]}
+    else:
+        raise Exception(f"Unknown input format {input_format}, use one of {INPUT_FORMATS}")
+
+
+def extract_record(record: dict, keyword_dict, context: str = None) -> dict:
+    """Adds the preferences and additional preferences of the utterance to a record.
+
+    Args:
+        record (dict): the record with the utterance
+        keyword_dict (dict): The dictionary containing all possible keywords
+        context (str, optional): The context of the utterances (area, pricerange, food). Defaults to None.
+
+    Returns:
+        dict: the record
+    """
+    utterance = tokenize(record["utterance"])
+    record["preferences"] = pattern_match_keyword_extraction(utterance, keyword_dict, context)
+    record["additional_preferences"] = additional_keyword_extraction(utterance)
+
+    return record
+
+
+def _init_worker(keyword_path: str):
+    global _keyword_dict
+    _keyword_dict = fetch_keywords(keyword_path)
+
+
+def _extract_chunk(arguments: tuple) -> tuple[list[str], list[tuple[int, str]]]:
+    first_line_number, lines, input_format, context = arguments
+
+    # the records are serialized in the workers, so the main process only writes them
+    records = []
+    malformed_lines = []
+    for line_number, line in enumerate(lines, first_line_number):
+        if not line.strip():
+            continue
+
+        try:
+            record = parse_line(line, input_format)
+        except Exception as e:
+            # a single malformed line must not abort the whole run
+            malformed_lines.append((line_number, str(e)))
+            continue
+
+        records.append(json.dumps(extract_record(record, _keyword_dict, context)))
+
+    return records, malformed_lines
+
+
+def report_malformed_line(line_number: int, error: str):
+    """Prints a line that was skipped because it could not be parsed to stderr."""
+    print(f"Skipping line {line_number}: {error}", file=sys.stderr)
+
+
+def chunks(lines: Iterable[str], chunk_size: int) -> Iterator[list[str]]:
+    """Splits the lines into lists of chunk_size lines without reading all of them.
+
+    Args:
+        lines (Iterable[str]): the lines
+        chunk_size (int): number of lines per chunk
+
+    Yields:
+        list[str]: the next chunk
+    """
+    iterator = iter(lines)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def extract_lines(
+    lines: Iterable[str],
+    keyword_path: str,
+    input_format: str = "text",
+    context: str = None,
+    processes: int = None,
+    chunk_size: int = 1000,
+    on_malformed_line: Callable[[int, str], None] = report_malformed_line,
+    max_pending_chunks: int = None,
+) -> Iterator[str]:
+    """Extracts the preferences of a stream of lines with a pool of processes.
+
+    The lines are read lazily and sent to the workers in chunks, the results are returned in the
+    order of the input lines as soon as they are ready. At most max_pending_chunks chunks are read
+    ahead of the records that were returned, so a slow consumer does not fill the memory with the
+    input. Empty lines are skipped, lines which can not be parsed are skipped and passed to
+    on_malformed_line.
+
+    Args:
+        lines (Iterable[str]): the input lines, e.g. an open file
+        keyword_path (str): path of the restaurant info csv the keywords are read from
+        input_format (str, optional): one of INPUT_FORMATS. Defaults to "text".
+        context (str, optional): The context of the utterances (area, pricerange, food). Defaults to None.
+        processes (int, optional): number of worker processes, 1 extracts in this process.
+            Defaults to the number of cpus.
+        chunk_size (int, optional): number of lines per task of a worker. Defaults to 1000.
+        on_malformed_line (Callable[[int, str], None], optional): called with the line number
+            (starting at 1) and the error of each malformed line. Defaults to printing them to stderr.
+        max_pending_chunks (int, optional): maximum number of chunks that are being extracted or
+            waiting to be returned. Defaults to twice the number of processes.
+
+    Yields:
+        str: the json record of each line
+    """
+    if input_format not in INPUT_FORMATS:
+        raise Exception(f"Unknown input format {input_format}, use one of {INPUT_FORMATS}")
+
+    tasks = (
+        (1 + i * chunk_size, chunk, input_format, context)
+        for i, chunk in enumerate(chunks(lines, chunk_size))
+    )
+
+    def results(chunk_results: Iterable[tuple[list[str], list[tuple[int, str]]]]) -> Iterator[str]:
+        for records, malformed_lines in chunk_results:
+            for line_number, error in malformed_lines:
+                on_malformed_line(line_number, error)
+            yield from records
+
+    if processes == 1:
+        _init_worker(keyword_path)
+        yield from results(map(_extract_chunk, tasks))
+        return
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if max_pending_chunks is None:
+        max_pending_chunks = 2 * processes
+
+    with multiprocessing.Pool(
+        processes, initializer=_init_worker, initargs=(keyword_path,)
+    ) as pool:
+        # imap would read all tasks ahead of the results, so the chunks are submitted one by one and
+        # the next chunk is only read when a result was returned. the queue keeps the order of the chunks
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_extract_chunk, (task,)))
+            if len(pending) >= max_pending_chunks:
+                yield from results([pending.popleft().get()])
+
+        while pending:
+            yield from results([pending.popleft().get()])
@@ -0,0 +1,78 @@
+import threading
+import time
+
+
+class Clock:
+    """The time of the dialog system. All delays (the delay before a response, the typing simulation)
+    and expiration times go through a clock, so they can be replaced by a VirtualClock."""
+
+    def now(self) -> float:
+        """Returns the current time in seconds, only differences between two calls are meaningful."""
+        return time.monotonic()
+
+    def timestamp(self) -> float:
+        """Returns the current time in seconds since the epoch, e.g. for logging."""
+        return time.time()
+
+    def sleep(self, seconds: float, reason: str = None):
+        """Waits.
+
+        Args:
+            seconds (float): seconds to wait
+            reason (str, optional): what is waited for, e.g. "delay" or "typing". Defaults to None.
+        """
+        time.sleep(seconds)
+
+
+class VirtualClock(Clock):
+    """A clock which never waits. Sleeping only advances its time and records the delay, so
+    conversations run instantly but the delays a user would have seen can still be checked."""
+
+    def __init__(self, start: float = 0.0, start_timestamp: float = 0.0) -> None:
+        """
+        Args:
+            start (float, optional): the time of now() at the start. Defaults to 0.0.
+            start_timestamp (float, optional): the time of timestamp() at the start. Defaults to 0.0.
+        """
+        self.start = start
+        self.start_timestamp = start_timestamp
+        self._time = start
+        self._lock = threading.Lock()
+
+        # (reason, seconds) of every sleep
+        self.sleeps = []
+
+    def now(self) -> float:
+        return self._time
+
+    def timestamp(self) -> float:
+        return self.start_timestamp + self._time - self.start
+
+    def sleep(self, seconds: float, reason: str = None):
+        with self._lock:
+            self._time += seconds
+            self.sleeps.append((reason, seconds))
+
+    def advance(self, seconds: float):
+        """Moves the time forward without recording a delay, e.g. to let sessions expire.
+
+        Args:
+            seconds (float): seconds to move forward
+        """
+        with self._lock:
+            self._time += seconds
+
+    def slept(self, reason: str = None) -> float:
+        """Returns the total seconds slept.
+
+        Args:
+            reason (str, optional): only count the sleeps for this reason. Defaults to all sleeps.
+
+        Returns:
+            float: the seconds
+        """
+        return sum(seconds for sleep_reason, seconds in self.sleeps if reason in (None, sleep_reason))
+
+
+# the clock of the real time, shared by everything that is not given another clock
+REAL_CLOCK = Clock()
@@ -1,5 +1,10 @@
 import json
-from dataclasses import dataclass
+import os
+from dataclasses import asdict, dataclass
+
+# environment variable which overrides the path of the serving configuration of the web app, e.g. to
+# run it with separate databases in a load test
+SERVING_CONFIG_ENV = "SERVING_CONFIG_PATH"
 
 
 @dataclass
@@ -14,6 +19,40 @@ class FilePathsConfig:
     baseline_rules_path: str
     additional_requirement_rules_path: str
     dialog_config_path: str
+    serving_config_path: str = "output/data/serving_config.json"
+    slot_extraction_results_path: str = "output/data/slot_extraction_results.csv"
+
+
+@dataclass
+class ServingConfig:
+    """Dataclass for the configuration of the web app."""
+
+    # "memory" keeps the sessions in the process, "sqlite" shares them between workers
+    session_backend: str = "memory"
+    session_ttl: float = 3600
+    session_max_size: int = 10000
+    session_db_path: str = "output/data/sessions.sqlite3"
+    participant_db_path: str = "output/data/participants.sqlite3"
+    # seconds after which the number of a participant who did not complete the forms is reused
+    participant_lease_time: float = 7200
+    conversation_log_collection: str = "conversation_turns"
+    conversation_log_spill_path: str = "output/data/conversation_log_spill.jsonl"
+    # the turns the database rejected, they are not retried
+    conversation_log_rejected_path: str = "output/data/conversation_log_rejected.jsonl"
+    conversation_log_queue_size: int = 10000
+    conversation_log_batch_size: int = 100
+    # /api/classify_batch streams the results if more utterances are sent
+    classify_batch_chunk_size: int = 1000
+    # classify concurrent chat turns together
+    inference_batching: bool = True
+    inference_max_wait_ms: float = 5
+    inference_max_batch_size: int = 32
+    # load all assets and freeze them before the first request
+    warmup: bool = True
+    # number of memoized dialog acts and extracted preferences, 0 disables the caches
+    nlu_cache_size: int = 10000
+    # collect latency histograms of the turns and requests, exposed at /metrics
+    metrics: bool = True
 
 
 def load_file_paths_configuration(configuration_file_path: str) -> FilePathsConfig:
@@ -31,6 +70,45 @@ def load_file_paths_configuration(configuration_file_path: str) -> FilePathsConf
     return FilePathsConfig(**data)
 
 
+def load_serving_configuration(configuration_file_path: str) -> ServingConfig:
+    """creates a dataclass from a dict containing the configuration of the web app.
+
+    Args:
+        configuration_file_path (str): file path to the configuration data
+
+    Returns:
+        ServingConfig: configuration data as instance of dataclass
+    """
+    with open(configuration_file_path) as f:
+        data = json.load(f)
+
+    return ServingConfig(**data)
+
+
+def serving_configuration_path(file_paths_config: FilePathsConfig) -> str:
+    """Returns the path of the serving configuration, the environment variable SERVING_CONFIG_PATH
+    takes precedence over the file paths configuration.
+
+    Args:
+        file_paths_config (FilePathsConfig): Contains used file paths.
+
+    Returns:
+        str: path of the serving configuration
+    """
+    return os.environ.get(SERVING_CONFIG_ENV, file_paths_config.serving_config_path)
+
+
+def save_serving_configuration(serving_config: ServingConfig, configuration_file_path: str):
+    """Writes the configuration of the web app to a json file.
+
+    Args:
+        serving_config (ServingConfig): configuration of the web app
+        configuration_file_path (str): file path of the configuration data
+    """
+    with open(configuration_file_path, "w") as f:
+        json.dump(asdict(serving_config), f, indent=4)
+
+
 def load_configuration(configuration_file_path: str) -> list[bool]:
     """Loads the configuration for the dialog manager
 
@@ -0,0 +1,265 @@
+import json
+import os
+import queue
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # windows, where the app runs in a single process
+    fcntl = None
+
+from source.background_thread import BackgroundThread
+
+
+class ConversationLogger:
+    """Writes the turns of the conversations to a MongoDB collection in a background thread.
+
+    Logging a turn only puts the record into a bounded queue, so the request is not slowed down.
+    The background thread inserts the records in batches with insert_many. If the database is not
+    reachable the batch is appended to a local spill file, which is written to the database as soon
+    as an insert succeeds again. Each record gets its _id before the first insert, so a record that
+    was written by a failed insert is recognized (duplicate key) and not written twice. Records the
+    database rejects (e.g. because of a unique index) are not retried but written to the rejected
+    file. All processes of a server share the spill file, it is only changed under a file lock.
+
+    The background thread is started by the first logged record of each process, so the logger can be
+    created before a server forks.
+    """
+
+    def __init__(
+        self,
+        collection,
+        spill_path: str,
+        max_queue_size: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        rejected_path: str = None,
+    ) -> None:
+        """
+        Args:
+            collection: MongoDB collection (or a compatible stand-in like mongomock) the records are inserted into
+            spill_path (str): path of the file the records are buffered in if the database is down
+            max_queue_size (int, optional): maximum number of records waiting to be written. Defaults to 10000.
+            batch_size (int, optional): maximum number of records per insert. Defaults to 100.
+            flush_interval (float, optional): seconds after which a not yet full batch is written. Defaults to 1.0.
+            rejected_path (str, optional): path of the file of the records the database rejected.
+                Defaults to the spill file with the suffix "_rejected".
+        """
+        self.collection = collection
+        self.spill_path = spill_path
+        if rejected_path is None:
+            root, extension = os.path.splitext(spill_path)
+            rejected_path = f"{root}_rejected{extension}"
+        self.rejected_path = rejected_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+
+        self._reset()
+
+        self._stop = object()
+        self._thread = BackgroundThread(self._run, "conversation-logger", on_start=self._reset)
+
+    def _reset(self):
+        """Creates the queue and statistics of a new process, the records of a parent process are not kept."""
+        self.queue = queue.Queue(maxsize=self.max_queue_size)
+
+        # statistics
+        self.n_inserted = 0
+        self.n_spilled = 0
+        self.n_rejected = 0
+        self.n_dropped = 0
+
+    def log(self, record: dict) -> bool:
+        """Queues a record for writing. Never blocks.
+
+        Args:
+            record (dict): json serializable record
+
+        Returns:
+            bool: False if the queue is full and the record was dropped
+        """
+        self._thread.ensure_started()
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.n_dropped += 1
+            return False
+
+        return True
+
+    def close(self, timeout: float = 10):
+        """Writes the remaining records and stops the background thread of the current process.
+
+        Args:
+            timeout (float, optional): seconds to wait for the background thread. Defaults to 10.
+        """
+        # nothing was logged in this process
+        if not self._thread.is_running():
+            return
+
+        self.queue.put(self._stop)
+        self._thread.thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                record = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                record = None
+
+            if record is self._stop:
+                self._flush(batch)
+                return
+
+            if record is not None:
+                batch.append(record)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _insert(self, documents: list) -> list:
+        """Inserts documents which already have an _id.
+
+        Args:
+            documents (list): the documents
+
+        Raises:
+            Exception: the error of the database if it is not reachable, it is unknown which
+                documents were written
+
+        Returns:
+            list: the documents which were rejected by the database, e.g. because of a unique index.
+                Writing them again would fail again. A document whose _id is already in the
+                collection (duplicate key) was written before and counts as written
+        """
+        try:
+            self.collection.insert_many(documents, ordered=False)
+        except Exception as e:
+            write_errors = (getattr(e, "details", None) or {}).get("writeErrors")
+            if write_errors is None:
+                raise
+
+            rejected = [documents[error["index"]] for error in write_errors]
+            written_ids = {
+                document["_id"]
+                for document in self.collection.find(
+                    {"_id": {"$in": [document["_id"] for document in rejected]}}, {"_id": 1}
+                )
+            }
+            rejected = [document for document in rejected if document["_id"] not in written_ids]
+            if rejected:
+                print(f"The database rejected {len(rejected)} conversation records: {e}")
+            return rejected
+
+        return []
+
+    def _flush(self, batch: list):
+        if not batch:
+            return
+
+        documents = [dict(record, _id=uuid.uuid4().hex) for record in batch]
+        try:
+            rejected = self._insert(documents)
+        except Exception as e:
+            print(f"Could not write {len(documents)} conversation records: {e}")
+            with self._spill_lock():
+                self._append(self.spill_path, documents)
+            self.n_spilled += len(documents)
+            return
+
+        self.n_inserted += len(documents) - len(rejected)
+        self._reject(rejected)
+
+        self._replay_spill()
+
+    @contextmanager
+    def _spill_lock(self):
+        """Holds the lock of the spill file, which is shared by all processes that log to it."""
+        if fcntl is None:
+            yield
+            return
+
+        # the spill file itself is replaced, so a separate file is locked
+        with open(self.spill_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _append(path: str, records: list):
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def _reject(self, records: list):
+        """Writes the records the database rejected to the rejected file instead of retrying them."""
+        if not records:
+            return
+
+        with self._spill_lock():
+            self._append(self.rejected_path, records)
+        self.n_rejected += len(records)
+
+    def _replay_spill(self):
+        """Writes the records of the spill file to the database, the database is reachable again."""
+        if not os.path.exists(self.spill_path):
+            return
+
+        # other processes do not append while the file is replayed, so no record is lost when the
+        # file is replaced
+        with self._spill_lock():
+            if not os.path.exists(self.spill_path):
+                return
+
+            with open(self.spill_path) as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            # records spilled by older versions have no _id yet
+            for record in records:
+                record.setdefault("_id", uuid.uuid4().hex)
+
+            remaining = []
+            rejected = []
+            for i in range(0, len(records), self.batch_size):
+                batch = records[i : i + self.batch_size]
+                try:
+                    batch_rejected = self._insert(batch)
+                except Exception as e:
+                    print(f"Could not write the spilled conversation records: {e}")
+                    remaining = records[i:]
+                    break
+
+                self.n_inserted += len(batch) - len(batch_rejected)
+                rejected.extend(batch_rejected)
+
+            if rejected:
+                self._append(self.rejected_path, rejected)
+                self.n_rejected += len(rejected)
+
+            if not remaining:
+                os.remove(self.spill_path)
+                return
+
+            temporary_path = self.spill_path + ".tmp"
+            with open(temporary_path, "w") as f:
+                for record in remaining:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(temporary_path, self.spill_path)
+
+    def stats(self) -> dict:
+        """Returns the number of inserted, spilled, rejected, dropped and waiting records."""
+        return {
+            "inserted": self.n_inserted,
+            "spilled": self.n_spilled,
+            "rejected": self.n_rejected,
+            "dropped": self.n_dropped,
+            "queued": self.queue.qsize(),
+        }
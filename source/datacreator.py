@@ -1,7 +1,3 @@
-import numpy as np
-from sklearn.model_selection import train_test_split
-
-
 class Datacreator:
     """The data preprocessor which preprocesses the data so it can be used for the models"""
 
@@ -43,6 +39,8 @@ class Datacreator:
 
     def create_dataset(self):
         """Formats the dataset so it can be used by the models"""
+        import numpy as np
+        from sklearn.model_selection import train_test_split
 
         # Make a numpy array and store the label and utterances separately
         self.x = np.array(self.labeled_data)[:, 1]
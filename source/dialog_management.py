@@ -1,79 +1,131 @@
-import csv
+from __future__ import annotations
+
+import asyncio
 import random
-import re
-import copy
-import time
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
 from Levenshtein import distance as levdistance
-import pyttsx3
 
-from source.model import Model
-from source.restaurant_lookup import RestaurantLookup
-from source.config import FilePathsConfig
+from source.clock import REAL_CLOCK, Clock
+from source.resources import DialogResources
+from source.fuzzy_index import FuzzyIndex, get_fuzzy_index
+from source.keyword_matcher import get_keyword_matcher
+from source.nlu import Utterance, tokenize
+from source.metrics import METRICS
+from source.nlu_cache import LRUCache
+from source.timing import NULL_TIMER
+
+if TYPE_CHECKING:
+    from source.model import Model
+    from source.session_store import SessionStore
+from source.speech import SpeechWorker
 
-# for speech
-engine = pyttsx3.init()
+# for speech, the engine is only started if text to speech is used
+speech_worker = SpeechWorker("output/audio")
 
 
 class DialogManagement:
-    """The dialog system which handles and keeps track of
-    the conversation.
-    """
+    """The dialog system on the command line, a single conversation of a DialogEngine."""
+
+    # the session of the conversation within the engine
+    session_id = "cli"
 
     def __init__(
         self,
         classifier: Model,
-        configuration,
-        file_paths_config: FilePathsConfig,
+        resources: DialogResources,
         debug=False,
+        io=None,
+        timer=METRICS,
+        clock: Clock = REAL_CLOCK,
     ) -> None:
+        """
+        Args:
+            classifier (Model): The dialog act classifier
+            resources (DialogResources): The shared resources
+            debug (bool, optional): print the classification of each user input. Defaults to False.
+            io (optional): reads the utterances of the user and shows the messages of the system,
+                see ConsoleIO. Defaults to the command line.
+            timer (optional): measures the stages of each turn, e.g. a StageTimer. Defaults to the
+                latency metrics of the process.
+            clock (Clock, optional): the clock of the delays and the typing simulation. Defaults to the real time.
+        """
         self.classifier = classifier
+        self.engine = DialogEngine(
+            lambda: self.classifier, resources, max_sessions=1, timer=timer, clock=clock
+        )
+        self.policy = self.engine.policy
 
-        self.fetch_keywords(file_paths_config.extended_restaurant_info_path)
-
-        # initialize info instance
-        info = Info(self.keyword_dict, {}, {}, configuration, file_paths_config)
-
-        # initialize the welcome state with no known preferences
-        self.current_state = Welcome(info)
+        if io is None:
+            io = ConsoleIO(self.policy.typing_delay, self.policy.t2s, clock)
+        self.io = io
 
         # optionally enable debugging --> print classifications for each user input
         self.debug = debug
 
     def run_dialog(self):
-        # while the current state is not goodbye we can go to a new state which is based on the running of classifier ml model
-        while not isinstance(self.current_state, Goodbye):
-            (
-                new_state,
-                classified_response,
-            ) = self.current_state.run(self.classifier)
-            self.current_state = new_state
+        # the conversation starts in the welcome state with no known preferences
+        reply = self.engine.start(self.session_id)
+
+        # until the goodbye state is reached, show the messages of the system and classify the answer of the user
+        while True:
+            # optionally do delay
+            if self.policy.delay:
+                self.io.wait(random_turn_delay())
+
+            for message in reply.messages:
+                self.io.write(message)
+
+            if reply.finished:
+                break
+
+            reply = self.engine.step(self.session_id, self.io.read())
 
             if self.debug:
-                print(f"Classified `{classified_response}`")
+                print(f"Classified `{reply.dialog_act}`")
 
-        # run the goodbye state
-        self.current_state.run()
+        self.io.close()
 
-    def fetch_keywords(self, filename):
-        """Fetches all the keywords which are needed for the keyword extraction
 
+class ConsoleIO:
+    """The input and output of a dialog on the command line. Other front ends (e.g. the user simulator)
+    implement the same methods."""
+
+    def __init__(self, typing: bool = False, t2s: bool = False, clock: Clock = REAL_CLOCK) -> None:
+        """
         Args:
-            filename (str): The filename where the keywords are located
+            typing (bool, optional): print the messages character by character. Defaults to False.
+            t2s (bool, optional): read the messages out loud. Defaults to False.
+            clock (Clock, optional): the clock of the delays and the typing. Defaults to the real time.
         """
-        file = open(filename)
-        file = csv.DictReader(file)
-        # Fetch the specific colums which are needed for keyword extraction
-        # In this case |pricerange|area|food|
-        keyword_names = file.fieldnames[1:4]
-        keyword_dict = {key: set() for key in keyword_names}
-
-        # Filter out all the empty keywords
-        for row in file:
-            for keyword in keyword_names:
-                if (row[keyword]) != "":
-                    keyword_dict[keyword].add(row[keyword])
+        self.typing = typing
+        self.t2s = t2s
+        self.clock = clock
+
+    def read(self) -> str:
+        """Returns the next utterance of the user."""
+        return input("User: ")
+
+    def write(self, message: str):
+        """Shows a message of the system."""
+        if self.typing:
+            simulate_typing_print(message, self.clock)
+        else:
+            print(message)
+        if self.t2s:
+            text_to_speech(message)
 
-        self.keyword_dict = keyword_dict
+    def wait(self, seconds: float):
+        """Waits before the system responds."""
+        self.clock.sleep(seconds, "delay")
+
+    def close(self):
+        """Called when the dialog has ended."""
+        # let the speech of the last messages finish before the program exits
+        speech_worker.wait()
 
 
 def text_to_speech(message: str):
@@ -81,27 +133,26 @@ def text_to_speech(message: str):
     if "System:" in message:
         message = message.replace("System:", "")
 
-    engine.say(message)
-    # play the speech
-    engine.runAndWait()
+    # the speech is played in the background, the dialog continues immediately
+    speech_worker.say(message)
 
 
 def pattern_match_request(data):
     """Extracts the specific request type
 
     Args:
-        data (str): The input utterance
+        data (str | Utterance): The input utterance
 
     Returns:
         str : The request type
     """
-    data = data.lower()
+    data = tokenize(data).normalized
 
-    if re.findall("phone", data) != []:
+    if "phone" in data:
         return "phone"
-    elif re.findall("address", data) != []:
+    elif "address" in data:
         return "address"
-    elif re.findall("postcode", data) != []:
+    elif "postcode" in data:
         return "postcode"
     else:
         return None
@@ -111,62 +162,60 @@ def pattern_match_keyword_extraction(data, keyword_dict, context: str):
     """Finds preferences within an utterance
 
     Args:
-        data (str): The input utterance
+        data (str | Utterance): The input utterance
         keyword_dict (dict): The dictionary containing all possible keywords
         context (str): The context of this conversation (ask area, ask pricerange etc.)
 
     Returns:
         dict: A dictionary of the extracted preferences
     """
-    data = data.lower()
+    utterance = tokenize(data)
     temp = None
     result = {}
 
     # Keyword search
-    # Search if there correct spelled keywords within the utterance
-    for key, values in keyword_dict.items():
-        for value in values:
-            if temp := (re.findall(r"\b" + value + r"\b", data)):
-                result[key] = value
+    # Search if there correct spelled keywords within the utterance,
+    # all keywords are compiled into one pattern which is matched in a single pass
+    result.update(get_keyword_matcher(keyword_dict).find(utterance.normalized))
 
-    # Then do pattern search to find the possible misspelled keywords
+    # Then do pattern search on the tokens to find the possible misspelled keywords,
+    # the closest keyword within an edit distance of 2 is looked up in a fuzzy index.
+    # Like the former regular expressions the words after a keyword also match as a prefix,
+    # so "(chinese) foods" and "(cheap) restaurants" are found as well
+    fuzzy_index = get_fuzzy_index(keyword_dict)
 
     # Check for food keyword pattern (* food)
     # Example: "I want to eat (chinese) food"
-    if (temp := re.findall("(\w+) food", data)) and ("food" not in result):
-        for keyword in keyword_dict["food"]:
-            if levdistance(temp[0], keyword) <= 2:
-                result["food"] = keyword
+    if (temp := utterance.tokens_before("food", match_prefix=True)) and ("food" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "food"):
+            result["food"] = keyword
 
     # Check for area keyword pattern (in the *)
     # Example: "I would like a restaurant in the (south) side"
-    if (temp := re.findall(r"in the (\w+)", data)) and ("area" not in result):
-        for keyword in keyword_dict["area"]:
-            if levdistance(temp[0], keyword) <= 2:
-                result["area"] = keyword
+    if (temp := utterance.tokens_after("in", "the")) and ("area" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "area"):
+            result["area"] = keyword
 
     # Check for price range keyword pattern (* priced)
     # Example: "I want the restaurant to be (cheap) priced"
-    if (temp := re.findall(r"(\w+) priced", data)) and ("pricerange" not in result):
-        for keyword in keyword_dict["pricerange"]:
-            if levdistance(temp[0], keyword) <= 2:
-                result["pricerange"] = keyword
+    if (temp := utterance.tokens_before("priced", match_prefix=True)) and ("pricerange" not in result):
+        if keyword := fuzzy_index.closest(temp[0], 2, "pricerange"):
+            result["pricerange"] = keyword
 
     # Check for food/price range keyword pattern (* restaurant)
     # Example: "I want a (Chinese)/(Cheap) restaurant"
-    if (temp := re.findall("(\w+) restaurant", data)) and (
+    if (temp := utterance.tokens_before("restaurant", match_prefix=True)) and (
         "food" or "pricerange" not in result
     ):
-        for key, values in keyword_dict.items():
-            for value in values:
-                if levdistance(temp[0], value) <= 2:
-                    result[key] = value
+        for key in keyword_dict.keys():
+            if value := fuzzy_index.closest(temp[0], 2, key):
+                result[key] = value
 
     # Check for any keyword pattern (any *)
     # Example: "I want any (food)/(area)/(pricerange)"
-    if re.search(r"\b" + "any" + r"\b", data) and (len(result) != 3):
+    if ("any" in utterance.tokens) and (len(result) != 3):
         # Check if the any keyword is bounded to a context within the utterance
-        if temp := re.findall("any (\w+)", data):
+        if temp := utterance.tokens_after("any"):
             for word in temp:
                 for key in keyword_dict.keys():
                     # Specific levdistance handling for the "pricerange" keyword
@@ -185,630 +234,963 @@ def pattern_match_keyword_extraction(data, keyword_dict, context: str):
     return result
 
 
+# the additional preferences, on equal edit distances the first one is used
+ADDITIONAL_REQUIREMENTS = [
+    "touristic",
+    "assigned seats",
+    "children",
+    "romantic",
+]
+additional_requirement_index = FuzzyIndex(ADDITIONAL_REQUIREMENTS)
+
+
 def additional_keyword_extraction(data):
     """Extract the additional information keywords
 
     Args:
-        data (str): The input utterance
+        data (str | Utterance): The input utterance
 
     Returns:
         dict: A dictionary containing the extracted additional preferences
     """
     result = {}
-    # Create list with the additional preferences
-    add_list = [
-        "touristic",
-        "assigned seats",
-        "children",
-        "romantic",
-    ]
-    # Split the utterance into a list of words
-    data = data.split()
     # Check if any word is similair to any of the additional utterances
-    for word in data:
-        for keyword in add_list:
-            if levdistance(word, keyword) <= 2:
-                result["additional_requirement"] = keyword
-                break
+    for word in tokenize(data).tokens:
+        if keyword := additional_requirement_index.closest(word, 2):
+            result["additional_requirement"] = keyword
     return result
 
 
-class Info:
+# the extracted preferences of repeated utterances are memoized, the preferences are cleared when
+# another keyword dictionary is used
+preference_cache = LRUCache(10000)
+additional_preference_cache = LRUCache(10000)
+
+
+def set_nlu_cache_size(max_size: int):
+    """Sets the number of memoized preferences and additional preferences, 0 disables the caches.
+
+    Args:
+        max_size (int): maximum number of results per cache
+    """
+    for cache in (preference_cache, additional_preference_cache):
+        cache.max_size = max_size
+        cache.clear()
+
+
+class Parse:
+    """The understanding of one user utterance: the dialog act and, when they are needed by the
+    transition, the preferences, additional preferences and the request type. All of them are read
+    from the same tokenized utterance and are only extracted once.
+    """
+
     def __init__(
-        self,
-        keyword_dict,
-        extracted_preferences: dict,
-        extracted_preferences_old: dict,
-        configuration,
-        file_paths_config: FilePathsConfig,
+        self, utterance: Utterance, dialog_act: str, keyword_dict, timer=NULL_TIMER
     ) -> None:
+        self.utterance = utterance
+        self.dialog_act = dialog_act
         self.keyword_dict = keyword_dict
-        self.extracted_preferences = extracted_preferences
-        self.extracted_preferences_old = extracted_preferences_old
-        self.file_paths_config = file_paths_config
+        # the extraction is measured as its own stage
+        self.timer = timer
 
-        # Configuration settings by the user
-        (
-            self.t2s,
-            self.delay,
-            self.allow_feedback,
-            self.allow_preference_change,
-            self.typing_delay,
-        ) = configuration
+    def preferences(self, context: str) -> dict:
+        """Returns the preferences of the utterance, see pattern_match_keyword_extraction.
 
+        Args:
+            context (str): The context of this conversation (ask area, ask pricerange etc.)
 
-import sys
+        Returns:
+            dict: A new dictionary of the extracted preferences
+        """
+        with self.timer.measure("extract"):
+            preferences = preference_cache.get_or_compute(
+                (self.utterance.normalized, context),
+                lambda: pattern_match_keyword_extraction(self.utterance, self.keyword_dict, context),
+                self.keyword_dict,
+            )
 
+        # the states change the returned dictionary
+        return dict(preferences)
 
-def simulate_typing_print(message):
-    for char in message:
-        if char == " ":
-            sleep_time = 0.1
+    def additional_preferences(self) -> dict:
+        """Returns the additional preferences of the utterance, see additional_keyword_extraction.
 
-        elif char == "." or char == "!" or char == "?":
-            sleep_time = 0.4
+        Returns:
+            dict: A new dictionary containing the extracted additional preferences
+        """
+        with self.timer.measure("extract"):
+            additional_preferences = additional_preference_cache.get_or_compute(
+                self.utterance.normalized,
+                lambda: additional_keyword_extraction(self.utterance),
+                additional_requirement_index,
+            )
 
-        elif char == ",":
-            sleep_time = 0.2
+        return dict(additional_preferences)
 
-        else:
-            sleep_time = 0.02
+    def request_type(self):
+        """Returns the request type of the utterance, see pattern_match_request.
 
-        print(char, end="")
-        sys.stdout.flush()
-        time.sleep(sleep_time)
+        Returns:
+            str : The request type
+        """
+        with self.timer.measure("extract"):
+            return pattern_match_request(self.utterance)
 
-    print()
 
+def parse_utterance(
+    user_utterance: str, classifier: Model, keyword_dict, timer=NULL_TIMER
+) -> Parse:
+    """Tokenizes an utterance once and classifies its dialog act.
 
-class State:
-    def __init__(self, info: Info) -> None:
-        self.info = info
-        self.keyword_dict = info.keyword_dict
+    Args:
+        user_utterance (str): The input utterance
+        classifier (Model): The dialog act classifier
+        keyword_dict (dict): The dictionary containing all possible keywords
+        timer (optional): measures the extraction of the returned Parse. Defaults to no timing.
 
-        # create two dicts of extracted preferences. the old one always stores the extracted preferences of the previous state
-        # that way the system can give feedback to the user if new preferences were detected
-        self.user_utterance = ""
+    Returns:
+        Parse: The understanding of the utterance
+    """
+    utterance = tokenize(user_utterance)
+    return Parse(utterance, classifier.predict_utterance(utterance), keyword_dict, timer)
+
+
+class DialogContext:
+    """Everything that belongs to one conversation. The states hold no data, so a turn only changes
+    the fields of this object."""
+
+    __slots__ = (
+        "state",
+        "preferences",
+        "preferences_old",
+        "suggestion_ids",
+        "suggestion_index",
+        "suggestion_preferences",
+        "suggestion_seed",
+        "request_utterance",
+        "explanation",
+    )
 
-    def give_preferences_feedback(self):
-        """Return the given preferences to the user so that the user is sure that the system acknowledged their request"""
-        changed_values = {}
+    def __init__(
+        self,
+        state: str = "Welcome",
+        preferences: dict = None,
+        preferences_old: dict = None,
+        suggestion_ids: list[int] = None,
+        suggestion_index: int = None,
+        suggestion_preferences: dict = None,
+        suggestion_seed: int = None,
+        request_utterance: str = None,
+        explanation: str = None,
+    ) -> None:
+        # name of the current state
+        self.state = state
+
+        # the old preferences are the ones before the last inform, that way the system can give
+        # feedback to the user if new preferences were detected
+        self.preferences = {} if preferences is None else preferences
+        self.preferences_old = {} if preferences_old is None else preferences_old
+
+        # the suggestion cursor: the row ids of the restaurants that fit the preferences in a random
+        # order, the position of the suggested one and the preferences the ids were looked up for
+        self.suggestion_ids = suggestion_ids
+        self.suggestion_index = suggestion_index
+        self.suggestion_preferences = suggestion_preferences
+
+        # seed of the order of the suggestions, so a reloaded session suggests the same restaurants
+        if suggestion_seed is None:
+            suggestion_seed = random.getrandbits(32)
+        self.suggestion_seed = suggestion_seed
+
+        # the utterance asking for the details (phone, address, postcode) of the suggested restaurant
+        self.request_utterance = request_utterance
 
-        for key in self.info.extracted_preferences:
-            try:
-                current_preference = self.info.extracted_preferences[key]
-                old_preference = self.info.extracted_preferences_old[key]
+        # why the additional requirement contradicts the preferences
+        self.explanation = explanation
 
-                if current_preference != old_preference:
-                    changed_values[key] = current_preference
+    def to_dict(self) -> dict:
+        """Converts the context to a json serializable dictionary, e.g. to store it in a session.
 
-            except:
-                changed_values[key] = self.info.extracted_preferences[key]
+        Returns:
+            dict: the fields of the context
+        """
+        return {
+            "current_state": self.state,
+            "extracted_preferences": self.preferences,
+            "extracted_preferences_old": self.preferences_old,
+            "suggestion_ids": self.suggestion_ids,
+            "previous_suggestion_index": self.suggestion_index,
+            "suggestion_preferences": self.suggestion_preferences,
+            "suggestion_seed": self.suggestion_seed,
+            "request_utterance": self.request_utterance,
+            "explanation": self.explanation,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> DialogContext:
+        """Creates a context from the dictionary of to_dict.
 
-        n_changed_values = len(list(changed_values.keys()))
-        feedback_string = ""
-        if n_changed_values > 0:
-            feedback_string += "Okay"
-            for key_i, key in enumerate(changed_values):
-                if (key_i + 1) == n_changed_values and n_changed_values > 1:
-                    feedback_string += " and "
-                else:
-                    feedback_string += ", "
-                if key == "food":
-                    feedback_string += (
-                        f"the restaurant should serve {changed_values[key]} food"
-                    )
-                elif key == "area":
-                    feedback_string += (
-                        f"the restaurant should be in the {changed_values[key]}"
-                    )
-                elif key == "pricerange":
-                    feedback_string += f"the price should be {changed_values[key]}"
+        Args:
+            data (dict): the fields of the context
 
-            feedback_string += ". "
+        Returns:
+            DialogContext: the context
+        """
+        return cls(
+            data["current_state"],
+            data["extracted_preferences"],
+            data["extracted_preferences_old"],
+            data["suggestion_ids"],
+            data["previous_suggestion_index"],
+            data.get("suggestion_preferences"),
+            data.get("suggestion_seed"),
+            data["request_utterance"],
+            data.get("explanation"),
+        )
 
-        self.feedback_string = feedback_string
 
-    def run(self, classifier: Model):
-        # enable/disable the feedback for the user that a preference was extracted
-        if self.info.allow_feedback:
-            self.give_preferences_feedback()
-        else:
-            self.feedback_string = ""
+def random_turn_delay() -> float:
+    """Draws the artificial delay before the system responds.
+
+    Returns:
+        float: delay in seconds
+    """
+    return random.uniform(0.5, 2)
 
-        # self.dialog() executes system response
-        # optionally do delay
-        if self.info.delay:
-            time.sleep(random.uniform(0.5, 2))
-        self.dialog()
-        classified_response = classifier.predict_single_sentence(self.user_utterance)
 
-        new_state = self.transition(classified_response)
-        return new_state, classified_response
+# seconds the typing simulation waits after a character
+TYPING_DELAYS = {" ": 0.1, ".": 0.4, "!": 0.4, "?": 0.4, ",": 0.2}
+DEFAULT_TYPING_DELAY = 0.02
 
-    def dialog(self):
-        self.user_utterance = input("User: ")
 
-    def print(self, message: str):
-        if self.info.typing_delay:
-            simulate_typing_print(message)
-        else:
-            print(message)
-        if self.info.t2s:
-            text_to_speech(message)
+def typing_schedule(
+    message: str,
+    delays: dict = TYPING_DELAYS,
+    default_delay: float = DEFAULT_TYPING_DELAY,
+) -> list[tuple[str, float]]:
+    """Computes how long the typing simulation waits after each character of a message.
 
-    def transition(self, input):
-        pass
+    Args:
+        message (str): message to be typed
+        delays (dict, optional): delay of specific characters. Defaults to TYPING_DELAYS.
+        default_delay (float, optional): delay of all other characters. Defaults to DEFAULT_TYPING_DELAY.
 
+    Returns:
+        list[tuple[str, float]]: characters and the delay in seconds after each of them
+    """
+    return [(char, delays.get(char, default_delay)) for char in message]
 
-class Welcome(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
-
-    def dialog(self, return_message=False):
-        message = f"System: {self.feedback_string}Hello, welcome to the restaurant recommender system. You can ask for restaurants by area/price range/food type. How may I help you?"
-        if return_message:
-            return message
-
-        self.print(message)
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart" or input == "repeat":
-            return Welcome(self.info)
-        elif input == "bye":
-            return Goodbye(self.info)
-        elif input == "inform" or input == "hello":
-            # extract preferences
-            self.info.extracted_preferences_old = copy.deepcopy(
-                self.info.extracted_preferences
-            )
-            self.info.extracted_preferences = pattern_match_keyword_extraction(
-                self.user_utterance, self.keyword_dict, None
-            )
-            return AskForInformation(self.info)
 
-        else:
-            return Welcome(self.info)
+def typing_duration(
+    message: str,
+    delays: dict = TYPING_DELAYS,
+    default_delay: float = DEFAULT_TYPING_DELAY,
+) -> float:
+    """Computes how long the typing simulation of a message takes, without a schedule per character.
+
+    Args:
+        message (str): message to be typed
+        delays (dict, optional): delay of specific characters. Defaults to TYPING_DELAYS.
+        default_delay (float, optional): delay of all other characters. Defaults to DEFAULT_TYPING_DELAY.
 
+    Returns:
+        float: the sum of the delays of typing_schedule() in seconds
+    """
+    return len(message) * default_delay + sum(
+        message.count(char) * (delay - default_delay) for char, delay in delays.items()
+    )
 
-class AskForInformation(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
 
-    def dialog(self):
-        user_utterance = "temporary string"
+def simulate_typing_print(message, clock: Clock = REAL_CLOCK):
+    for char, sleep_time in typing_schedule(message):
+        print(char, end="")
+        sys.stdout.flush()
+        clock.sleep(sleep_time, "typing")
+
+    print()
+
+
+class State:
+    """A state of the dialog. The states hold no data of a conversation, one instance of each state is
+    shared by all conversations. What happens after the answer of the user is defined in TRANSITIONS.
+    """
+
+    # name of the state in TRANSITIONS and in the stored sessions
+    name = None
+    # the preference the state asks for, it is the context of the preference extraction
+    slot = None
+    # False if the state only shows its message (if any) and continues without an answer
+    waits_for_input = True
+    # True if the dialog ends in this state
+    final = False
+
+    def enter(self, policy: DialogPolicy, context: DialogContext):
+        """Called when the conversation reaches the state.
+
+        Args:
+            policy (DialogPolicy): the policy of the dialog
+            context (DialogContext): the conversation
+
+        Returns:
+            str | None: the message of the system or None if the state has no message
+        """
+        return None
+
+
+class Welcome(State):
+    name = "Welcome"
+
+    def enter(self, policy, context):
+        return f"System: {policy.feedback(context)}Hello, welcome to the restaurant recommender system. You can ask for restaurants by area/price range/food type. How may I help you?"
 
-        return user_utterance
 
-    def transition(self, input):
-        # analyze preferences and route accordingly
-        if "area" not in self.info.extracted_preferences:
-            return AskArea(self.info)
-        elif "pricerange" not in self.info.extracted_preferences:
-            return AskPrice(self.info)
-        elif "food" not in self.info.extracted_preferences:
-            return AskType(self.info)
-        else:  # everything is filled
-            return AskForAdditionalInformation(self.info)
+class AskForInformation(State):
+    """Routes to the question for the first missing preference."""
+
+    name = "AskForInformation"
+    waits_for_input = False
 
 
 class AskArea(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
-
-    def dialog(self, return_message=False):
-        message = f"System: {self.feedback_string}Which area do you want to go?"
-        if return_message:
-            return message
-        self.print(message)
-
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart":
-            return Welcome(self.info)
-        elif input == "bye":
-            return Goodbye(self.info)
-        elif (
-            input == "negate" or input == "repeat"
-        ):  # if the user negate the ask, we should ask again
-            return AskArea(self.info)
-        elif (
-            input == "deny"
-        ):  # if deny we delete the preferences and we go back to ask for info
-            extracted_preferences = pattern_match_keyword_extraction(
-                self.user_utterance, self.keyword_dict, "area"
-            )
-            already_existing_keys = list(self.info.extracted_preferences.keys())
-            for existing_key in already_existing_keys:
-                if existing_key in list(extracted_preferences.keys()):
-                    del extracted_preferences[existing_key]
-            self.info.extracted_preferences.update(extracted_preferences)
-
-            return AskForInformation(self.info)
-        elif input == "inform":
-            # extract preferences
-            self.info.extracted_preferences_old = copy.deepcopy(
-                self.info.extracted_preferences
-            )
+    name = "AskArea"
+    slot = "area"
 
-            # if we want to allow preferences to be overwritten
-            if self.info.allow_preference_change:
-                self.info.extracted_preferences.update(
-                    pattern_match_keyword_extraction(
-                        self.user_utterance, self.keyword_dict, "area"
-                    )
-                )
-            # else, first delete all the entries of the extracted preferences that are already present in the dict
-            else:
-                extracted_preferences = pattern_match_keyword_extraction(
-                    self.user_utterance, self.keyword_dict, "area"
-                )
-                already_existing_keys = list(self.info.extracted_preferences.keys())
-                for existing_key in already_existing_keys:
-                    if existing_key in list(extracted_preferences.keys()):
-                        del extracted_preferences[existing_key]
-                self.info.extracted_preferences.update(extracted_preferences)
-
-            return AskForInformation(self.info)
-        else:
-            return AskForInformation(self.info)
+    def enter(self, policy, context):
+        return f"System: {policy.feedback(context)}Which area do you want to go?"
 
 
 class AskPrice(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
-
-    def dialog(self, return_message=False):
-        message = f"System: {self.feedback_string}How expensive should the restaurant be?"
-        if return_message:
-            return message
-
-        self.print(message)
-
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart":
-            return Welcome(self.info)
-        elif input == "bye":
-            return Goodbye(self.info)
-        elif (
-            input == "negate" or input == "repeat"
-        ):  # if the user negate the ask, we should ask again
-            return AskPrice(self.info)
-        elif input == "inform":
-            # extract preferences
-            self.info.extracted_preferences_old = copy.deepcopy(
-                self.info.extracted_preferences
-            )
+    name = "AskPrice"
+    slot = "pricerange"
 
-            # if we want to allow preferences to be overwritten
-            if self.info.allow_preference_change:
-                self.info.extracted_preferences.update(
-                    pattern_match_keyword_extraction(
-                        self.user_utterance, self.keyword_dict, "pricerange"
-                    )
-                )
-            # else, first delete all the entries of the extracted preferences that are already present in the dict
-            else:
-                extracted_preferences = pattern_match_keyword_extraction(
-                    self.user_utterance, self.keyword_dict, "pricerange"
-                )
-                already_existing_keys = list(self.info.extracted_preferences.keys())
-                for existing_key in already_existing_keys:
-                    if existing_key in list(extracted_preferences.keys()):
-                        del extracted_preferences[existing_key]
-                self.info.extracted_preferences.update(extracted_preferences)
-
-            return AskForInformation(self.info)
-        else:
-            return AskForInformation(self.info)
+    def enter(self, policy, context):
+        return f"System: {policy.feedback(context)}How expensive should the restaurant be?"
 
 
 class AskType(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
-
-    def dialog(self, return_message=False):
-        message = f"System: {self.feedback_string}What type of food would you like?"
-        if return_message:
-            return message
-        self.print(message)
-
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart":
-            return Welcome(self.info)
-        elif input == "bye":
-            return Goodbye(self.info)
-        elif (
-            input == "negate" or input == "negate"
-        ):  # if the user negate the ask, we should ask again
-            return AskType(self.info)
-        elif input == "inform":
-            # extract preferences
-            self.info.extracted_preferences_old = copy.deepcopy(
-                self.info.extracted_preferences
-            )
+    name = "AskType"
+    slot = "food"
 
-            # if we want to allow preferences to be overwritten
-            if self.info.allow_preference_change:
-                self.info.extracted_preferences.update(
-                    pattern_match_keyword_extraction(
-                        self.user_utterance, self.keyword_dict, "food"
-                    )
-                )
-            # else, first delete all the entries of the extracted preferences that are already present in the dict
-            else:
-                extracted_preferences = pattern_match_keyword_extraction(
-                    self.user_utterance, self.keyword_dict, "food"
-                )
-                already_existing_keys = list(self.info.extracted_preferences.keys())
-                for existing_key in already_existing_keys:
-                    if existing_key in list(extracted_preferences.keys()):
-                        del extracted_preferences[existing_key]
-                self.info.extracted_preferences.update(extracted_preferences)
-
-            return AskForInformation(self.info)
-        else:
-            return AskForInformation(self.info)
+    def enter(self, policy, context):
+        return f"System: {policy.feedback(context)}What type of food would you like?"
 
 
 class AskForAdditionalInformation(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
-        self.restaurant_lookup = RestaurantLookup(info.file_paths_config)
-
-    def dialog(self, return_message=False):
-        message = f"System: {self.feedback_string}Do you have additional requirements?"
-        if return_message:
-            return message
-        self.print(message)
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart":
-            return Welcome(self.info)
-        elif input == "bye":
-            return Goodbye(self.info)
-        elif input == "negate":
-            return Suggestion(self.info)
-        elif input == "inform":
-            extracted_preferences = additional_keyword_extraction(self.user_utterance)
-
-            if "additional_requirement" in extracted_preferences:
-                # check for contradiction
-                (
-                    contradiction_present,
-                    explanation_string,
-                ) = self.restaurant_lookup.check_for_contradiction(
-                    self.info.extracted_preferences,
-                    extracted_preferences["additional_requirement"],
-                )
-
-                if contradiction_present:
-                    # remove additional requirement from preferences dict
-                    return Contradiction(self.info, explanation_string)
-
-            # if we want to allow preferences to be overwritten
-            if self.info.allow_preference_change:
-                self.info.extracted_preferences.update(extracted_preferences)
-            # else, first delete all the entries of the extracted preferences that are already present in the dict
-            else:
-                already_existing_keys = list(self.info.extracted_preferences.keys())
-                for existing_key in already_existing_keys:
-                    if existing_key in list(extracted_preferences.keys()):
-                        del extracted_preferences[existing_key]
-                self.info.extracted_preferences.update(extracted_preferences)
-
-            return Suggestion(self.info)
-        else:
-            return AskForInformation(self.info)
+    name = "AskForAdditionalInformation"
+
+    def enter(self, policy, context):
+        return f"System: {policy.feedback(context)}Do you have additional requirements?"
 
 
 class Suggestion(State):
-    def __init__(
-        self,
-        info: Info,
-        previous_suggestion_index=None,
-    ) -> None:
-        super().__init__(info)
-
-        self.restaurant_lookup = RestaurantLookup(info.file_paths_config)
-        self.previous_suggestion_index = previous_suggestion_index
-        self.suggestions = None
-
-    def dialog(self, return_message=False):
-        self.suggestions = self.restaurant_lookup.lookup(self.info.extracted_preferences)
-        if not self.suggestions.empty:
-            random_index = self.previous_suggestion_index
-            if len(self.suggestions.values) > 1:
-                while self.previous_suggestion_index == random_index:
-                    random_index = random.randrange(0, (len(self.suggestions.values)))
-            else:
-                random_index = 0
-            self.previous_suggestion_index = random_index
-
-            message = f"System: {self.feedback_string}The best restaurant according to your preferences is: {self.suggestions.values[random_index][0]}."
-            if "additional_requirement" in self.info.extracted_preferences:
-                message += f" {self.restaurant_lookup.explain_inference(self.suggestions.iloc[random_index], self.info.extracted_preferences['additional_requirement'])}"
-            if return_message:
-                return message
-            self.print(message)
+    name = "Suggestion"
+
+    def enter(self, policy, context):
+        if context.suggestion_preferences != context.preferences:
+            # new preferences: the fitting restaurants are looked up once and shuffled, the
+            # alternatives are the next ones of this order
+            suggestions = policy.restaurant_lookup.lookup(context.preferences, policy.timer)
+            context.suggestion_ids = [int(restaurant_id) for restaurant_id in suggestions.index]
+            random.Random(
+                f"{context.suggestion_seed}:{sorted(context.preferences.items())}"
+            ).shuffle(context.suggestion_ids)
+            context.suggestion_preferences = dict(context.preferences)
+            context.suggestion_index = 0
+        elif context.suggestion_ids:
+            # no restaurant is repeated until all of them were suggested
+            context.suggestion_index = (context.suggestion_index + 1) % len(context.suggestion_ids)
+
+        if not context.suggestion_ids:
+            context.suggestion_index = None
+            return "System: No restaurants found."
+
+        restaurant = policy.restaurant_lookup.restaurant(
+            context.suggestion_ids[context.suggestion_index]
+        )
 
-        else:
-            message = "System: No restaurants found."
-            if return_message:
-                return message
-            self.print(message)
-        user_utterance = super().dialog()
-
-        return user_utterance
-
-    def transition(self, input):
-        # after the suggestion it can negate/ back to ask again for parameters | it can ask for alternative
-        # it can say bye | it can confirm
-        if input == "restart":
-            return Welcome(self.info)
-        elif input == "bye" or input == "thankyou":
-            return Goodbye(self.info)
-        elif input == "negate":
-            return Welcome(self.info)
-        elif input == "reqalts" or input == "reqmore":
-            return Suggestion(
-                self.info,
-                self.previous_suggestion_index,
-            )
-        elif input == "request":
-            return GiveDetails(
-                self.info,
-                self.suggestions.values,
-                self.previous_suggestion_index,
-                self.user_utterance,
-            )
-        elif (
-            input == "deny"
-        ):  # if deny we delete the preferences and we go back to ask for info
-            extracted_preferences = pattern_match_keyword_extraction(
-                self.user_utterance, self.keyword_dict, None
-            )
-            already_existing_keys = list(self.info.extracted_preferences.keys())
-            for existing_key in already_existing_keys:
-                if existing_key in list(extracted_preferences.keys()):
-                    del extracted_preferences[existing_key]
-            self.info.extracted_preferences.update(extracted_preferences)
+        message = f"System: {policy.feedback(context)}The best restaurant according to your preferences is: {restaurant['restaurantname']}."
+        if "additional_requirement" in context.preferences:
+            message += f" {policy.restaurant_lookup.explain_inference(restaurant, context.preferences['additional_requirement'], policy.timer)}"
 
-            return AskForInformation(self.info)
-        else:
-            return Suggestion(
-                self.info,
-                previous_suggestion_index=self.previous_suggestion_index,
-            )  # if the user does not like the suggestion which is the next state?
+        return message
 
 
 class GiveDetails(State):
-    def __init__(
-        self,
-        info: Info,
-        suggestions,
-        previous_suggestion_index,
-        request_utterance,
-    ) -> None:
-        super().__init__(info)
+    name = "GiveDetails"
 
-        self.previous_suggestion_index = previous_suggestion_index
-        self.suggestions = suggestions
-        self.request_utterance = request_utterance
+    def enter(self, policy, context):
+        request_type = None
+        if context.suggestion_index is not None and context.request_utterance is not None:
+            request_type = pattern_match_request(context.request_utterance)
+            restaurant = policy.restaurant_lookup.restaurant(
+                context.suggestion_ids[context.suggestion_index]
+            ).values
 
-    def dialog(self, return_message=False):
-        request_type = pattern_match_request(self.request_utterance)
         # Give the according information with the request type
         if request_type == "phone":
-            message = f"System: {self.feedback_string}The phone number of this restaurant is: {self.suggestions[self.previous_suggestion_index][4]}"
-
+            return f"System: {policy.feedback(context)}The phone number of this restaurant is: {restaurant[4]}"
         elif request_type == "address":
-            message = f"System: {self.feedback_string}The address number of this restaurant is: {self.suggestions[self.previous_suggestion_index][5]}"
-
+            return f"System: {policy.feedback(context)}The address number of this restaurant is: {restaurant[5]}"
         elif request_type == "postcode":
-            message = f"System: {self.feedback_string}The postcode of this restaurant is: {self.suggestions[self.previous_suggestion_index][6]}"
-
+            return f"System: {policy.feedback(context)}The postcode of this restaurant is: {restaurant[6]}"
         else:
-            message = "Sorry I can't understand this request"
-        if return_message:
-            return message
-
-        self.print(message)
-
-        user_utterance = super().dialog()
-        return user_utterance
-
-    def transition(self, input):
-        if input == "restart":
-            return Welcome(self.info)
-        elif (
-            input == "bye"
-            or input == "thankyou"
-            or input == "ack"
-            or input == "confirm"
-            or input == "affirm"
-        ):
-            return Goodbye(self.info)
-        elif input == "repeat":
-            return GiveDetails(
-                self.info,
-                self.suggestions,
-                self.previous_suggestion_index,
-                self.request_utterance,
-            )
-        elif input == "request":
-            return GiveDetails(
-                self.info,
-                self.suggestions,
-                self.previous_suggestion_index,
-                self.user_utterance,
-            )
-        elif input == "negate" or input == "reqalts":
-            return Suggestion(
-                self.info,
-                self.previous_suggestion_index,
-            )
-        else:
-            return Goodbye(self.info)
+            return "Sorry I can't understand this request"
 
 
 class Contradiction(State):
     """This state only serves as a way to return the explanation of the contradiction to the user.
     It only is a way to control the flow of the program.therefore is not featured in the diagram.
+    """
+
+    name = "Contradiction"
+    waits_for_input = False
+
+    def enter(self, policy, context):
+        return f"System: {context.explanation} The additional requirement was removed."
+
 
+class Goodbye(State):
+    name = "Goodbye"
+    final = True
+
+    def enter(self, policy, context):
+        return "System: Goodbye, have a nice day!"
+
+
+# one instance of every state, shared by all conversations
+STATES = {
+    state.name: state
+    for state in (
+        Welcome(),
+        AskForInformation(),
+        AskArea(),
+        AskPrice(),
+        AskType(),
+        AskForAdditionalInformation(),
+        Suggestion(),
+        GiveDetails(),
+        Contradiction(),
+        Goodbye(),
+    )
+}
+
+
+def merge_preferences(preferences: dict, extracted_preferences: dict, overwrite: bool):
+    """Adds extracted preferences to the known preferences.
+
+    Args:
+        preferences (dict): the known preferences, they are changed
+        extracted_preferences (dict): the new preferences
+        overwrite (bool): if known preferences may be changed, otherwise only new ones are added
     """
+    for key, value in extracted_preferences.items():
+        if overwrite or key not in preferences:
+            preferences[key] = value
+
+
+# the actions of the transitions. an action may return the name of another next state than the one of
+# the transition table
+
+
+def replace_preferences(policy: DialogPolicy, state: State, context: DialogContext, parse: Parse):
+    """Replaces all known preferences by the preferences of the utterance."""
+    context.preferences_old = dict(context.preferences)
+    context.preferences = parse.preferences(state.slot)
+
+
+def update_preferences(policy: DialogPolicy, state: State, context: DialogContext, parse: Parse):
+    """Adds the preferences of the utterance, they overwrite the known ones if preference changes are allowed."""
+    context.preferences_old = dict(context.preferences)
+    merge_preferences(
+        context.preferences, parse.preferences(state.slot), policy.allow_preference_change
+    )
+
+
+def add_new_preferences(policy: DialogPolicy, state: State, context: DialogContext, parse: Parse):
+    """Adds the preferences of the utterance that are not known yet."""
+    merge_preferences(context.preferences, parse.preferences(state.slot), False)
+
 
-    def __init__(self, info: Info, explanation_string: str) -> None:
-        super().__init__(info)
-        self.explanation_string = explanation_string
+def add_additional_requirement(
+    policy: DialogPolicy, state: State, context: DialogContext, parse: Parse
+):
+    """Adds the additional requirement of the utterance unless it contradicts the preferences."""
+    extracted_preferences = parse.additional_preferences()
 
-    def dialog(self, return_message=False):
-        message = (
-            "System: "
-            + self.explanation_string
-            + " The additional requirement was removed."
+    if "additional_requirement" in extracted_preferences:
+        contradiction_present, explanation_string = policy.restaurant_lookup.check_for_contradiction(
+            context.preferences, extracted_preferences["additional_requirement"]
         )
 
-        if return_message:
-            return message
+        if contradiction_present:
+            context.explanation = explanation_string
+            return "Contradiction"
+
+    merge_preferences(context.preferences, extracted_preferences, policy.allow_preference_change)
+
+
+def ask_missing_preference(
+    policy: DialogPolicy, state: State, context: DialogContext, parse: Parse
+):
+    """Goes to the question for the first missing preference."""
+    for slot, state_name in (("area", "AskArea"), ("pricerange", "AskPrice"), ("food", "AskType")):
+        if slot not in context.preferences:
+            return state_name
+
+
+def set_request(policy: DialogPolicy, state: State, context: DialogContext, parse: Parse):
+    """Remembers the utterance which asks for details of the suggested restaurant."""
+    context.request_utterance = parse.utterance.text
+
+
+ACTIONS = {
+    action.__name__: action
+    for action in (
+        replace_preferences,
+        update_preferences,
+        add_new_preferences,
+        add_additional_requirement,
+        ask_missing_preference,
+        set_request,
+    )
+}
+
+# state -> dialog act -> (action, next state). "*" is used for all other dialog acts and for the
+# states which do not wait for an answer
+TRANSITIONS = {
+    "Welcome": {
+        "restart": (None, "Welcome"),
+        "repeat": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "inform": ("replace_preferences", "AskForInformation"),
+        "hello": ("replace_preferences", "AskForInformation"),
+        "*": (None, "Welcome"),
+    },
+    "AskForInformation": {
+        # everything is filled if no preference is missing
+        "*": ("ask_missing_preference", "AskForAdditionalInformation"),
+    },
+    "AskArea": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        # if the user negate the ask, we should ask again
+        "negate": (None, "AskArea"),
+        "repeat": (None, "AskArea"),
+        "deny": ("add_new_preferences", "AskForInformation"),
+        "inform": ("update_preferences", "AskForInformation"),
+        "*": (None, "AskForInformation"),
+    },
+    "AskPrice": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "negate": (None, "AskPrice"),
+        "repeat": (None, "AskPrice"),
+        "inform": ("update_preferences", "AskForInformation"),
+        "*": (None, "AskForInformation"),
+    },
+    "AskType": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "negate": (None, "AskType"),
+        "repeat": (None, "AskType"),
+        "inform": ("update_preferences", "AskForInformation"),
+        "*": (None, "AskForInformation"),
+    },
+    "AskForAdditionalInformation": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "negate": (None, "Suggestion"),
+        "inform": ("add_additional_requirement", "Suggestion"),
+        "*": (None, "AskForInformation"),
+    },
+    "Suggestion": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "thankyou": (None, "Goodbye"),
+        "negate": (None, "Welcome"),
+        "reqalts": (None, "Suggestion"),
+        "reqmore": (None, "Suggestion"),
+        "request": ("set_request", "GiveDetails"),
+        # if deny we add the new preferences and we go back to ask for info
+        "deny": ("add_new_preferences", "AskForInformation"),
+        "*": (None, "Suggestion"),
+    },
+    "GiveDetails": {
+        "restart": (None, "Welcome"),
+        "bye": (None, "Goodbye"),
+        "thankyou": (None, "Goodbye"),
+        "ack": (None, "Goodbye"),
+        "confirm": (None, "Goodbye"),
+        "affirm": (None, "Goodbye"),
+        "repeat": (None, "GiveDetails"),
+        "request": ("set_request", "GiveDetails"),
+        "negate": (None, "Suggestion"),
+        "reqalts": (None, "Suggestion"),
+        "*": (None, "Goodbye"),
+    },
+    "Contradiction": {
+        "*": (None, "AskForAdditionalInformation"),
+    },
+}
+
+
+class TransitionTable:
+    """The compiled TRANSITIONS, the actions are looked up once and all names are checked."""
+
+    def __init__(self, transitions: dict, states: dict, actions: dict) -> None:
+        """Compiles the transitions.
 
-        self.print(message)
-        user_utterance = "temporary string"
+        Args:
+            transitions (dict): state -> dialog act -> (action name, next state)
+            states (dict): name -> state
+            actions (dict): name -> action
 
-        return user_utterance
+        Raises:
+            Exception: Raises exception if a state or action does not exist or a state has no default transition
+        """
+        # state -> dialog act -> (action, next state)
+        self.rows = {}
 
-    def transition(self, input):
-        return AskForAdditionalInformation(self.info)
+        for state_name, row in transitions.items():
+            if state_name not in states:
+                raise Exception(f"The transitions contain the unknown state {state_name}")
+            if "*" not in row:
+                raise Exception(f"The state {state_name} has no default transition (*)")
 
+            compiled_row = {}
+            for dialog_act, (action_name, next_state) in row.items():
+                if action_name is not None and action_name not in actions:
+                    raise Exception(f"The transitions contain the unknown action {action_name}")
+                if next_state not in states:
+                    raise Exception(f"The transitions contain the unknown state {next_state}")
 
-class Goodbye(State):
-    def __init__(self, info: Info) -> None:
-        super().__init__(info)
+                action = actions[action_name] if action_name is not None else None
+                compiled_row[dialog_act] = (action, next_state)
+
+            self.rows[state_name] = compiled_row
+
+        for state_name, state in states.items():
+            if not state.final and state_name not in self.rows:
+                raise Exception(f"The state {state_name} has no transitions")
+
+    def lookup(self, state_name: str, dialog_act: str) -> tuple:
+        """Returns the action and next state of a dialog act in a state.
+
+        Args:
+            state_name (str): name of the current state
+            dialog_act (str): the classified dialog act
+
+        Returns:
+            tuple: the action (or None) and the name of the next state
+        """
+        row = self.rows[state_name]
+        return row.get(dialog_act) or row["*"]
+
+
+TRANSITION_TABLE = TransitionTable(TRANSITIONS, STATES, ACTIONS)
+
+
+class DialogPolicy:
+    """Applies the transition table to conversations. It only holds the shared resources and the
+    configuration, so a single policy serves all conversations."""
+
+    def __init__(
+        self,
+        resources: DialogResources,
+        table: TransitionTable = TRANSITION_TABLE,
+        timer=METRICS,
+    ) -> None:
+        # the resources are shared between all dialogs and must not be modified
+        self.resources = resources
+        self.keyword_dict = resources.keyword_dict
+        self.restaurant_lookup = resources.restaurant_lookup
+        self.table = table
+        # measures the lookup and the explanation of the suggestions
+        self.timer = timer
 
-    def dialog(self, return_message=False):
-        message = "System: Goodbye, have a nice day!"
+        # Configuration settings by the user
+        (
+            self.t2s,
+            self.delay,
+            self.allow_feedback,
+            self.allow_preference_change,
+            self.typing_delay,
+        ) = resources.configuration
 
-        if return_message:
-            return message
+    def transition(self, context: DialogContext, parse: Parse = None):
+        """Moves the conversation to the next state.
 
-        self.print(message)
+        Args:
+            context (DialogContext): the conversation
+            parse (Parse, optional): the answer of the user, None in the states which do not wait for an answer
+        """
+        dialog_act = parse.dialog_act if parse is not None else "*"
+        action, next_state = self.table.lookup(context.state, dialog_act)
+
+        if action is not None:
+            next_state = action(self, STATES[context.state], context, parse) or next_state
+
+        context.state = next_state
+
+    def prompt(self, context: DialogContext) -> list[str]:
+        """Enters the current state and returns the messages of the system. The states which do not
+        wait for an answer are passed until the user is asked something or the dialog ends.
+
+        Args:
+            context (DialogContext): the conversation
+
+        Returns:
+            list[str]: the messages
+        """
+        messages = []
+        while True:
+            state = STATES[context.state]
+
+            message = state.enter(self, context)
+            if message is not None:
+                messages.append(message)
+
+            if state.waits_for_input or state.final:
+                return messages
+
+            self.transition(context, None)
+
+    def feedback(self, context: DialogContext) -> str:
+        """Return the given preferences to the user so that the user is sure that the system acknowledged their request
+
+        Args:
+            context (DialogContext): the conversation
+
+        Returns:
+            str: the feedback or an empty string if feedback is disabled
+        """
+        if not self.allow_feedback:
+            return ""
+
+        changed_values = {
+            key: value
+            for key, value in context.preferences.items()
+            if context.preferences_old.get(key) != value
+        }
+
+        n_changed_values = len(changed_values)
+        feedback_string = ""
+        if n_changed_values > 0:
+            feedback_string += "Okay"
+            for key_i, key in enumerate(changed_values):
+                if (key_i + 1) == n_changed_values and n_changed_values > 1:
+                    feedback_string += " and "
+                else:
+                    feedback_string += ", "
+                if key == "food":
+                    feedback_string += f"the restaurant should serve {changed_values[key]} food"
+                elif key == "area":
+                    feedback_string += f"the restaurant should be in the {changed_values[key]}"
+                elif key == "pricerange":
+                    feedback_string += f"the price should be {changed_values[key]}"
+
+            feedback_string += ". "
+
+        return feedback_string
+
+
+@dataclass(frozen=True)
+class Reply:
+    """The answer of the system to a turn of a conversation."""
+
+    # messages of the system, each starts with "System: "
+    messages: list[str]
+    # the state after the turn
+    state: str
+    # the state before the turn, None when a conversation is started
+    previous_state: str = None
+    # the classified dialog act of the utterance, None when a conversation is started
+    dialog_act: str = None
+    # the known preferences after the turn
+    preferences: dict = None
+
+    @property
+    def text(self) -> str:
+        """The messages as one text without the "System: " prefixes, as shown in the chat."""
+        return " ".join(message.replace("System: ", "") for message in self.messages)
+
+    @property
+    def finished(self) -> bool:
+        return STATES[self.state].final
+
+
+class _Session:
+    __slots__ = ("lock", "context", "expires_at")
+
+    def __init__(self) -> None:
+        # one turn of a session at a time, different sessions run concurrently
+        self.lock = threading.Lock()
+        self.context = None
+        self.expires_at = 0.0
+
+
+class DialogEngine:
+    """Runs many conversations at once. Each conversation is identified by a session id and has its
+    own DialogContext, all of them share the policy and the classifier.
+
+    step() and start() can be called from multiple threads, turns of different sessions run
+    concurrently (so concurrent classifications can be batched by the MicroBatchScheduler). Async
+    code can use astep(). Sessions which were not used for ttl seconds and the least recently used
+    sessions beyond max_sessions are evicted.
+
+    By default the contexts are kept in memory. With a SessionStore (e.g. the SQLite store shared
+    by multiple worker processes) the context is loaded from the store before and saved to it after
+    every turn, the engine then only keeps the locks of the sessions.
+    """
+
+    def __init__(
+        self,
+        get_classifier: Callable[[], Model],
+        resources: DialogResources,
+        max_sessions: int = 10000,
+        ttl: float = 3600,
+        store: SessionStore = None,
+        timer=METRICS,
+        clock: Clock = REAL_CLOCK,
+    ) -> None:
+        """
+        Args:
+            get_classifier (Callable[[], Model]): returns the dialog act classifier, called once per turn
+                so that a replaced model is used
+            resources (DialogResources): The shared resources
+            max_sessions (int, optional): maximum number of sessions. Defaults to 10000.
+            ttl (float, optional): seconds after the last turn until a session is evicted. Defaults to 3600.
+            store (SessionStore, optional): stores the contexts instead of the engine. Defaults to None.
+            timer (optional): measures the stages of each turn, e.g. a StageTimer. Defaults to the
+                latency metrics of the process.
+            clock (Clock, optional): the clock of the expiration times. Defaults to the real time.
+        """
+        self.get_classifier = get_classifier
+        self.policy = DialogPolicy(resources, timer=timer)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.store = store
+        self.timer = timer
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        # session id -> session, ordered from least to most recently used
+        self._sessions = OrderedDict()
+
+    def _session(self, session_id: str) -> _Session:
+        """Returns the session of an id, a new one if it does not exist or is expired."""
+        now = self.clock.now()
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.expires_at < now:
+                session = _Session()
+                self._sessions[session_id] = session
+
+            session.expires_at = now + self.ttl
+            self._sessions.move_to_end(session_id)
+
+            # drop expired sessions from the least recently used end
+            while self._sessions:
+                oldest_session = next(iter(self._sessions.values()))
+                if oldest_session.expires_at >= now and len(self._sessions) <= self.max_sessions:
+                    break
+                self._sessions.popitem(last=False)
+
+        return session
+
+    def _load(self, session_id: str, session: _Session):
+        if self.store is None:
+            return session.context
+
+        data = self.store.get(session_id)
+        return DialogContext.from_dict(data) if data is not None else None
+
+    def _save(self, session_id: str, session: _Session, context: DialogContext):
+        if self.store is None:
+            session.context = context
+        else:
+            self.store.set(session_id, context.to_dict())
+
+    def start(self, session_id: str) -> Reply:
+        """Starts a new conversation, an existing conversation of the session is replaced.
+
+        Args:
+            session_id (str): id of the session
+
+        Returns:
+            Reply: the welcome message
+        """
+        session = self._session(session_id)
+        with session.lock, self.timer.measure("start"):
+            context = DialogContext()
+            with self.timer.measure("render"):
+                messages = self.policy.prompt(context)
+            with self.timer.measure("session_save"):
+                self._save(session_id, session, context)
+
+        return Reply(messages, context.state, preferences=dict(context.preferences))
+
+    def step(self, session_id: str, utterance: str) -> Reply:
+        """Runs a turn of a conversation. If the session does not exist (anymore) or its dialog has
+        ended, the utterance is the first answer of a new conversation.
+
+        Args:
+            session_id (str): id of the session
+            utterance (str): the utterance of the user
+
+        Returns:
+            Reply: the answer of the system
+        """
+        session = self._session(session_id)
+        with session.lock:
+            with self.timer.measure("session_load"):
+                context = self._load(session_id, session)
+            if context is None or STATES[context.state].final:
+                context = DialogContext()
+            previous_state = context.state
+
+            # the stages are counted for the state the turn started in
+            with self.timer.measure("turn", previous_state):
+                with self.timer.measure("classify"):
+                    parse = parse_utterance(
+                        utterance, self.get_classifier(), self.policy.keyword_dict, self.timer
+                    )
+                with self.timer.measure("transition"):
+                    self.policy.transition(context, parse)
+                with self.timer.measure("render"):
+                    messages = self.policy.prompt(context)
+                with self.timer.measure("session_save"):
+                    self._save(session_id, session, context)
+
+        return Reply(
+            messages, context.state, previous_state, parse.dialog_act, dict(context.preferences)
+        )
+
+    async def astep(self, session_id: str, utterance: str) -> Reply:
+        """step() for asyncio. The turn runs in the default executor, so the event loop is not
+        blocked while the utterance is classified.
+
+        Args:
+            session_id (str): id of the session
+            utterance (str): the utterance of the user
+
+        Returns:
+            Reply: the answer of the system
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.step, session_id, utterance)
+
+    def end(self, session_id: str):
+        """Removes a session.
+
+        Args:
+            session_id (str): id of the session
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.store is not None:
+            self.store.delete(session_id)
 
-    def run(self):
-        self.dialog()
+    def __len__(self):
+        return len(self._sessions)
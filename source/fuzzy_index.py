@@ -0,0 +1,170 @@
+import math
+from typing import Iterable, Mapping
+
+from Levenshtein import distance as levdistance
+
+
+def deletes(word: str, max_distance: int) -> set[str]:
+    """Returns all strings that are created by removing at most max_distance characters of a word.
+
+    Args:
+        word (str): the word
+        max_distance (int): the maximal number of removed characters
+
+    Returns:
+        set[str]: the word and all its deletes
+    """
+    result = {word}
+    current = {word}
+    for _ in range(max_distance):
+        current = {
+            variant[:i] + variant[i + 1 :] for variant in current for i in range(len(variant))
+        }
+        result |= current
+
+    return result
+
+
+class FuzzyIndex:
+    """Finds all words within an edit distance with a symmetric delete index (as used by SymSpell).
+
+    If two words are within edit distance k, removing at most k characters of each of them results in
+    a common string. So every word is stored under all of its deletes and a query only has to look up
+    its own deletes. The edit distance is then only computed for the few words that were found,
+    instead of for every word, so the time of a query barely depends on the number of words.
+    """
+
+    def __init__(self, words: Iterable[str], max_distance: int = 2) -> None:
+        """Builds the index.
+
+        Args:
+            words (Iterable[str]): words of the index
+            max_distance (int, optional): the maximal edit distance of queries. Defaults to 2.
+        """
+        self.max_distance = max_distance
+        # word -> order of insertion, used to resolve ties
+        self.words = {}
+        # delete -> words that have this delete
+        self.index = {}
+
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        """Adds a word to the index, duplicates are ignored.
+
+        Args:
+            word (str): the word
+        """
+        if word in self.words:
+            return
+
+        self.words[word] = len(self.words)
+        for variant in deletes(word, self.max_distance):
+            self.index.setdefault(variant, []).append(word)
+
+    def search(self, word: str, max_distance: int = None) -> list[tuple[int, str]]:
+        """Finds all words within an edit distance.
+
+        Args:
+            word (str): the query
+            max_distance (int, optional): the maximal edit distance, at most the one of the index.
+                Defaults to the one of the index.
+
+        Returns:
+            list[tuple[int, str]]: edit distance and word of all matches, the closest first and on
+                ties the word that was added first
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        elif max_distance > self.max_distance:
+            raise Exception(
+                f"The index only supports edit distances up to {self.max_distance}, "
+                f"not {max_distance}"
+            )
+
+        n_deletes = sum(math.comb(len(word), n) for n in range(max_distance + 1))
+        if len(self.words) <= n_deletes:
+            # comparing a small vocabulary with the word is cheaper than creating all its deletes
+            candidates = self.words
+        else:
+            candidates = set()
+            for variant in deletes(word, max_distance):
+                candidates.update(self.index.get(variant, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = levdistance(word, candidate, score_cutoff=max_distance)
+            if distance <= max_distance:
+                matches.append((distance, self.words[candidate], candidate))
+
+        matches.sort()
+        return [(distance, candidate) for distance, _, candidate in matches]
+
+    def closest(self, word: str, max_distance: int = None):
+        """Finds the closest word within an edit distance, on ties the word that was added first.
+
+        Args:
+            word (str): the query
+            max_distance (int, optional): the maximal edit distance. Defaults to the one of the index.
+
+        Returns:
+            str | None: the closest word or None if no word is close enough
+        """
+        matches = self.search(word, max_distance)
+        if not matches:
+            return None
+
+        return matches[0][1]
+
+
+class FuzzyKeywordIndex:
+    """Finds misspelled keywords. Holds a fuzzy index for the values of every keyword category."""
+
+    def __init__(self, keyword_dict: Mapping[str, frozenset], max_distance: int = 2) -> None:
+        """Builds the indices.
+
+        Args:
+            keyword_dict (Mapping[str, frozenset]): keyword category -> possible values
+            max_distance (int, optional): the maximal edit distance of queries. Defaults to 2.
+        """
+        # sorted so that ties are always resolved the same way
+        self.indices = {
+            key: FuzzyIndex(sorted(values), max_distance) for key, values in keyword_dict.items()
+        }
+
+    def closest(self, word: str, max_distance: int, key: str):
+        """Finds the closest value of a keyword category within an edit distance.
+
+        Args:
+            word (str): the possibly misspelled word
+            max_distance (int): the maximal edit distance
+            key (str): the keyword category
+
+        Returns:
+            str | None: the value or None if no value is close enough
+        """
+        return self.indices[key].closest(word, max_distance)
+
+
+# indices of the keyword dictionaries that were used, keyed by the id of the dictionary
+_indices = {}
+
+
+def get_fuzzy_index(keyword_dict: Mapping[str, frozenset]) -> FuzzyKeywordIndex:
+    """Returns the fuzzy index of a keyword dictionary, it is only built on the first call.
+
+    Args:
+        keyword_dict (Mapping[str, frozenset]): keyword category -> possible values
+
+    Returns:
+        FuzzyKeywordIndex: the index
+    """
+    entry = _indices.get(id(keyword_dict))
+
+    # the dictionary is stored with the index so its id can not be reused by another object
+    if entry is None or entry[0] is not keyword_dict:
+        entry = (keyword_dict, FuzzyKeywordIndex(keyword_dict))
+        _indices[id(keyword_dict)] = entry
+
+    return entry[1]
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+from source.background_thread import BackgroundThread
+from source.model import Model
+from source.nlu import Utterance
+
+
+class MicroBatchScheduler:
+    """Collects the classification requests of concurrent chat turns and classifies them together.
+
+    A request that arrives while nothing else is waiting is classified right away, so a single chat
+    turn is not delayed. Requests arrive together when turns are concurrent, or while the previous
+    batch is classified: then the batch waits until max_batch_size requests are waiting, or until
+    the first one waited max_wait seconds, and all waiting utterances are classified with a single
+    call of predict_utterances. The utterances are tokenized by the caller, so a batch is classified
+    from their tokens like a single utterance. Identical utterances that are waiting at the same
+    time are only classified once.
+
+    The scheduler offers the same predict_single_sentence and predict_utterance methods as the models,
+    so it can be used as the classifier of the dialog manager. The background thread is started by
+    the first request of each process, so the scheduler can be created before a server forks.
+    """
+
+    def __init__(
+        self,
+        get_model: Callable[[], Model],
+        max_wait: float = 0.005,
+        max_batch_size: int = 32,
+    ) -> None:
+        """
+        Args:
+            get_model (Callable[[], Model]): returns the model used for a batch, e.g. ModelRegistry.get
+            max_wait (float, optional): seconds the first request of a batch waits for more requests if
+                other requests are waiting as well. Defaults to 0.005.
+            max_batch_size (int, optional): maximum number of utterances per batch. Defaults to 32.
+        """
+        self.get_model = get_model
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+
+        self._reset()
+
+        self._thread = BackgroundThread(self._run, "inference-scheduler", on_start=self._reset)
+
+    def _reset(self):
+        """Creates the state of a new process, nothing of a parent process is kept."""
+        self._condition = threading.Condition()
+        # text -> tokenized utterance and future of its classification, in order of arrival
+        self._pending = OrderedDict()
+        self._first_arrival = None
+
+        # metrics
+        self.n_requests = 0
+        self.n_coalesced = 0
+        self.n_batches = 0
+        self.n_classified = 0
+        self.batch_size_counts = {}
+
+    def submit(self, utterance: Utterance) -> Future:
+        """Queues an utterance for classification.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            Future: future of the classification result
+        """
+        self._thread.ensure_started()
+
+        with self._condition:
+            self.n_requests += 1
+
+            waiting = self._pending.get(utterance.text)
+            if waiting is not None:
+                # the same utterance is already waiting, share its result
+                self.n_coalesced += 1
+                return waiting[1]
+
+            future = Future()
+            self._pending[utterance.text] = (utterance, future)
+            if len(self._pending) == 1:
+                self._first_arrival = time.monotonic()
+
+            self._condition.notify()
+
+        return future
+
+    def predict_single_sentence(self, user_input: str) -> str:
+        """Classifies a single sentence as part of the next batch.
+
+        Args:
+            user_input (str): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        return self.submit(Utterance(user_input)).result()
+
+    def predict_utterance(self, utterance: Utterance) -> str:
+        """Classifies a tokenized utterance as part of the next batch.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        return self.submit(utterance).result()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                # a single request is sent right away. if others are waiting as well, wait for more
+                # requests until the batch is full or the first request waited long enough
+                while 1 < len(self._pending) < self.max_batch_size:
+                    remaining = self._first_arrival + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = []
+                while self._pending and len(batch) < self.max_batch_size:
+                    batch.append(self._pending.popitem(last=False)[1])
+
+                # the requests that did not fit start the next batch
+                if self._pending:
+                    self._first_arrival = time.monotonic()
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[tuple[Utterance, Future]]):
+        utterances = [utterance for utterance, _ in batch]
+
+        try:
+            preds = self.get_model().predict_utterances(utterances)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), pred in zip(batch, preds):
+            future.set_result(pred)
+
+        with self._condition:
+            self.n_batches += 1
+            self.n_classified += len(batch)
+            self.batch_size_counts[len(batch)] = (
+                self.batch_size_counts.get(len(batch), 0) + 1
+            )
+
+    def stats(self) -> dict:
+        """Returns the metrics of the scheduler.
+
+        Returns:
+            dict: number of requests, coalesced requests, batches, the mean batch size, the mean fill
+                of the batches relative to max_batch_size and the number of batches per batch size
+        """
+        self._thread.ensure_started()
+
+        with self._condition:
+            mean_batch_size = self.n_classified / self.n_batches if self.n_batches else 0.0
+
+            return {
+                "requests": self.n_requests,
+                "coalesced": self.n_coalesced,
+                "batches": self.n_batches,
+                "mean_batch_size": mean_batch_size,
+                "mean_batch_fill": mean_batch_size / self.max_batch_size,
+                "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            }
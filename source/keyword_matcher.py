@@ -0,0 +1,74 @@
+import re
+from typing import Mapping
+
+
+class KeywordMatcher:
+    """Finds all correctly spelled keywords of an utterance in a single pass.
+
+    The keyword values are compiled into one regular expression. For every keyword category it
+    contains an optional lookahead with the alternation of all values of that category, so matches of
+    different categories can overlap (e.g. the area "north" in the food "north american") and are all
+    found while the utterance is scanned once.
+    """
+
+    def __init__(self, keyword_dict: Mapping[str, frozenset]) -> None:
+        """Compiles the keywords.
+
+        Args:
+            keyword_dict (Mapping[str, frozenset]): keyword category -> possible values
+        """
+        self.keys = list(keyword_dict.keys())
+
+        lookaheads = []
+        for i, key in enumerate(self.keys):
+            # longer values first, so "modern european" is preferred over "european"
+            values = sorted(keyword_dict[key], key=lambda value: (-len(value), value))
+            alternation = "|".join(re.escape(value) for value in values)
+            lookaheads.append(rf"(?=\b(?P<g{i}>{alternation})\b)?")
+
+        # only try to match at the start of words
+        self.pattern = re.compile(r"\b" + "".join(lookaheads))
+
+    def find(self, data: str) -> dict:
+        """Finds the keywords within a lowercase utterance.
+
+        Args:
+            data (str): The lowercase utterance
+
+        Returns:
+            dict: keyword category -> found value. If several values of a category are found, the
+                longest one is used (the first one if they are equally long).
+        """
+        result = {}
+
+        for match in self.pattern.finditer(data):
+            for i, value in enumerate(match.groups()):
+                if value is not None:
+                    key = self.keys[i]
+                    if key not in result or len(value) > len(result[key]):
+                        result[key] = value
+
+        return result
+
+
+# matchers of the keyword dictionaries that were used, keyed by the id of the dictionary
+_matchers = {}
+
+
+def get_keyword_matcher(keyword_dict: Mapping[str, frozenset]) -> KeywordMatcher:
+    """Returns the compiled matcher of a keyword dictionary, it is only compiled on the first call.
+
+    Args:
+        keyword_dict (Mapping[str, frozenset]): keyword category -> possible values
+
+    Returns:
+        KeywordMatcher: the matcher
+    """
+    entry = _matchers.get(id(keyword_dict))
+
+    # the dictionary is stored with the matcher so its id can not be reused by another object
+    if entry is None or entry[0] is not keyword_dict:
+        entry = (keyword_dict, KeywordMatcher(keyword_dict))
+        _matchers[id(keyword_dict)] = entry
+
+    return entry[1]
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+# upper bounds of the histogram buckets in seconds, from 50us (a cached turn) to 10s (loading the model)
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# help texts of the metrics in the Prometheus output
+DESCRIPTIONS = {
+    "dialog_stage_seconds": "Time of a stage of the dialog system, by the state the turn started in.",
+    "http_request_seconds": "Time of a request of the web app, by endpoint and status.",
+}
+
+# returned by measure() if the metrics are disabled
+_NULL_CONTEXT = nullcontext()
+
+
+class Histogram:
+    """Counts observations in buckets like a Prometheus histogram."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            buckets (tuple, optional): sorted upper bounds of the buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = buckets
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+
+class LatencyMetrics:
+    """Collects latency histograms of the stages of the dialog system and of the web requests.
+
+    Stages are measured with spans (measure()) which can be nested, e.g. the lookup of the
+    restaurants is a span within the rendering of the suggestion. Each span covers its nested spans.
+    A span without a state takes the state of the span it is nested in, so everything that happens
+    during a turn is counted for the state the turn started in.
+
+    If the metrics are disabled, measure() returns a shared empty context manager and observe()
+    returns immediately, so the instrumented code barely slows down.
+    """
+
+    def __init__(self, enabled: bool = False, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            enabled (bool, optional): collect the metrics. Defaults to False.
+            buckets (tuple, optional): upper bounds of the histogram buckets. Defaults to DEFAULT_BUCKETS.
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+
+        self._lock = threading.Lock()
+        # metric name -> labels -> histogram
+        self._histograms = {}
+        # the states of the running spans of each thread
+        self._local = threading.local()
+
+    def observe(self, name: str, labels: dict, seconds: float):
+        """Adds an observation to a histogram.
+
+        Args:
+            name (str): name of the metric
+            labels (dict): label name -> value
+            seconds (float): the observed time
+        """
+        if not self.enabled:
+            return
+
+        key = tuple(labels.items())
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def measure(self, stage: str, state: str = None):
+        """Measures the code within the with block as a stage.
+
+        Args:
+            stage (str): name of the stage
+            state (str, optional): the dialog state. Defaults to the state of the enclosing span.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+
+        states = getattr(self._local, "states", None)
+        if states is None:
+            states = self._local.states = []
+        if state is None:
+            state = states[-1] if states else "none"
+
+        return _Span(self, states, stage, state)
+
+    def _observe_stage(self, stage: str, state: str, seconds: float):
+        # the histograms of the stages are looked up without creating a dictionary of labels
+        key = (("stage", stage), ("state", state))
+        with self._lock:
+            histograms = self._histograms.setdefault("dialog_stage_seconds", {})
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def reset(self):
+        """Removes all observations."""
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Returns all histograms in the Prometheus text format.
+
+        Returns:
+            str: the metrics
+        """
+        lines = []
+        with self._lock:
+            for name, histograms in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+
+                for labels, histogram in sorted(histograms.items()):
+                    label_string = format_labels(labels)
+                    separator = "," if label_string else ""
+                    braces = f"{{{label_string}}}" if label_string else ""
+
+                    # the buckets of Prometheus count all observations up to their bound
+                    cumulative_count = 0
+                    bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+                    for bound, count in zip(bounds, histogram.counts):
+                        cumulative_count += count
+                        lines.append(
+                            f'{name}_bucket{{{label_string}{separator}le="{bound}"}} {cumulative_count}'
+                        )
+                    lines.append(f"{name}_sum{braces} {histogram.sum}")
+                    lines.append(f"{name}_count{braces} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _Span:
+    """A running measurement of LatencyMetrics.measure()."""
+
+    __slots__ = ("metrics", "states", "stage", "state", "start")
+
+    def __init__(self, metrics: LatencyMetrics, states: list, stage: str, state: str) -> None:
+        self.metrics = metrics
+        self.states = states
+        self.stage = stage
+        self.state = state
+
+    def __enter__(self):
+        self.states.append(self.state)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.states.pop()
+        self.metrics._observe_stage(self.stage, self.state, elapsed)
+
+
+# the metrics of the process, enabled by the web app with the metrics option of the serving configuration
+METRICS = LatencyMetrics()
@@ -1,10 +1,13 @@
-import numpy as np
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn import tree
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
-from source.datacreator import Datacreator
 from source.model import Model
+from source.nlu import Utterance, bag_of_words, supports_tokens, token_counts
+
+# sklearn and numpy are imported when they are needed, so importing this module is fast
+if TYPE_CHECKING:
+    from source.datacreator import Datacreator
 
 
 class MLModel(Model):
@@ -21,6 +24,9 @@ class MLModel(Model):
         Raises:
             Exception: Raises exception if the dataset is not created yet.
         """
+        import numpy as np
+        from sklearn.feature_extraction.text import CountVectorizer
+
         # call upon this self instance to be able to change it
         datacreator_instance = self.datacreator_instance
 
@@ -55,6 +61,75 @@ class MLModel(Model):
         pred = self.model.predict(encoded_user_input)
         return pred[0]
 
+    def predict_utterance(self, utterance: Utterance) -> str:
+        """Predicts an utterance that is already tokenized with the specified ml model.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        # build the bag of words from the tokens instead of tokenizing the string again
+        if supports_tokens(self.vectorizer):
+            encoded_user_input = bag_of_words(self.vectorizer, [utterance])
+        else:
+            encoded_user_input = self.vectorizer.transform([utterance.text])
+
+        pred = self.model.predict(encoded_user_input)
+        return pred[0]
+
+    def predict_utterances(self, utterances: list[Utterance]) -> list[str]:
+        """Predicts utterances that are already tokenized at once with the specified ml model.
+
+        Args:
+            utterances (list[Utterance]): Inputs to be classified.
+
+        Returns:
+            list[str]: classification results
+        """
+        if len(utterances) == 0:
+            return []
+
+        # build the bag of words from the tokens instead of tokenizing the strings again
+        if supports_tokens(self.vectorizer):
+            encoded_utterances = bag_of_words(self.vectorizer, utterances)
+        else:
+            encoded_utterances = self.vectorizer.transform(
+                [utterance.text for utterance in utterances]
+            )
+
+        return self.model.predict(encoded_utterances).tolist()
+
+    def predict_batch(
+        self, utterances: list[str], return_probabilities: bool = False
+    ) -> tuple[list[str], list[dict[str, float]]]:
+        """Predicts a list of sentences at once with the specified ml model.
+
+        Args:
+            utterances (list[str]): Inputs to be classified.
+            return_probabilities (bool, optional): Set if the class probabilities should be returned. Defaults to False.
+
+        Returns:
+            tuple[list[str], list[dict[str, float]]]: classification results and, if wanted, the probability of each class per input (otherwise None)
+        """
+        if len(utterances) == 0:
+            return [], ([] if return_probabilities else None)
+
+        # encode all sentences with a single call, the result is a sparse matrix
+        encoded_utterances = self.vectorizer.transform(utterances)
+        preds = self.model.predict(encoded_utterances).tolist()
+
+        probabilities = None
+        if return_probabilities:
+            classes = self.model.classes_
+            probabilities = [
+                dict(zip(classes, row))
+                for row in self.model.predict_proba(encoded_utterances).tolist()
+            ]
+
+        return preds, probabilities
+
     def fit(self):
         """Fits the ML Model. Defined in child classes."""
         pass
@@ -73,11 +148,77 @@ class DecisionTreeModel(MLModel):
 
     def fit(self):
         """Fits the Decision Tree Classifier on the training data."""
+        from sklearn import tree
+
         model = tree.DecisionTreeClassifier()
         print("Fitting decision tree classifier ...\n")
         model.fit(self.x_train_encoded, self.datacreator_instance.y_train)
         self.model = model
 
+    def predict_utterance(self, utterance: Utterance) -> str:
+        """Predicts an utterance that is already tokenized by walking the fitted tree.
+
+        For a single utterance the input validation of sklearn takes much longer than the tree
+        itself, so the tree is walked directly on the token counts. The result is the same as the
+        one of predict_single_sentence.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        if not supports_tokens(self.vectorizer):
+            return super().predict_utterance(utterance)
+
+        left, right, features, thresholds, labels = self._tree_arrays()
+        counts = token_counts(self.vectorizer, utterance)
+
+        node = 0
+        # leaves have no children (-1)
+        while left[node] != -1:
+            if counts.get(features[node], 0) <= thresholds[node]:
+                node = left[node]
+            else:
+                node = right[node]
+
+        return labels[node]
+
+    def predict_utterances(self, utterances: list[Utterance]) -> list[str]:
+        """Predicts utterances that are already tokenized by walking the fitted tree for each of them.
+
+        The batches of the MicroBatchScheduler are small, so walking the tree is faster than the
+        input validation of sklearn here as well.
+
+        Args:
+            utterances (list[Utterance]): Inputs to be classified.
+
+        Returns:
+            list[str]: classification results
+        """
+        return [self.predict_utterance(utterance) for utterance in utterances]
+
+    def _tree_arrays(self) -> tuple:
+        """Returns the children, split features, thresholds and predicted class of every node as
+        python lists, they are created on the first call (and again if the model is refitted)."""
+        cached = getattr(self, "_tree_cache", None)
+        if cached is not None and cached[0] is self.model:
+            return cached[1]
+
+        tree = self.model.tree_
+        # the class with the most training samples in a node, the first one on ties like predict
+        labels = self.model.classes_.take(tree.value[:, 0, :].argmax(axis=1)).tolist()
+        arrays = (
+            tree.children_left.tolist(),
+            tree.children_right.tolist(),
+            tree.feature.tolist(),
+            tree.threshold.tolist(),
+            labels,
+        )
+
+        self._tree_cache = (self.model, arrays)
+        return arrays
+
 
 class LogisticRegressionModel(MLModel):
     def __init__(self, datacreator_instance: Datacreator) -> None:
@@ -85,6 +226,8 @@ class LogisticRegressionModel(MLModel):
 
     def fit(self):
         """Fits the Logistic Regressio Classifier on the training data."""
+        from sklearn.linear_model import LogisticRegression
+
         model = LogisticRegression(max_iter=1000000)
         print("Fitting logistic regression classifier ...\n")
 
@@ -1,6 +1,11 @@
-from sklearn.metrics import accuracy_score, precision_score, recall_score
-from source.datacreator import Datacreator
-import numpy as np
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+# sklearn and numpy are imported when they are needed, so importing this module is fast
+if TYPE_CHECKING:
+    from source.datacreator import Datacreator
+    from source.nlu import Utterance
 
 
 # parent model class
@@ -18,10 +23,38 @@ class Model:
     def predict_single_sentence(self, user_input: str):
         pass
 
+    def predict_batch(self, utterances: list[str], return_probabilities: bool = False):
+        pass
+
+    def predict_utterance(self, utterance: Utterance) -> str:
+        """Classifies an utterance that is already tokenized.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        return self.predict_single_sentence(utterance.text)
+
+    def predict_utterances(self, utterances: list[Utterance]) -> list[str]:
+        """Classifies utterances that are already tokenized.
+
+        Args:
+            utterances (list[Utterance]): Inputs to be classified.
+
+        Returns:
+            list[str]: classification results
+        """
+        return self.predict_batch([utterance.text for utterance in utterances])[0]
+
     def evaluate(self):
         """
         Calculates different metrics for the model and saves the metrics as attributes of the class.
         """
+        import numpy as np
+        from sklearn.metrics import accuracy_score, precision_score, recall_score
+
         self.accuracy = accuracy_score(self.datacreator_instance.y_test, self.preds)
         self.precision = precision_score(
             self.datacreator_instance.y_test,
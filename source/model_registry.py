@@ -0,0 +1,106 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+from source.metrics import METRICS
+
+
+class ModelRegistry:
+    """Keeps a single loaded instance of a pickled model artifact per process.
+
+    The loaded model is shared read-only between all threads. Whenever the artifact on disk changes
+    (detected by its modification time and confirmed by its content hash) the new model is loaded
+    and swapped in atomically, requests that are still running keep using the old instance.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initializes the registry without loading the model yet.
+
+        Args:
+            path (str): path to the pickled model artifact
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+        # (model, version, mtime) is replaced as a whole so readers never see a half updated entry
+        self._entry = None
+
+        self.load_time = None
+        self.loaded_at = None
+
+    @staticmethod
+    def compute_version(path: str) -> str:
+        """Computes the version of a model artifact as the hash of its content.
+
+        Args:
+            path (str): path to the model artifact
+
+        Returns:
+            str: first 12 characters of the sha256 hash
+        """
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+
+        return sha256.hexdigest()[:12]
+
+    def get(self):
+        """Returns the currently active model. Loads it on the first call and reloads it if the
+        artifact changed on disk.
+
+        Returns:
+            Model: the loaded model
+        """
+        entry = self._entry
+        mtime = os.stat(self.path).st_mtime_ns
+
+        if entry is not None and entry[2] == mtime:
+            return entry[0]
+
+        with self._lock:
+            # another thread could have reloaded the model while we waited for the lock
+            entry = self._entry
+            if entry is not None and entry[2] == mtime:
+                return entry[0]
+
+            version = self.compute_version(self.path)
+            if entry is not None and entry[1] == version:
+                # only the modification time changed, the content is the same
+                self._entry = (entry[0], version, mtime)
+                return entry[0]
+
+            start = time.perf_counter()
+            with open(self.path, "rb") as f, METRICS.measure("model_load"):
+                model = pickle.load(f)
+            self.load_time = time.perf_counter() - start
+            self.loaded_at = time.time()
+
+            self._entry = (model, version, mtime)
+            print(f"Loaded model {self.path} (version {version}) in {self.load_time:.2f}s")
+
+            return model
+
+    @property
+    def version(self):
+        """Version (content hash) of the active model or None if nothing is loaded yet."""
+        entry = self._entry
+        if entry is None:
+            return None
+
+        return entry[1]
+
+    def info(self) -> dict:
+        """Returns information about the active model.
+
+        Returns:
+            dict: path, version, load time in seconds and the unix time the model was loaded at
+        """
+        return {
+            "path": self.path,
+            "version": self.version,
+            "load_time": self.load_time,
+            "loaded_at": self.loaded_at,
+        }
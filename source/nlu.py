@@ -0,0 +1,159 @@
+import re
+
+# a token is a sequence of letters, digits and underscores
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# the default token pattern of the CountVectorizer, its tokens are the tokens with at least 2 characters
+VECTORIZER_TOKEN_PATTERN = r"(?u)\b\w\w+\b"
+
+
+class Utterance:
+    """A user utterance which is normalized and split into tokens once.
+
+    The classifier features, the preference extraction and the request detection all read from the
+    same instance instead of lowercasing, splitting and scanning the raw text again.
+    """
+
+    __slots__ = ("text", "normalized", "tokens", "offsets")
+
+    def __init__(self, text: str) -> None:
+        """Normalizes and tokenizes the utterance.
+
+        Args:
+            text (str): the raw utterance
+        """
+        self.text = text
+        self.normalized = text.lower()
+
+        self.tokens = []
+        # (start, end) of each token within the normalized utterance
+        self.offsets = []
+        for match in TOKEN_PATTERN.finditer(self.normalized):
+            self.tokens.append(match.group())
+            self.offsets.append(match.span())
+
+    def tokens_after(self, *words: str) -> list[str]:
+        """Returns the tokens that directly follow a sequence of words, e.g. "in the (south)".
+
+        Args:
+            words (str): the sequence of words
+
+        Returns:
+            list[str]: the following token of every occurrence of the sequence
+        """
+        n = len(words)
+        tokens = self.tokens
+        return [
+            tokens[i + n]
+            for i in range(len(tokens) - n)
+            if tokens[i] == words[0] and tuple(tokens[i : i + n]) == words
+        ]
+
+    def tokens_before(self, word: str, match_prefix: bool = False) -> list[str]:
+        """Returns the tokens that directly precede a word, e.g. "(chinese) food".
+
+        Args:
+            word (str): the word
+            match_prefix (bool, optional): also match tokens that start with the word, e.g. the
+                plural "restaurants" for "restaurant". Defaults to False.
+
+        Returns:
+            list[str]: the preceding token of every occurrence of the word
+        """
+        tokens = self.tokens
+        if match_prefix:
+            return [tokens[i - 1] for i in range(1, len(tokens)) if tokens[i].startswith(word)]
+
+        return [tokens[i - 1] for i in range(1, len(tokens)) if tokens[i] == word]
+
+
+def tokenize(data) -> Utterance:
+    """Returns the tokenized utterance, an utterance that is already tokenized is returned as is.
+
+    Args:
+        data (str | Utterance): the raw or tokenized utterance
+
+    Returns:
+        Utterance: the tokenized utterance
+    """
+    if isinstance(data, Utterance):
+        return data
+
+    return Utterance(data)
+
+
+def supports_tokens(vectorizer) -> bool:
+    """Checks if the bag of words of a CountVectorizer can be built from the tokens of an utterance.
+
+    Args:
+        vectorizer (CountVectorizer): the fitted vectorizer
+
+    Returns:
+        bool: True if the vectorizer uses the default lowercase unigram tokenization
+    """
+    return (
+        vectorizer.analyzer == "word"
+        and vectorizer.lowercase
+        and vectorizer.ngram_range == (1, 1)
+        and vectorizer.token_pattern == VECTORIZER_TOKEN_PATTERN
+        and vectorizer.preprocessor is None
+        and vectorizer.tokenizer is None
+        and vectorizer.stop_words is None
+        and vectorizer.strip_accents is None
+        and not vectorizer.binary
+    )
+
+
+def token_counts(vectorizer, utterance: Utterance) -> dict[int, int]:
+    """Counts the tokens of an utterance that are in the vocabulary of a fitted CountVectorizer.
+
+    Args:
+        vectorizer (CountVectorizer): the fitted vectorizer
+        utterance (Utterance): the tokenized utterance
+
+    Returns:
+        dict[int, int]: feature index -> count
+    """
+    vocabulary = vectorizer.vocabulary_
+
+    counts = {}
+    for token in utterance.tokens:
+        index = vocabulary.get(token)
+        if index is not None:
+            counts[index] = counts.get(index, 0) + 1
+
+    return counts
+
+
+def bag_of_words(vectorizer, utterances: list[Utterance]):
+    """Encodes tokenized utterances into the bag of words of a fitted CountVectorizer.
+
+    Gives the same matrix as vectorizer.transform on the raw utterances if supports_tokens(vectorizer)
+    is True, without tokenizing them again.
+
+    Args:
+        vectorizer (CountVectorizer): the fitted vectorizer
+        utterances (list[Utterance]): the tokenized utterances
+
+    Returns:
+        scipy.sparse.csr_matrix: token counts, one row per utterance
+    """
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    indices = []
+    counts = []
+    indptr = [0]
+    for utterance in utterances:
+        row = token_counts(vectorizer, utterance)
+
+        # the CountVectorizer sorts the indices of each row
+        for index in sorted(row):
+            indices.append(index)
+            counts.append(row[index])
+        indptr.append(len(indices))
+
+    return csr_matrix(
+        (np.array(counts, dtype=vectorizer.dtype), indices, indptr),
+        shape=(len(utterances), len(vectorizer.vocabulary_)),
+    )
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from source.nlu import Utterance
+
+
+class LRUCache:
+    """Memoizes results of the language understanding, e.g. the dialog act of "thank you goodbye".
+
+    If the cache is full the least recently used result is evicted. Every result belongs to an owner,
+    the object it was computed with (the model or the keyword dictionary). When a result of another
+    owner is requested the cache is cleared, so results of a replaced model or vocabulary are never
+    returned.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        """
+        Args:
+            max_size (int): maximum number of results, 0 disables the cache
+        """
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        # key -> result, ordered from least to most recently used
+        self._results = OrderedDict()
+        self._owner = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, key: Hashable, function: Callable, owner):
+        """Returns the cached result of a key or computes and caches it.
+
+        Args:
+            key (Hashable): the key, e.g. the normalized utterance
+            function (Callable): computes the result if it is not cached
+            owner (object): the object the result is computed with
+
+        Returns:
+            the result
+        """
+        with self._lock:
+            if owner is not self._owner:
+                if self._owner is not None:
+                    self.invalidations += 1
+                self._results.clear()
+                self._owner = owner
+
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+
+            self.misses += 1
+
+        # computed without holding the lock, two threads may compute the same result once
+        result = function()
+
+        if self.max_size > 0:
+            with self._lock:
+                if owner is self._owner:
+                    self._results[key] = result
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_size:
+                        self._results.popitem(last=False)
+
+        return result
+
+    def clear(self):
+        """Removes all results."""
+        with self._lock:
+            self._results.clear()
+            self._owner = None
+
+    def stats(self) -> dict:
+        """Returns the counters of the cache.
+
+        Returns:
+            dict: size, max size, hits, misses, hit rate and number of invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._results),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._results)
+
+
+class CachedClassifier:
+    """Memoizes the dialog acts of a classifier by the normalized utterance.
+
+    Offers the same predict_single_sentence and predict_utterance methods as the models, so it can be
+    used as the classifier of the dialog manager. The cache is cleared when get_model returns another
+    model, e.g. after the model registry reloaded a changed artifact.
+    """
+
+    def __init__(
+        self,
+        get_classifier: Callable,
+        get_model: Callable,
+        max_size: int = 10000,
+    ) -> None:
+        """
+        Args:
+            get_classifier (Callable): returns the classifier (a model or the micro batch scheduler)
+                of the utterances that are not cached
+            get_model (Callable): returns the currently active model, e.g. ModelRegistry.get
+            max_size (int, optional): maximum number of cached dialog acts. Defaults to 10000.
+        """
+        self.get_classifier = get_classifier
+        self.get_model = get_model
+        self.cache = LRUCache(max_size)
+
+    def predict_single_sentence(self, user_input: str) -> str:
+        """Classifies a single sentence or returns the cached dialog act.
+
+        Args:
+            user_input (str): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        return self.predict_utterance(Utterance(user_input))
+
+    def predict_utterance(self, utterance: Utterance) -> str:
+        """Classifies a tokenized utterance or returns the cached dialog act.
+
+        Args:
+            utterance (Utterance): Input to be classified.
+
+        Returns:
+            str: classification result
+        """
+        # the vectorizer lowercases the utterance, so the normalized utterance has the same dialog act
+        return self.cache.get_or_compute(
+            utterance.normalized,
+            lambda: self.get_classifier().predict_utterance(utterance),
+            self.get_model(),
+        )
+
+    def stats(self) -> dict:
+        """Returns the counters of the cache, see LRUCache.stats."""
+        return self.cache.stats()
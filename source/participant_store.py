@@ -0,0 +1,283 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+
+from source.clock import REAL_CLOCK, Clock
+
+
+class ParticipantStore:
+    """Allocates participant numbers for the user study and keeps track of the counterbalancing of
+    the conditions with and without word delay.
+
+    All updates happen in SQLite transactions, so concurrent requests (also from different worker
+    processes) never lose updates. The free participant numbers are shuffled once when the database
+    is created, so allocating a number only takes the first entry of that pool.
+
+    Every visit of the chat page allocates a number, but most visits never complete the forms. A
+    number is therefore only leased: if the participant has not completed the forms within the lease
+    time, the number goes back to the end of the pool.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        n_numbers: int = 1000,
+        legacy_file: str = None,
+        lease_time: float = 7200,
+        clock: Clock = REAL_CLOCK,
+    ) -> None:
+        """Creates the database if it does not exist yet.
+
+        Args:
+            db_path (str): path to the database file
+            n_numbers (int, optional): participant numbers are drawn from 0 to n_numbers - 1. Defaults to 1000.
+            legacy_file (str, optional): json file of the old file based allocation whose numbers and
+                counters are taken over when the database is created. Defaults to None.
+            lease_time (float, optional): seconds after which a number that was not completed is
+                allocated again. Defaults to 7200.
+            clock (Clock, optional): the clock of the lease times. Defaults to the real time.
+        """
+        self.db_path = db_path
+        self.n_numbers = n_numbers
+        self.lease_time = lease_time
+        self.clock = clock
+
+        # sqlite connections can not be shared between threads
+        self._local = threading.local()
+
+        # the connection of the setup is closed, so a server which creates the store before it forks
+        # does not pass an open connection to its workers
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                created = self._create_tables(connection)
+                if created:
+                    self._fill_pool(connection, legacy_file)
+                connection.execute("COMMIT")
+            except:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # transactions are started explicitly
+        connection = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        # each thread of each process has its own connection, a forked worker must not use the
+        # connections of its parent
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+    @staticmethod
+    def _create_tables(connection: sqlite3.Connection) -> bool:
+        """Creates the tables.
+
+        Returns:
+            bool: True if the tables did not exist before
+        """
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'free_numbers'"
+        ).fetchone()
+        if exists:
+            return False
+
+        connection.execute(
+            "CREATE TABLE free_numbers (position INTEGER PRIMARY KEY, number INTEGER NOT NULL UNIQUE)"
+        )
+        connection.execute(
+            "CREATE TABLE participants ("
+            "number INTEGER PRIMARY KEY, status TEXT NOT NULL, word_delay INTEGER, updated_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE TABLE counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        connection.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, 0)",
+            [
+                ("started_with_word_delay",),
+                ("started_without_word_delay",),
+                ("completed_with_word_delay",),
+                ("completed_without_word_delay",),
+            ],
+        )
+        return True
+
+    def _fill_pool(self, connection: sqlite3.Connection, legacy_file: str):
+        """Shuffles the participant numbers into the free pool and takes over the legacy data."""
+        used_numbers = set()
+
+        if legacy_file is not None and os.path.exists(legacy_file):
+            with open(legacy_file) as f:
+                data = json.load(f)
+
+            now = self.clock.timestamp()
+            for number in data["completed_numbers"]:
+                connection.execute(
+                    "INSERT OR REPLACE INTO participants (number, status, word_delay, updated_at) VALUES (?, 'completed', NULL, ?)",
+                    (number, now),
+                )
+            for number in data["assigned_numbers"]:
+                connection.execute(
+                    "INSERT OR IGNORE INTO participants (number, status, word_delay, updated_at) VALUES (?, 'assigned', NULL, ?)",
+                    (number, now),
+                )
+            used_numbers.update(data["completed_numbers"])
+            used_numbers.update(data["assigned_numbers"])
+
+            # in the old file the counters were increased when the forms were completed
+            connection.execute(
+                "UPDATE counters SET value = ? WHERE name IN ('started_with_word_delay', 'completed_with_word_delay')",
+                (data["started_with_word_delay"],),
+            )
+            connection.execute(
+                "UPDATE counters SET value = ? WHERE name IN ('started_without_word_delay', 'completed_without_word_delay')",
+                (data["started_without_word_delay"],),
+            )
+
+        free_numbers = [
+            number for number in range(self.n_numbers) if number not in used_numbers
+        ]
+        random.shuffle(free_numbers)
+        connection.executemany(
+            "INSERT INTO free_numbers (position, number) VALUES (?, ?)",
+            enumerate(free_numbers),
+        )
+
+    def _release_expired(self, connection: sqlite3.Connection, now: float):
+        """Puts the numbers whose lease expired without completion back to the end of the pool."""
+        expired_numbers = [
+            number
+            for (number,) in connection.execute(
+                "SELECT number FROM participants WHERE status = 'assigned' AND updated_at < ? ORDER BY updated_at",
+                (now - self.lease_time,),
+            )
+        ]
+        if not expired_numbers:
+            return
+
+        (last_position,) = connection.execute(
+            "SELECT COALESCE(MAX(position), -1) FROM free_numbers"
+        ).fetchone()
+        connection.executemany(
+            "DELETE FROM participants WHERE number = ?", [(number,) for number in expired_numbers]
+        )
+        connection.executemany(
+            "INSERT INTO free_numbers (position, number) VALUES (?, ?)",
+            enumerate(expired_numbers, last_position + 1),
+        )
+
+    def allocate(self) -> tuple[int, bool]:
+        """Allocates a new participant number and the condition the participant starts with.
+
+        Raises:
+            Exception: Raises exception if all participant numbers are completed.
+
+        Returns:
+            tuple[int, bool]: participant number and if the participant starts with word delay
+        """
+        now = self.clock.timestamp()
+
+        connection = self._connection()
+        # the write lock is taken at the start, so no other transaction can allocate the same number
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._release_expired(connection, now)
+
+            row = connection.execute(
+                "SELECT position, number FROM free_numbers ORDER BY position LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                position, participant_number = row
+                connection.execute("DELETE FROM free_numbers WHERE position = ?", (position,))
+            else:
+                # all numbers are leased: like the old allocation, which only kept the last
+                # reservations, the oldest one that was not completed is given away
+                row = connection.execute(
+                    "SELECT number FROM participants WHERE status = 'assigned' ORDER BY updated_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    raise Exception("There are no free participant numbers left!")
+
+                (participant_number,) = row
+                connection.execute(
+                    "DELETE FROM participants WHERE number = ?", (participant_number,)
+                )
+
+            counters = self._counters(connection)
+            # counterbalance like the old file based allocation: start with the condition that was
+            # completed less often. most visits are never completed, so they must not count. on a tie
+            # the condition of fewer running participants is used, so a group of participants who
+            # start at the same time is split between the conditions
+            completed_with = counters["completed_with_word_delay"]
+            completed_without = counters["completed_without_word_delay"]
+            if completed_with == completed_without:
+                running = dict(
+                    connection.execute(
+                        "SELECT word_delay, COUNT(*) FROM participants WHERE status = 'assigned' GROUP BY word_delay"
+                    ).fetchall()
+                )
+                word_delay = running.get(1, 0) <= running.get(0, 0)
+            else:
+                word_delay = completed_with < completed_without
+            counter_name = (
+                "started_with_word_delay" if word_delay else "started_without_word_delay"
+            )
+            connection.execute(
+                "UPDATE counters SET value = value + 1 WHERE name = ?", (counter_name,)
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO participants (number, status, word_delay, updated_at) VALUES (?, 'assigned', ?, ?)",
+                (participant_number, word_delay, now),
+            )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+        return participant_number, word_delay
+
+    def complete(self, participant_number: int, word_delay: bool):
+        """Marks a participant as completed.
+
+        Args:
+            participant_number (int): number of the participant
+            word_delay (bool): if the participant started with word delay
+        """
+        counter_name = (
+            "completed_with_word_delay" if word_delay else "completed_without_word_delay"
+        )
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            updated = connection.execute(
+                "UPDATE participants SET status = 'completed', updated_at = ? WHERE number = ? AND status = 'assigned'",
+                (self.clock.timestamp(), participant_number),
+            ).rowcount
+            # only count each participant once
+            if updated:
+                connection.execute(
+                    "UPDATE counters SET value = value + 1 WHERE name = ?", (counter_name,)
+                )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _counters(connection: sqlite3.Connection) -> dict:
+        return dict(connection.execute("SELECT name, value FROM counters").fetchall())
+
+    def counters(self) -> dict:
+        """Returns the counters of started and completed participants per condition."""
+        return self._counters(self._connection())
@@ -0,0 +1,63 @@
+import csv
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from source.config import FilePathsConfig
+from source.restaurant_lookup import RestaurantLookup
+
+
+@dataclass(frozen=True)
+class DialogResources:
+    """Read-only data that is shared by all dialogs. It is created once at startup so that
+    constructing a dialog state does not need any file I/O."""
+
+    keyword_dict: Mapping[str, frozenset]
+    restaurant_lookup: RestaurantLookup
+    configuration: tuple
+    file_paths_config: FilePathsConfig
+
+
+def fetch_keywords(filename: str) -> Mapping[str, frozenset]:
+    """Fetches all the keywords which are needed for the keyword extraction
+
+    Args:
+        filename (str): The filename where the keywords are located
+
+    Returns:
+        Mapping[str, frozenset]: read-only mapping of the keyword category to its possible values
+    """
+    with open(filename) as f:
+        file = csv.DictReader(f)
+        # Fetch the specific colums which are needed for keyword extraction
+        # In this case |pricerange|area|food|
+        keyword_names = file.fieldnames[1:4]
+        keyword_dict = {key: set() for key in keyword_names}
+
+        # Filter out all the empty keywords
+        for row in file:
+            for keyword in keyword_names:
+                if (row[keyword]) != "":
+                    keyword_dict[keyword].add(row[keyword])
+
+    return MappingProxyType(
+        {key: frozenset(values) for key, values in keyword_dict.items()}
+    )
+
+
+def load_resources(configuration, file_paths_config: FilePathsConfig) -> DialogResources:
+    """Reads the keywords, the restaurant data and the inference rules.
+
+    Args:
+        configuration (list[bool]): configuration of the dialog manager
+        file_paths_config (FilePathsConfig): Contains used file paths.
+
+    Returns:
+        DialogResources: the shared resources
+    """
+    return DialogResources(
+        keyword_dict=fetch_keywords(file_paths_config.extended_restaurant_info_path),
+        restaurant_lookup=RestaurantLookup(file_paths_config),
+        configuration=tuple(configuration),
+        file_paths_config=file_paths_config,
+    )
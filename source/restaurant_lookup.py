@@ -1,50 +1,109 @@
-import pandas as pd
+from __future__ import annotations
+
 import json
+import threading
+from typing import TYPE_CHECKING
 
 from source.config import FilePathsConfig
+from source.metrics import METRICS
+from source.nlu_cache import LRUCache
+
+# pandas is imported when the restaurant data is loaded, so importing this module is fast
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class RestaurantLookup:
     """Defines functionalities to lookup restaurants and also inference based on given preferences."""
 
     def __init__(self, file_paths_config: FilePathsConfig) -> None:
-        """Reads restaurant data and inference rules.
+        """Reads the inference rules. The restaurant data is read when it is used first.
 
         Args:
             file_paths_config (FilePathsConfig): Contains used file paths.
         """
-        self.data = pd.read_csv(file_paths_config.extended_restaurant_info_path)
-        self.additional_requirement_rules = json.load(
-            open(file_paths_config.additional_requirement_rules_path)
-        )
+        self.restaurant_info_path = file_paths_config.extended_restaurant_info_path
+        self._data = None
+        self._data_lock = threading.Lock()
+
+        # the dialogs ask for the same few combinations of preferences again and again
+        self._lookup_cache = LRUCache(1024)
+        # restaurant id -> row of the restaurant, selecting a row with pandas is slow
+        self._rows = {}
+
+        with open(file_paths_config.additional_requirement_rules_path) as f:
+            self.additional_requirement_rules = json.load(f)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        """The restaurant data, read on first access."""
+        if self._data is None:
+            with self._data_lock:
+                if self._data is None:
+                    import pandas as pd
+
+                    with METRICS.measure("data_load"):
+                        self._data = pd.read_csv(self.restaurant_info_path)
+
+        return self._data
+
+    def restaurant(self, restaurant_id: int) -> pd.Series:
+        """Returns the row of a restaurant. The rows are memoized, the returned row is shared and must
+        not be modified.
+
+        Args:
+            restaurant_id (int): index of the restaurant in the data
+
+        Returns:
+            pd.Series: the restaurant
+        """
+        row = self._rows.get(restaurant_id)
+        if row is None:
+            row = self._rows[restaurant_id] = self.data.loc[restaurant_id]
 
-    def lookup(self, preferences: dict) -> pd.DataFrame:
+        return row
+
+    def lookup(self, preferences: dict, timer=METRICS) -> pd.DataFrame:
         """Finds fitting restaurants for the users preferences. Also performs inference of rules and the explanation of inferences.
 
+        The results are memoized, the returned dataframe is shared and must not be modified. Only
+        the lookups that are not memoized are measured as the stage "lookup", a memoized result is
+        returned within the stage the lookup is called from.
+
         Args:
             preferences (dict): preferences dictionary
+            timer (optional): measures the lookup and the inference. Defaults to the latency metrics of the process.
 
         Returns:
             pd.DataFrame: dataframe of restaurants that fit the requirements
         """
-        preferences_keys = list(preferences.keys())
+        return self._lookup_cache.get_or_compute(
+            tuple(sorted(preferences.items())),
+            lambda: self._lookup(preferences, timer),
+            self.data,
+        )
 
-        if "additional_requirement" in preferences_keys:
-            preferences_keys.remove("additional_requirement")
+    def _lookup(self, preferences: dict, timer) -> pd.DataFrame:
+        with timer.measure("lookup"):
+            preferences_keys = list(preferences.keys())
 
-        result_df = self.data
-        for preference_key in preferences_keys:
-            if preferences[preference_key] != "Any":
-                result_df = result_df.loc[
-                    result_df[preference_key] == preferences[preference_key]
-                ]
+            if "additional_requirement" in preferences_keys:
+                preferences_keys.remove("additional_requirement")
 
-        # apply inference
-        if "additional_requirement" in list(preferences.keys()):
-            additional_requirement = preferences["additional_requirement"]
-            result_df = self.inference(result_df, additional_requirement)
+            result_df = self.data
+            for preference_key in preferences_keys:
+                if preferences[preference_key] != "Any":
+                    result_df = result_df.loc[
+                        result_df[preference_key] == preferences[preference_key]
+                    ]
 
-        return result_df
+            # apply inference
+            if "additional_requirement" in list(preferences.keys()):
+                additional_requirement = preferences["additional_requirement"]
+                with timer.measure("inference"):
+                    result_df = self.inference(result_df, additional_requirement)
+
+            return result_df
 
     @staticmethod
     def match_rule(
@@ -188,29 +247,33 @@ class RestaurantLookup:
 
         return clashing_condition, explanation_string
 
-    def explain_inference(self, row: pd.DataFrame, additional_requirement: str) -> str:
+    def explain_inference(
+        self, row: pd.DataFrame, additional_requirement: str, timer=METRICS
+    ) -> str:
         """Construct explanation why a restaurant fits the requirement.
 
         Args:
             row (pd.DataFrame): restaurant
             additional_requirement (str): additional requirement
+            timer (optional): measures the explanation. Defaults to the latency metrics of the process.
 
         Returns:
             str: explanation why restaurant fulfills condition
         """
         explanations: list[dict]
 
-        _, explanations = self.match_rule(
-            self.additional_requirement_rules[additional_requirement], row
-        )
+        with timer.measure("explanation"):
+            _, explanations = self.match_rule(
+                self.additional_requirement_rules[additional_requirement], row
+            )
 
-        # construct explanation string
-        explanation_string = (
-            f"The recommended restaurant is {additional_requirement} because"
-        )
-        explanation_string = self.construct_explanation_string(
-            explanation_string, explanations, True
-        )
+            # construct explanation string
+            explanation_string = (
+                f"The recommended restaurant is {additional_requirement} because"
+            )
+            explanation_string = self.construct_explanation_string(
+                explanation_string, explanations, True
+            )
         return explanation_string
 
     @staticmethod
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+
+from source.clock import REAL_CLOCK, Clock
+from source.config import ServingConfig
+
+
+class SessionStore:
+    """Parent class of the server-side session stores. The dialog state of a session is stored as a
+    small json serializable dict, the cookie of the user only carries the session id."""
+
+    def __init__(self, ttl: float, clock: Clock = REAL_CLOCK) -> None:
+        """
+        Args:
+            ttl (float): seconds after the last access until a session expires
+            clock (Clock, optional): the clock of the expiration times. Defaults to the real time.
+        """
+        self.ttl = ttl
+        self.clock = clock
+
+    def get(self, session_id: str):
+        """Returns the stored state of a session.
+
+        Args:
+            session_id (str): id of the session
+
+        Returns:
+            dict | None: the state or None if the session does not exist or is expired
+        """
+        pass
+
+    def set(self, session_id: str, state: dict):
+        """Stores the state of a session and resets its expiration time.
+
+        Args:
+            session_id (str): id of the session
+            state (dict): json serializable state of the session
+        """
+        pass
+
+    def delete(self, session_id: str):
+        """Removes a session from the store.
+
+        Args:
+            session_id (str): id of the session
+        """
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Stores the sessions in a SQLite database so that they can be shared by multiple worker processes."""
+
+    def __init__(self, ttl: float, db_path: str, clock: Clock = REAL_CLOCK) -> None:
+        """
+        Args:
+            ttl (float): seconds after the last access until a session expires
+            db_path (str): path to the database file
+            clock (Clock, optional): the clock of the expiration times. Defaults to the real time.
+        """
+        super().__init__(ttl, clock)
+        self.db_path = db_path
+
+        # sqlite connections can not be shared between threads
+        self._local = threading.local()
+
+        # the connection of the setup is closed, so a server which creates the store before it forks
+        # does not pass an open connection to its workers
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)"
+                )
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        # each thread of each process has its own connection, a forked worker must not use the
+        # connections of its parent
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+    def get(self, session_id: str):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND expires_at >= ?",
+            # the expiration times are timestamps, so they are valid in all processes
+            (session_id, self.clock.timestamp()),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0])
+
+    def set(self, session_id: str, state: dict):
+        now = self.clock.timestamp()
+
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), now + self.ttl),
+            )
+            connection.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def delete(self, session_id: str):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+def create_session_store(serving_config: ServingConfig, clock: Clock = REAL_CLOCK) -> SessionStore:
+    """Creates the session store that is defined in the serving configuration. The "memory" backend
+    has no store, the DialogEngine keeps the sessions of the process itself.
+
+    Args:
+        serving_config (ServingConfig): configuration of the web app
+        clock (Clock, optional): the clock of the expiration times. Defaults to the real time.
+
+    Raises:
+        Exception: Raises exception if the backend is unknown.
+
+    Returns:
+        SessionStore | None: the session store, None for the memory backend
+    """
+    if serving_config.session_backend == "memory":
+        return None
+    elif serving_config.session_backend == "sqlite":
+        return SQLiteSessionStore(
+            serving_config.session_ttl, serving_config.session_db_path, clock
+        )
+    else:
+        raise Exception(f"Unknown session backend {serving_config.session_backend}!")
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import random
+import re
+import time
+from typing import TYPE_CHECKING
+
+from source.dialog_management import (
+    DialogManagement,
+    pattern_match_keyword_extraction,
+    pattern_match_request,
+    typing_duration,
+)
+from source.clock import VirtualClock
+from source.resources import DialogResources
+from source.timing import NULL_TIMER, StageTimer
+
+if TYPE_CHECKING:
+    from source.model import Model
+
+# the slots of a goal in the order of the columns of the restaurant catalog
+GOAL_SLOTS = ("pricerange", "area", "food")
+
+# the question of the system for each slot
+SLOT_QUESTIONS = {
+    "Which area": "area",
+    "How expensive": "pricerange",
+    "What type of food": "food",
+}
+
+# the answer of the system to each request type
+REQUEST_ANSWERS = {
+    "phone number of this restaurant": "phone",
+    "address number of this restaurant": "address",
+    "postcode of this restaurant": "postcode",
+}
+
+# the name of the suggested restaurant follows this text and ends with a period
+SUGGESTION_PREFIX = "according to your preferences is: "
+
+
+class UtterancePools:
+    """Utterances of the dialog acts dataset, grouped by what the simulated user wants to say."""
+
+    def __init__(self, dialog_acts_path: str, keyword_dict) -> None:
+        """Reads the utterances.
+
+        The inform utterances which mention a single keyword (which the keyword extraction finds) are
+        turned into templates for that slot, e.g. "im looking for {} food". The requests are grouped
+        by their request type and only the negations, alternatives, thanks and goodbyes without any
+        keyword are used.
+
+        Args:
+            dialog_acts_path (str): path of the dialog acts dataset
+            keyword_dict (dict): The dictionary containing all possible keywords
+        """
+        self.templates = {slot: [] for slot in GOAL_SLOTS}
+        self.requests = {}
+        self.acts = {act: [] for act in ("negate", "reqalts", "thankyou", "bye", "null")}
+
+        patterns = {
+            (slot, value): re.compile(rf"\b{re.escape(value)}\b")
+            for slot in GOAL_SLOTS
+            for value in keyword_dict[slot]
+        }
+
+        with open(dialog_acts_path) as f:
+            lines = [line.split(" ", maxsplit=1) for line in f]
+
+        for dialog_act, utterance in lines:
+            utterance = utterance.strip().lower()
+
+            if dialog_act == "inform":
+                mentions = [key for key, pattern in patterns.items() if pattern.search(utterance)]
+                if len(mentions) != 1:
+                    continue
+                slot, value = mentions[0]
+                extracted = pattern_match_keyword_extraction(utterance, keyword_dict, None)
+                template = patterns[(slot, value)].sub(
+                    "{}", utterance.replace("{", "").replace("}", "")
+                )
+                if extracted == {slot: value} and template.count("{}") == 1:
+                    self.templates[slot].append(template)
+            elif dialog_act == "request":
+                request_type = pattern_match_request(utterance)
+                if request_type is not None:
+                    self.requests.setdefault(request_type, []).append(utterance)
+            elif dialog_act in self.acts:
+                if dialog_act == "null" or not pattern_match_keyword_extraction(
+                    utterance, keyword_dict, None
+                ):
+                    self.acts[dialog_act].append(utterance)
+
+
+class UserSimulator:
+    """A rule based user. It samples a goal from the restaurant catalog and answers the messages of
+    the system with utterances of the dialog acts dataset until it knows the requested detail of a
+    restaurant fulfilling its goal."""
+
+    def __init__(
+        self,
+        pools: UtterancePools,
+        catalog,
+        rng: random.Random,
+        max_turns: int = 20,
+        noise: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            pools (UtterancePools): the utterances the user can say
+            catalog (pd.DataFrame): the restaurant data the goals are sampled from
+            rng (random.Random): the random generator
+            max_turns (int, optional): the user says goodbye after this many turns. Defaults to 20.
+            noise (float, optional): probability of an unrelated utterance (dialog act null). Defaults to 0.0.
+        """
+        self.pools = pools
+        self.rng = rng
+        self.max_turns = max_turns
+        self.noise = noise
+
+        # only restaurants with all slots filled can be a goal. every restaurant with the same
+        # slots fulfills the goal
+        self.goals = []
+        self.goal_names = {}
+        for row in catalog.dropna(subset=list(GOAL_SLOTS)).itertuples():
+            goal = tuple(getattr(row, slot) for slot in GOAL_SLOTS)
+            self.goals.append(goal)
+            self.goal_names.setdefault(goal, set()).add(row.restaurantname)
+        self.request_types = sorted(pools.requests)
+
+        self.goal = None
+        self.request_type = None
+        self.matching_names = None
+        self.turns = 0
+        self.success_turn = None
+
+    def start_conversation(self):
+        """Samples a new goal."""
+        goal = self.rng.choice(self.goals)
+        self.goal = dict(zip(GOAL_SLOTS, goal))
+        self.request_type = self.rng.choice(self.request_types)
+        self.matching_names = self.goal_names[goal]
+
+        self.turns = 0
+        self.success_turn = None
+
+    def inform(self, slot: str) -> str:
+        return self.rng.choice(self.pools.templates[slot]).format(self.goal[slot])
+
+    def respond(self, messages: list[str]) -> str:
+        """Answers the messages the system has shown since the last answer.
+
+        Args:
+            messages (list[str]): the messages of the system
+
+        Returns:
+            str: the utterance of the user
+        """
+        self.turns += 1
+        # most turns show a single message
+        message = messages[0] if len(messages) == 1 else " ".join(messages)
+
+        if self.turns > 2 * self.max_turns:
+            raise Exception(f"The dialog did not end after {self.turns - 1} turns")
+
+        if self.success_turn is not None:
+            return self.rng.choice(self.pools.acts["thankyou"])
+
+        # give up
+        if self.turns > self.max_turns:
+            return self.rng.choice(self.pools.acts["bye"])
+
+        if self.noise and self.rng.random() < self.noise:
+            return self.rng.choice(self.pools.acts["null"])
+
+        for answer, request_type in REQUEST_ANSWERS.items():
+            if answer in message:
+                if request_type == self.request_type:
+                    self.success_turn = self.turns - 1
+                    return self.rng.choice(self.pools.acts["thankyou"])
+                return self.rng.choice(self.pools.requests[self.request_type])
+
+        _, is_suggestion, suggestion = message.partition(SUGGESTION_PREFIX)
+        if is_suggestion:
+            if suggestion.partition(".")[0] in self.matching_names:
+                return self.rng.choice(self.pools.requests[self.request_type])
+            return self.rng.choice(self.pools.acts["reqalts"])
+
+        for question, slot in SLOT_QUESTIONS.items():
+            if question in message:
+                return self.inform(slot)
+
+        if "additional requirements" in message:
+            return self.rng.choice(self.pools.acts["negate"])
+
+        if "can't understand this request" in message:
+            return self.rng.choice(self.pools.requests[self.request_type])
+
+        # the welcome message and all unexpected messages: start with one of the slots
+        return self.inform(self.rng.choice(GOAL_SLOTS))
+
+
+class SimulatedIO:
+    """Connects a dialog to a user simulator. Nothing is printed and the delays and the typing of
+    the system are not waited for but recorded by a virtual clock."""
+
+    def __init__(
+        self,
+        user: UserSimulator,
+        typing: bool = False,
+        clock: VirtualClock = None,
+        timer=NULL_TIMER,
+    ) -> None:
+        """
+        Args:
+            user (UserSimulator): the user
+            typing (bool, optional): record the time of the typing simulation. Defaults to False.
+            clock (VirtualClock, optional): the clock of the delays. Defaults to a new virtual clock.
+            timer (optional): measures the time of the simulated user as the stage "simulator".
+                Defaults to no timing.
+        """
+        self.user = user
+        self.typing = typing
+        self.clock = clock if clock is not None else VirtualClock()
+        self.timer = timer
+        self.messages = []
+
+    def read(self) -> str:
+        with self.timer.measure("simulator"):
+            utterance = self.user.respond(self.messages)
+        self.messages = []
+        return utterance
+
+    def write(self, message: str):
+        self.messages.append(message)
+        if self.typing:
+            # one sleep per message instead of per character
+            with self.timer.measure("simulator"):
+                self.clock.sleep(typing_duration(message), "typing")
+
+    def wait(self, seconds: float):
+        self.clock.sleep(seconds, "delay")
+
+    def close(self):
+        pass
+
+
+def simulate(
+    classifier: Model,
+    resources: DialogResources,
+    n_conversations: int,
+    seed: int = 0,
+    max_turns: int = 20,
+    noise: float = 0.0,
+) -> dict:
+    """Runs complete conversations between the dialog manager and the user simulator.
+
+    Args:
+        classifier (Model): The dialog act classifier
+        resources (DialogResources): The shared resources
+        n_conversations (int): number of conversations
+        seed (int, optional): seed of the user and of the suggestions. Defaults to 0.
+        max_turns (int, optional): the user gives up after this many turns. Defaults to 20.
+        noise (float, optional): probability of an unrelated user utterance. Defaults to 0.0.
+
+    Returns:
+        dict: the number of conversations and turns, the duration, the turns to success of the
+            successful conversations, the seconds per stage including (stages) and excluding
+            (exclusive_stages) the nested stages and the seconds of the (virtual) delays and typing
+    """
+    rng = random.Random(seed)
+    # the suggestions and the delays of the dialog manager use the global random generator
+    random.seed(seed)
+
+    pools = UtterancePools(resources.file_paths_config.dialog_acts_path, resources.keyword_dict)
+    user = UserSimulator(pools, resources.restaurant_lookup.data, rng, max_turns, noise)
+
+    timer = StageTimer()
+    clock = VirtualClock()
+    dialog = DialogManagement(classifier, resources, timer=timer, clock=clock)
+    dialog.io = SimulatedIO(user, dialog.policy.typing_delay, clock, timer)
+
+    n_turns = 0
+    turns_to_success = []
+    start = time.perf_counter()
+    for _ in range(n_conversations):
+        with timer.measure("simulator"):
+            user.start_conversation()
+        dialog.run_dialog()
+
+        n_turns += user.turns
+        if user.success_turn is not None:
+            turns_to_success.append(user.success_turn)
+    duration = time.perf_counter() - start
+
+    return {
+        "conversations": n_conversations,
+        "turns": n_turns,
+        "duration": duration,
+        "turns_to_success": turns_to_success,
+        "stages": dict(timer.totals),
+        "exclusive_stages": dict(timer.exclusive_totals),
+        "delay": clock.slept("delay"),
+        "typing": clock.slept("typing"),
+    }
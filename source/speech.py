@@ -0,0 +1,135 @@
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+
+
+def play_audio_file(path: str) -> bool:
+    """Plays an audio file with the player of the platform.
+
+    Args:
+        path (str): path to the audio file
+
+    Returns:
+        bool: False if no player is available
+    """
+    if sys.platform == "win32":
+        import winsound
+
+        winsound.PlaySound(path, winsound.SND_FILENAME)
+        return True
+
+    if sys.platform == "darwin":
+        players = [["afplay"]]
+    else:
+        players = [["aplay", "-q"], ["paplay"], ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"]]
+
+    for player in players:
+        if shutil.which(player[0]) is not None:
+            subprocess.run(player + [path], check=False)
+            return True
+
+    return False
+
+
+class SpeechWorker:
+    """Speaks messages in a background thread so that the dialog does not wait for the speech.
+
+    Every message is synthesized into an audio file once, the file name is the hash of the message.
+    Messages that are repeated (like the welcome message) are played from this cache. The speech
+    engine is only created when the first message is spoken.
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        """
+        Args:
+            cache_dir (str): directory of the synthesized audio files
+        """
+        self.cache_dir = cache_dir
+
+        self.queue = queue.Queue()
+        self._engine = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # statistics
+        self.n_synthesized = 0
+        self.n_cache_hits = 0
+
+    def say(self, message: str):
+        """Queues a message to be spoken. Returns immediately.
+
+        Args:
+            message (str): message to be spoken
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="speech-worker", daemon=True
+                )
+                self._thread.start()
+
+        self.queue.put(message)
+
+    def wait(self):
+        """Blocks until all queued messages are spoken."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def audio_path(self, message: str) -> str:
+        """Returns the path of the cached audio file of a message."""
+        key = hashlib.sha1(message.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def engine(self):
+        """Creates the speech engine on first use. Importing pyttsx3 and starting the engine is slow."""
+        if self._engine is None:
+            import pyttsx3
+
+            self._engine = pyttsx3.init()
+
+        return self._engine
+
+    def synthesize(self, message: str) -> str:
+        """Renders a message into an audio file if it is not cached yet.
+
+        Args:
+            message (str): message to be spoken
+
+        Returns:
+            str: path to the audio file
+        """
+        path = self.audio_path(message)
+        if os.path.exists(path):
+            self.n_cache_hits += 1
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write to a temporary file first, so an interrupted synthesis never ends up in the cache
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        engine = self.engine()
+        engine.save_to_file(message, temporary_path)
+        engine.runAndWait()
+        os.replace(temporary_path, path)
+
+        self.n_synthesized += 1
+        return path
+
+    def _run(self):
+        while True:
+            message = self.queue.get()
+            try:
+                path = self.synthesize(message)
+                if not play_audio_file(path):
+                    # no audio player available, let the engine speak directly
+                    engine = self.engine()
+                    engine.say(message)
+                    engine.runAndWait()
+            except Exception as e:
+                print(f"Could not speak message: {e}")
+            finally:
+                self.queue.task_done()
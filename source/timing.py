@@ -0,0 +1,77 @@
+import time
+from contextlib import nullcontext
+
+
+class StageTimer:
+    """Sums up the time spent in the stages of a turn (classify, extract, transition, ...).
+
+    The stages can be nested. Like the spans of the latency metrics (source/metrics.py), the time of
+    a stage (totals) includes the stages measured within it, e.g. the render time includes the lookup
+    of the restaurants. The time of a stage without its nested stages is summed up as well
+    (exclusive_totals); these add up to the measured time without counting anything twice.
+    """
+
+    def __init__(self, clock=time.perf_counter) -> None:
+        """
+        Args:
+            clock (callable, optional): returns the current time in seconds. Defaults to time.perf_counter.
+        """
+        self.clock = clock
+        # stage -> seconds including and excluding the nested stages, and number of measurements
+        self.totals = {}
+        self.exclusive_totals = {}
+        self.counts = {}
+        # time of the nested stages of each running stage
+        self._nested = []
+
+    def measure(self, stage: str, state: str = None):
+        """Measures the code within the with block as a stage.
+
+        Args:
+            stage (str): name of the stage
+            state (str, optional): the dialog state, not used by this timer. Defaults to None.
+        """
+        return _StageSpan(self, stage)
+
+    def _add(self, stage: str, elapsed: float):
+        nested = self._nested.pop()
+        self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+        self.exclusive_totals[stage] = self.exclusive_totals.get(stage, 0.0) + elapsed - nested
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        if self._nested:
+            self._nested[-1] += elapsed
+
+    def reset(self):
+        """Removes all measurements."""
+        self.totals.clear()
+        self.exclusive_totals.clear()
+        self.counts.clear()
+
+
+class _StageSpan:
+    """A running measurement of StageTimer.measure(), cheaper than a generator based context manager."""
+
+    __slots__ = ("timer", "stage", "start")
+
+    def __init__(self, timer: StageTimer, stage: str) -> None:
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.timer._nested.append(0.0)
+        self.start = self.timer.clock()
+
+    def __exit__(self, *exc_info):
+        self.timer._add(self.stage, self.timer.clock() - self.start)
+
+
+class NullTimer:
+    """Timer which measures nothing, used when no timer is given."""
+
+    _context = nullcontext()
+
+    def measure(self, stage: str, state: str = None):
+        return self._context
+
+
+NULL_TIMER = NullTimer()
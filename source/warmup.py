@@ -0,0 +1,114 @@
+import gc
+import os
+import sys
+import time
+
+from source.model_registry import ModelRegistry
+from source.resources import DialogResources
+
+
+def memory_usage() -> float:
+    """Returns the resident set size of the process.
+
+    Returns:
+        float: memory usage in MB
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError):
+        pass
+
+    # no procfs (e.g. macOS), fall back to the peak memory usage
+    try:
+        import resource
+    except ImportError:
+        # windows
+        return float("nan")
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on linux
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def warm_up(model_registry: ModelRegistry, resources: DialogResources) -> list[dict]:
+    """Loads all read-only assets and moves them out of the reach of the garbage collector.
+
+    If this is done in the parent process of a pre-forking server (e.g. gunicorn --preload) the
+    workers share the memory of the assets copy-on-write and the first requests are not slowed
+    down by loading them. This is safe because the app starts its threads and opens its
+    connections in each worker on first use.
+
+    Args:
+        model_registry (ModelRegistry): registry of the classifier
+        resources (DialogResources): the shared resources of the dialogs
+
+    Returns:
+        list[dict]: load time in seconds and memory usage in MB after loading for each asset
+    """
+    # import here so that warming up is the only place which pulls in the dialog manager
+    from source.dialog_management import (
+        additional_keyword_extraction,
+        pattern_match_keyword_extraction,
+    )
+    from source.nlu import Utterance
+
+    report = []
+
+    def load(asset: str, function):
+        start = time.perf_counter()
+        function()
+        report.append(
+            {
+                "asset": asset,
+                "load_time": time.perf_counter() - start,
+                "rss_mb": memory_usage(),
+            }
+        )
+
+    def import_libraries():
+        import numpy
+        import pandas
+        import sklearn.feature_extraction.text
+        import sklearn.tree
+
+    def load_vectorizer():
+        model = model_registry.get()
+        # a prediction initializes the lazily created internals of the vectorizer and the model
+        model.predict_batch(["warm up"])
+        # the chat turns build the bag of words from the tokens, which uses scipy
+        model.predict_utterance(Utterance("warm up"))
+
+    def load_restaurant_data():
+        restaurant_lookup = resources.restaurant_lookup
+        restaurant_lookup.lookup({})
+        for additional_requirement in restaurant_lookup.additional_requirement_rules:
+            restaurant_lookup.check_for_contradiction({}, additional_requirement)
+
+    def load_keywords():
+        pattern_match_keyword_extraction(
+            "cheap chinese food in the north", resources.keyword_dict, None
+        )
+        additional_keyword_extraction("romantic")
+
+    load("libraries", import_libraries)
+    load("model", model_registry.get)
+    load("vectorizer", load_vectorizer)
+    load("restaurant data and rules", load_restaurant_data)
+    load("keywords", load_keywords)
+
+    # everything that exists now is never freed, so the garbage collector should not touch (and
+    # thereby copy) these objects in the forked workers
+    load("gc freeze", lambda: (gc.collect(), gc.freeze()))
+
+    return report
+
+
+def print_warmup_report(report: list[dict]):
+    """Prints the load time and memory usage of each asset."""
+    print("Warm-up:")
+    for entry in report:
+        print(
+            f"  {entry['asset']:<28}{entry['load_time']:>8.3f}s{entry['rss_mb']:>10.1f} MB"
+        )
@@ -0,0 +1,24 @@
+import pytest
+
+from source.config import load_file_paths_configuration
+from source.model_registry import ModelRegistry
+from source.resources import load_resources
+
+# the tests run from the root of the repository: python -m pytest
+
+
+@pytest.fixture(scope="session")
+def file_paths_config():
+    return load_file_paths_configuration("output/data/file_paths_config.json")
+
+
+@pytest.fixture(scope="session")
+def classifier():
+    # the artifact is created by source/fit_and_save_model.py
+    return ModelRegistry("output/data/decision_tree.rf").get()
+
+
+@pytest.fixture(scope="session")
+def resources(file_paths_config):
+    # t2s, delay, allow_feedback, allow_preference_change, typing_delay
+    return load_resources([False, True, True, True, True], file_paths_config)
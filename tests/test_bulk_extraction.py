@@ -0,0 +1,63 @@
+import json
+import time
+
+from source.bulk_extraction import extract_lines
+
+
+class CountingLines:
+    """Input lines which count how many of them were read."""
+
+    def __init__(self, lines: list[str]) -> None:
+        self.lines = lines
+        self.n_read = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.n_read += 1
+            yield line
+
+
+def test_records_keep_the_order_and_skip_bad_lines(file_paths_config):
+    lines = [
+        '{"utterance": "cheap food in the north"}\n',
+        "\n",
+        "not json\n",
+        '{"utterance": "romantic"}\n',
+    ]
+    malformed_lines = []
+
+    records = list(
+        extract_lines(
+            lines,
+            file_paths_config.extended_restaurant_info_path,
+            input_format="jsonl",
+            processes=2,
+            chunk_size=1,
+            on_malformed_line=lambda line_number, error: malformed_lines.append(line_number),
+        )
+    )
+
+    records = [json.loads(record) for record in records]
+    assert [record["utterance"] for record in records] == ["cheap food in the north", "romantic"]
+    assert records[0]["preferences"] == {"pricerange": "cheap", "area": "north"}
+    assert records[1]["additional_preferences"] == {"additional_requirement": "romantic"}
+    assert malformed_lines == [3]
+
+
+def test_slow_consumer_does_not_drain_the_input(file_paths_config):
+    lines = CountingLines(["i want cheap food\n"] * 10_000)
+
+    records = extract_lines(
+        lines,
+        file_paths_config.extended_restaurant_info_path,
+        processes=2,
+        chunk_size=10,
+        max_pending_chunks=4,
+    )
+    next(records)
+    # the workers are idle while the consumer waits, only the pending chunks were read
+    time.sleep(0.5)
+
+    assert lines.n_read <= 5 * 10
+    assert sum(1 for _ in records) == 10_000 - 1
+    assert lines.n_read == 10_000
@@ -0,0 +1,70 @@
+import pytest
+
+from source.clock import VirtualClock
+from source.dialog_management import ConsoleIO, DialogManagement, typing_duration
+from source.session_store import SQLiteSessionStore
+
+
+class ScriptedConsoleIO(ConsoleIO):
+    """The command line with a scripted user, the messages are still typed with the clock."""
+
+    def __init__(self, utterances: list[str], clock: VirtualClock) -> None:
+        super().__init__(typing=True, t2s=False, clock=clock)
+        self.utterances = list(utterances)
+        self.messages = []
+
+    def read(self) -> str:
+        return self.utterances.pop(0)
+
+    def write(self, message: str):
+        self.messages.append(message)
+        super().write(message)
+
+
+def test_slept_by_reason():
+    clock = VirtualClock(start=10.0, start_timestamp=1000.0)
+    clock.sleep(1.5, "delay")
+    clock.sleep(0.25, "typing")
+    clock.sleep(0.5, "delay")
+    clock.advance(100)
+
+    assert clock.slept("delay") == pytest.approx(2.0)
+    assert clock.slept("typing") == pytest.approx(0.25)
+    assert clock.slept() == pytest.approx(2.25)
+    assert clock.now() == pytest.approx(112.25)
+    assert clock.timestamp() == pytest.approx(1102.25)
+
+
+def test_dialog_delays_and_typing_go_through_the_clock(classifier, resources, capsys):
+    clock = VirtualClock()
+    io = ScriptedConsoleIO(
+        ["i want cheap food in the centre", "any food", "no", "thank you goodbye"], clock
+    )
+    dialog = DialogManagement(classifier, resources, io=io, clock=clock)
+
+    dialog.run_dialog()
+
+    # the welcome message and one reply per utterance, each after a delay of 0.5 to 2 seconds
+    delays = [seconds for reason, seconds in clock.sleeps if reason == "delay"]
+    assert len(delays) == 5
+    assert all(0.5 <= delay <= 2 for delay in delays)
+    assert clock.slept("delay") == pytest.approx(sum(delays))
+
+    # every character of the messages was typed with the virtual clock
+    assert clock.slept("typing") == pytest.approx(
+        sum(typing_duration(message) for message in io.messages)
+    )
+    assert clock.now() == pytest.approx(clock.slept())
+    assert capsys.readouterr().out.splitlines() == io.messages
+
+
+def test_sqlite_sessions_expire_on_the_clock(tmp_path):
+    clock = VirtualClock(start_timestamp=1_700_000_000.0)
+    store = SQLiteSessionStore(60, str(tmp_path / "sessions.sqlite3"), clock)
+
+    store.set("a", {"state": "Welcome"})
+    clock.advance(59)
+    assert store.get("a") == {"state": "Welcome"}
+
+    clock.advance(2)
+    assert store.get("a") is None
@@ -0,0 +1,175 @@
+import json
+import os
+import time
+
+import mongomock
+import pymongo.errors
+
+from source.conversation_logger import ConversationLogger
+
+
+class FlakyCollection:
+    """A mongomock collection which is down, or goes down after writing some of the documents."""
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+        self.down = False
+        # number of documents written before the connection is lost, None to write all
+        self.fail_after = None
+        # called once before the next insert
+        self.before_insert = None
+
+    def insert_many(self, documents: list, ordered: bool = True):
+        if self.before_insert is not None:
+            before_insert, self.before_insert = self.before_insert, None
+            before_insert()
+
+        if self.down:
+            raise pymongo.errors.ServerSelectionTimeoutError("the database is down")
+
+        if self.fail_after is not None:
+            self.collection.insert_many(documents[: self.fail_after], ordered=ordered)
+            self.fail_after = None
+            raise pymongo.errors.AutoReconnect("the connection was lost")
+
+        return self.collection.insert_many(documents, ordered=ordered)
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+def turns(n: int) -> list[dict]:
+    return [{"session_id": "a", "utterance": f"utterance {i}"} for i in range(n)]
+
+
+def test_records_are_inserted_in_batches(tmp_path):
+    collection = mongomock.MongoClient().db.turns
+    logger = ConversationLogger(collection, str(tmp_path / "spill.jsonl"), batch_size=2)
+
+    for record in turns(5):
+        assert logger.log(record)
+    logger.close()
+
+    assert collection.count_documents({}) == 5
+    assert logger.stats() == {
+        "inserted": 5,
+        "spilled": 0,
+        "rejected": 0,
+        "dropped": 0,
+        "queued": 0,
+    }
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_spilled_records_are_replayed_once(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    collection = FlakyCollection(mongomock.MongoClient().db.turns)
+
+    # the connection is lost after writing 2 of the 4 records, so all 4 are spilled
+    collection.fail_after = 2
+    logger = ConversationLogger(collection, spill_path, batch_size=4)
+    for record in turns(4):
+        logger.log(record)
+    logger.close()
+    assert logger.stats()["spilled"] == 4
+
+    # the database is down, the next records are spilled as well
+    collection.down = True
+    logger = ConversationLogger(collection, spill_path, batch_size=4)
+    logger.log({"session_id": "b", "utterance": "hello"})
+    logger.close()
+
+    # back up: the spill file is written without duplicating the 2 records written before
+    collection.down = False
+    logger = ConversationLogger(collection, spill_path, batch_size=4)
+    logger.log({"session_id": "c", "utterance": "goodbye"})
+    logger.close()
+
+    assert collection.collection.count_documents({}) == 6
+    assert logger.stats()["inserted"] == 6
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_rejected_records_are_not_retried(tmp_path):
+    spill_path = tmp_path / "spill.jsonl"
+    rejected_path = tmp_path / "rejected.jsonl"
+    collection = mongomock.MongoClient().db.turns
+    collection.create_index("utterance", unique=True)
+    collection.insert_one({"utterance": "utterance 1"})
+
+    logger = ConversationLogger(
+        collection, str(spill_path), batch_size=3, rejected_path=str(rejected_path)
+    )
+    for record in turns(3):
+        logger.log(record)
+    logger.log({"session_id": "b", "utterance": "hello"})
+    logger.close()
+
+    assert collection.count_documents({}) == 4
+    assert logger.stats()["inserted"] == 3
+    assert logger.stats()["spilled"] == 0
+    assert logger.stats()["rejected"] == 1
+    assert not spill_path.exists()
+    [rejected] = [json.loads(line) for line in rejected_path.read_text().splitlines()]
+    assert rejected["utterance"] == "utterance 1"
+
+
+def test_records_spilled_during_a_replay_are_kept(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    collection = FlakyCollection(mongomock.MongoClient().db.turns)
+
+    collection.down = True
+    logger = ConversationLogger(collection, spill_path)
+    for record in turns(2):
+        logger.log(record)
+    logger.close()
+
+    children = []
+
+    def spill_from_another_worker():
+        # the other worker waits for the lock of the replay, then appends its record
+        pid = os.fork()
+        if pid == 0:
+            child_logger = ConversationLogger(collection, spill_path)
+            with child_logger._spill_lock():
+                child_logger._append(spill_path, [{"session_id": "other worker"}])
+            os._exit(0)
+        children.append(pid)
+        time.sleep(0.2)
+
+    collection.down = False
+    # the first insert writes the new record, the second one replays the spill file
+    collection.before_insert = lambda: setattr(
+        collection, "before_insert", spill_from_another_worker
+    )
+    logger = ConversationLogger(collection, spill_path)
+    logger.log({"session_id": "c"})
+    logger.close()
+    for pid in children:
+        os.waitpid(pid, 0)
+
+    assert collection.collection.count_documents({}) == 3
+    with open(spill_path) as f:
+        assert [json.loads(line)["session_id"] for line in f] == ["other worker"]
+
+
+def test_forked_child_flushes_its_own_records(tmp_path):
+    collection = mongomock.MongoClient().db.turns
+    logger = ConversationLogger(collection, str(tmp_path / "spill.jsonl"))
+    logger.log({"session_id": "parent"})
+
+    pid = os.fork()
+    if pid == 0:
+        # the queued record of the parent is not written twice, the record of the child is written
+        # by a thread of the child when it closes the logger
+        logger.log({"session_id": "child"})
+        logger.close()
+        ok = collection.count_documents({"session_id": "child"}) == 1
+        ok = ok and collection.count_documents({"session_id": "parent"}) == 0
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    logger.close()
+    assert collection.count_documents({}) == 1
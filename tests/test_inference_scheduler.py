@@ -0,0 +1,79 @@
+import os
+import time
+
+from source.inference_scheduler import MicroBatchScheduler
+from source.nlu import Utterance
+
+
+class UpperCaseModel:
+    """Classifies an utterance as its upper case, and counts the batches."""
+
+    def __init__(self) -> None:
+        self.batches = []
+
+    def predict_utterances(self, utterances: list[Utterance]):
+        self.batches.append([utterance.text for utterance in utterances])
+        return [utterance.text.upper() for utterance in utterances]
+
+
+def test_thread_starts_with_the_first_request():
+    model = UpperCaseModel()
+    scheduler = MicroBatchScheduler(lambda: model, max_wait=0.001)
+    assert not scheduler._thread.is_running()
+
+    assert scheduler.predict_single_sentence("hello") == "HELLO"
+    assert scheduler._thread.is_running()
+    assert scheduler.stats()["requests"] == 1
+
+
+def test_forked_child_starts_its_own_thread():
+    model = UpperCaseModel()
+    scheduler = MicroBatchScheduler(lambda: model, max_wait=0.001)
+    assert scheduler.predict_single_sentence("parent") == "PARENT"
+
+    pid = os.fork()
+    if pid == 0:
+        # the thread of the parent does not exist in the child, without a new one this would hang
+        ok = scheduler.submit(Utterance("child")).result(timeout=5) == "CHILD"
+        ok = ok and scheduler.stats()["requests"] == 1
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert scheduler.stats()["requests"] == 1
+
+
+def test_single_request_is_not_delayed():
+    model = UpperCaseModel()
+    # a request that waited for max_wait would take at least a second
+    scheduler = MicroBatchScheduler(lambda: model, max_wait=1.0)
+    scheduler.predict_single_sentence("warm up")
+
+    for utterance in ("a", "b", "c"):
+        start = time.perf_counter()
+        assert scheduler.predict_single_sentence(utterance) == utterance.upper()
+        assert time.perf_counter() - start < 0.1
+
+    assert scheduler.stats()["batch_size_counts"] == {1: 4}
+
+
+def test_waiting_requests_are_batched():
+    model = UpperCaseModel()
+    scheduler = MicroBatchScheduler(lambda: model, max_wait=0.05, max_batch_size=3)
+
+    futures = [scheduler.submit(Utterance(text)) for text in ("a", "b", "a", "c")]
+
+    assert [future.result(timeout=5) for future in futures] == ["A", "B", "A", "C"]
+    # the first request may be sent alone before the others arrive, the rest is classified together
+    assert sum(len(batch) for batch in model.batches) == 3
+    assert len(model.batches) <= 2
+    assert scheduler.stats()["coalesced"] == 1
+
+
+def test_batches_are_classified_from_the_tokens(classifier):
+    scheduler = MicroBatchScheduler(lambda: classifier, max_wait=0.05)
+    utterances = ["i want cheap food", "yes", "whats the phone number", "no thanks goodbye"]
+
+    futures = [scheduler.submit(Utterance(utterance)) for utterance in utterances]
+
+    assert [future.result(timeout=5) for future in futures] == classifier.predict_batch(utterances)[0]